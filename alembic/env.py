@@ -21,7 +21,7 @@ db_password = os.getenv("DB_PASSWORD", "")
 db_host = os.getenv("DB_HOST", "db")
 db_port = os.getenv("DB_PORT", "3306")
 db_name = os.getenv("DB_NAME", "ostadbank_db")
-database_url = f"mysql+pymysql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}?charset=utf8mb4"
+database_url = os.getenv("DATABASE_URL") or f"mysql+pymysql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}?charset=utf8mb4"
 config.set_main_option('sqlalchemy.url', database_url)
 
 # Interpret the config file for Python logging.
@@ -0,0 +1,51 @@
+"""Adds the denormalized experience_documents table used by search
+
+Revision ID: a6
+Revises: a5
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6'
+down_revision = 'a5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'experience_documents',
+        sa.Column('experience_id', sa.Integer(), nullable=False),
+        sa.Column('professor_name', sa.String(length=255), nullable=False),
+        sa.Column('course_name', sa.String(length=255), nullable=False),
+        sa.Column('title', sa.String(length=512), nullable=False),
+        sa.Column('description', sa.String(length=255), nullable=True),
+        sa.Column('rendered_text', sa.Text(), nullable=False),
+        sa.Column('search_text', sa.Text(), nullable=False),
+        sa.Column('tags', sa.Text(), nullable=True),
+        sa.Column('redacted', sa.Boolean(), nullable=False),
+        sa.Column('published_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['experience_id'], ['experiences.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('experience_id')
+    )
+    op.create_index('ix_experience_documents_published_at', 'experience_documents', ['published_at'], unique=False)
+    bind = op.get_bind()
+    if bind.dialect.name == 'mysql':
+        # Search runs MATCH ... AGAINST on this index. MySQL's ngram parser also finds text inside
+        # words; MariaDB has no ngram parser and matches word prefixes.
+        parser = '' if bind.dialect.is_mariadb else ' WITH PARSER ngram'
+        op.execute(f"CREATE FULLTEXT INDEX ix_experience_documents_search_text "
+                   f"ON experience_documents (search_text){parser}")
+    # Rows are (re)built by the bot at startup for experiences that are already approved.
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'mysql':
+        op.drop_index('ix_experience_documents_search_text', table_name='experience_documents')
+    op.drop_index('ix_experience_documents_published_at', table_name='experience_documents')
+    op.drop_table('experience_documents')
@@ -0,0 +1,33 @@
+"""Adds the bot_persistence table for conversation states and user data
+
+Revision ID: a7
+Revises: a6
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7'
+down_revision = 'a6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'bot_persistence',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('namespace', sa.String(length=128), nullable=False),
+        sa.Column('key', sa.String(length=255), nullable=False),
+        sa.Column('data', sa.LargeBinary(length=16777215), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('namespace', 'key', name='uq_bot_persistence_namespace_key')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('bot_persistence')
@@ -0,0 +1,35 @@
+"""Adds the channel_memberships table fed by chat_member updates
+
+Revision ID: a8
+Revises: a7
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8'
+down_revision = 'a7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'channel_memberships',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.Column('channel_id', sa.String(length=255), nullable=False),
+        sa.Column('is_member', sa.Boolean(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'channel_id', name='uq_channel_memberships_user_channel')
+    )
+    op.create_index(op.f('ix_channel_memberships_channel_id'), 'channel_memberships', ['channel_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_channel_memberships_channel_id'), table_name='channel_memberships')
+    op.drop_table('channel_memberships')
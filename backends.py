@@ -0,0 +1,301 @@
+# backends.py
+
+import asyncio
+import time
+from collections import defaultdict
+
+
+class StateBackend:
+    """
+    Shared state used to coordinate several bot processes: FIFO queues,
+    a key/value store with optional expiry, leases, token buckets and
+    fire-and-forget pub/sub.
+    """
+
+    async def push(self, queue: str, item: str):
+        raise NotImplementedError
+
+    async def pop(self, queue: str, timeout: float = 1.0) -> str | None:
+        """Removes and returns the oldest item, waiting up to timeout seconds."""
+        raise NotImplementedError
+
+    async def queue_length(self, queue: str) -> int:
+        raise NotImplementedError
+
+    async def get(self, key: str) -> str | None:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: str, ttl: float | None = None):
+        raise NotImplementedError
+
+    async def incr(self, key: str, amount: int = 1) -> int:
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    async def acquire_lease(self, key: str, owner: str, ttl: float) -> bool:
+        """Takes or renews a lease for owner; False while another owner holds an unexpired lease."""
+        raise NotImplementedError
+
+    async def release_lease(self, key: str, owner: str):
+        """Gives a lease up, if owner still holds it."""
+        raise NotImplementedError
+
+    async def take_token(self, key: str, rate: float, capacity: float) -> float:
+        """Takes a token from the bucket under key and returns 0, or returns how many seconds to wait for one."""
+        raise NotImplementedError
+
+    async def block_bucket(self, key: str, seconds: float):
+        """Hands out no tokens from the bucket under key for the next seconds."""
+        raise NotImplementedError
+
+    async def publish(self, channel: str, message: str):
+        raise NotImplementedError
+
+    async def subscribe(self, channel: str):
+        """Async iterator over messages published on a channel after subscribing."""
+        raise NotImplementedError
+        yield  # pragma: no cover
+
+    async def close(self):
+        pass
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self) -> float:
+        """Takes a token and returns 0, or returns how many seconds to wait for one."""
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def block(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def is_idle(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity and time.monotonic() >= self.blocked_until
+
+
+class InProcessBackend(StateBackend):
+    """Backend living in the current event loop; used for single-process deployments and tests."""
+
+    def __init__(self, max_buckets: int = 10000):
+        self._queues = defaultdict(asyncio.Queue)
+        self._values = {}
+        self._expiry = {}
+        self._buckets = {}
+        self.max_buckets = max_buckets
+        self._subscribers = defaultdict(list)
+
+    async def push(self, queue, item):
+        self._queues[queue].put_nowait(item)
+
+    async def pop(self, queue, timeout=1.0):
+        try:
+            return await asyncio.wait_for(self._queues[queue].get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def queue_length(self, queue):
+        return self._queues[queue].qsize()
+
+    def _expired(self, key):
+        expires_at = self._expiry.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._values.pop(key, None)
+            self._expiry.pop(key, None)
+            return True
+        return False
+
+    async def get(self, key):
+        if self._expired(key):
+            return None
+        return self._values.get(key)
+
+    async def set(self, key, value, ttl=None):
+        self._values[key] = value
+        if ttl:
+            self._expiry[key] = time.monotonic() + ttl
+        else:
+            self._expiry.pop(key, None)
+
+    async def incr(self, key, amount=1):
+        self._expired(key)
+        value = int(self._values.get(key, 0)) + amount
+        self._values[key] = str(value)
+        return value
+
+    async def delete(self, key):
+        self._values.pop(key, None)
+        self._expiry.pop(key, None)
+
+    async def acquire_lease(self, key, owner, ttl):
+        if self._expired(key) or self._values.get(key, owner) == owner:
+            await self.set(key, owner, ttl)
+            return True
+        return False
+
+    async def release_lease(self, key, owner):
+        if not self._expired(key) and self._values.get(key) == owner:
+            await self.delete(key)
+
+    def _bucket(self, key, rate, capacity) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_buckets:
+                for idle in [k for k, b in self._buckets.items() if b.is_idle()]:
+                    del self._buckets[idle]
+            bucket = self._buckets[key] = TokenBucket(rate, capacity)
+        return bucket
+
+    async def take_token(self, key, rate, capacity):
+        return self._bucket(key, rate, capacity).try_acquire()
+
+    async def block_bucket(self, key, seconds):
+        # A bucket that does not exist yet starts full; only the block matters.
+        self._bucket(key, 1, 1).block(seconds)
+
+    async def publish(self, channel, message):
+        for subscriber in self._subscribers[channel]:
+            subscriber.put_nowait(message)
+
+    async def subscribe(self, channel):
+        inbox = asyncio.Queue()
+        self._subscribers[channel].append(inbox)
+        try:
+            while True:
+                yield await inbox.get()
+        finally:
+            self._subscribers[channel].remove(inbox)
+
+
+class RedisBackend(StateBackend):
+    """Backend on any server speaking the Redis protocol (Redis, Valkey, KeyDB, ...)."""
+
+    # Take-or-renew and compare-and-delete have to be atomic.
+    _ACQUIRE_LEASE = """
+        if redis.call('get', KEYS[1]) == ARGV[1] or redis.call('set', KEYS[1], ARGV[1], 'NX') then
+            redis.call('pexpire', KEYS[1], ARGV[2])
+            return 1
+        end
+        return 0"""
+    _RELEASE_LEASE = """
+        if redis.call('get', KEYS[1]) == ARGV[1] then
+            return redis.call('del', KEYS[1])
+        end
+        return 0"""
+
+    # Buckets are hashes refilled on the server's clock; a full bucket expires, which reads as full again.
+    _TAKE_TOKEN = """
+        local now = redis.call('time')
+        now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+        local rate, capacity = tonumber(ARGV[1]), tonumber(ARGV[2])
+        local bucket = redis.call('hmget', KEYS[1], 'tokens', 'updated', 'blocked')
+        local blocked = tonumber(bucket[3]) or 0
+        if now < blocked then
+            return tostring(blocked - now)
+        end
+        local tokens = tonumber(bucket[1]) or capacity
+        tokens = math.min(capacity, tokens + (now - (tonumber(bucket[2]) or now)) * rate)
+        local wait = 0
+        if tokens >= 1 then
+            tokens = tokens - 1
+        else
+            wait = (1 - tokens) / rate
+        end
+        redis.call('hset', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+        redis.call('pexpire', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+        return tostring(wait)"""
+    _BLOCK_BUCKET = """
+        local now = redis.call('time')
+        now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+        local blocked = now + tonumber(ARGV[1])
+        if blocked > (tonumber(redis.call('hget', KEYS[1], 'blocked')) or 0) then
+            redis.call('hset', KEYS[1], 'blocked', tostring(blocked))
+        end
+        redis.call('pexpire', KEYS[1], math.max(redis.call('pttl', KEYS[1]), math.ceil(ARGV[1] * 1000) + 1000))
+        return 1"""
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("STATE_BACKEND_URL points to Redis but the 'redis' package is not installed.") from e
+        self._redis = redis.from_url(url, decode_responses=True)
+
+    async def push(self, queue, item):
+        await self._redis.rpush(queue, item)
+
+    async def pop(self, queue, timeout=1.0):
+        result = await self._redis.blpop([queue], timeout=max(1, int(timeout)))
+        return result[1] if result else None
+
+    async def queue_length(self, queue):
+        return await self._redis.llen(queue)
+
+    async def get(self, key):
+        return await self._redis.get(key)
+
+    async def set(self, key, value, ttl=None):
+        await self._redis.set(key, value, px=int(ttl * 1000) if ttl else None)
+
+    async def incr(self, key, amount=1):
+        return await self._redis.incrby(key, amount)
+
+    async def delete(self, key):
+        await self._redis.delete(key)
+
+    async def acquire_lease(self, key, owner, ttl):
+        return bool(await self._redis.eval(self._ACQUIRE_LEASE, 1, key, owner, int(ttl * 1000)))
+
+    async def release_lease(self, key, owner):
+        await self._redis.eval(self._RELEASE_LEASE, 1, key, owner)
+
+    async def take_token(self, key, rate, capacity):
+        return float(await self._redis.eval(self._TAKE_TOKEN, 1, key, rate, capacity))
+
+    async def block_bucket(self, key, seconds):
+        await self._redis.eval(self._BLOCK_BUCKET, 1, key, seconds)
+
+    async def publish(self, channel, message):
+        await self._redis.publish(channel, message)
+
+    async def subscribe(self, channel):
+        pubsub = self._redis.pubsub()
+        await pubsub.subscribe(channel)
+        try:
+            async for message in pubsub.listen():
+                if message.get('type') == 'message':
+                    yield message['data']
+        finally:
+            await pubsub.unsubscribe(channel)
+            await pubsub.close()
+
+    async def close(self):
+        await self._redis.close()
+
+
+def create_backend(url: str) -> StateBackend:
+    """Builds a backend from a URL: 'memory://' or 'redis://host:port/db'."""
+    if not url or url.startswith('memory://'):
+        return InProcessBackend()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported STATE_BACKEND_URL: {url}")
@@ -0,0 +1,157 @@
+# benchmarks/bench_cold_start.py
+
+"""
+Cold start of the bot: time to import main, to finish start_bot (what the FastAPI
+lifespan runs before uvicorn accepts requests) and to answer the first /start.
+
+Every run is a fresh Python process on a throwaway SQLite database, with the Bot
+API replaced by an in-memory stub. Each database is booted twice: the first boot
+seeds the default texts, the restart finds the seed version and skips it.
+
+    python benchmarks/bench_cold_start.py --runs 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
+BENCH_USER_ID = 1001
+
+
+def child_env(database_path: str) -> dict:
+    env = dict(os.environ)
+    env.update({
+        'DATABASE_URL': f"sqlite:///{database_path}",
+        'BOT_TOKEN': '123456:BENCHMARK',
+        'OWNER_ID': '1',
+        'CHANNEL_ID': '-1001',
+        'BACKUP_CHANNEL_ID': '-1002',
+        'STATE_BACKEND_URL': 'memory://',
+        'WORKER_ROLE': 'all',
+    })
+    env.pop('DOMAIN_NAME', None)
+    return env
+
+
+def prepare_database():
+    sys.path.insert(0, ROOT)
+    import models
+    models.create_tables()
+
+
+async def measure() -> dict:
+    from telegram.request import BaseRequest
+
+    class StubRequest(BaseRequest):
+        """Answers Bot API calls locally and notes when the first message is sent."""
+
+        def __init__(self):
+            self.first_message = asyncio.Event()
+
+        @property
+        def read_timeout(self):
+            return 5.0
+
+        async def initialize(self):
+            pass
+
+        async def shutdown(self):
+            pass
+
+        async def do_request(self, url, method, request_data=None, read_timeout=None,
+                             write_timeout=None, connect_timeout=None, pool_timeout=None):
+            endpoint = url.rsplit('/', 1)[-1]
+            if endpoint == 'getMe':
+                result = {'id': 123456, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot',
+                          'can_join_groups': True, 'can_read_all_group_messages': False,
+                          'supports_inline_queries': True}
+            elif endpoint == 'sendMessage':
+                params = request_data.parameters if request_data else {}
+                result = {'message_id': 1, 'date': int(time.time()), 'text': params.get('text', ''),
+                          'chat': {'id': params.get('chat_id'), 'type': 'private'}}
+                self.first_message.set()
+            else:
+                result = True
+            return 200, json.dumps({'ok': True, 'result': result}).encode('utf-8')
+
+    started = time.perf_counter()
+    sys.path.insert(0, ROOT)
+    import main
+    imported = time.perf_counter()
+
+    stub = StubRequest()
+    main.ptb_app.bot._request = (stub, stub)
+    await main.start_bot(run_startup_jobs=False)
+    ready = time.perf_counter()
+
+    await main.update_dispatcher.submit({
+        'update_id': 1,
+        'message': {
+            'message_id': 1, 'date': int(time.time()), 'text': '/start',
+            'chat': {'id': BENCH_USER_ID, 'type': 'private'},
+            'from': {'id': BENCH_USER_ID, 'is_bot': False, 'first_name': 'Bench'},
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': 6}],
+        },
+    })
+    await asyncio.wait_for(stub.first_message.wait(), timeout=30)
+    answered = time.perf_counter()
+    await main.stop_bot()
+    return {
+        'import_ms': round((imported - started) * 1000, 1),
+        'startup_ms': round((ready - imported) * 1000, 1),
+        'first_update_ms': round((answered - ready) * 1000, 1),
+        'total_ms': round((answered - started) * 1000, 1),
+    }
+
+
+def run_child(mode: str, database_path: str) -> dict | None:
+    completed = subprocess.run(
+        [sys.executable, os.path.realpath(__file__), '--child', mode],
+        env=child_env(database_path), cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    if mode == 'measure':
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+    return None
+
+
+def summarize(samples) -> dict:
+    return {key: round(statistics.median(s[key] for s in samples), 1) for key in samples[0]}
+
+
+def main(args):
+    first_boots, restarts = [], []
+    for _ in range(args.runs):
+        with tempfile.TemporaryDirectory() as tmp:
+            database_path = os.path.join(tmp, 'bench.db')
+            run_child('prepare', database_path)
+            first_boots.append(run_child('measure', database_path))
+            restarts.append(run_child('measure', database_path))
+
+    results = {'first_boot': summarize(first_boots), 'restart': summarize(restarts)}
+    for name, result in results.items():
+        print(f"{name:>10}: import {result['import_ms']} ms, startup {result['startup_ms']} ms, "
+              f"first update {result['first_update_ms']} ms, total {result['total_ms']} ms")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'benchmark': 'cold_start', 'runs': args.runs, 'results': results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--json', help="write results to this file")
+    parser.add_argument('--child', choices=['prepare', 'measure'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child == 'prepare':
+        prepare_database()
+    elif args.child == 'measure':
+        print(json.dumps(asyncio.run(measure())))
+    else:
+        main(args)
@@ -0,0 +1,117 @@
+# benchmarks/bench_experience_data.py
+
+"""
+Cost of turning one experience into ExperienceData, and memory per instance.
+
+Loading: the old path (Experience with field, major, professor and course
+joinedloaded, copied field by field) against fetch_experience_data's single
+projected select. Construction: ExperienceData (frozen, slotted) against the
+same fields as a plain dataclass, built from an already fetched row. Memory:
+tracemalloc over --instances copies built from distinct rows of real data.
+
+    python benchmarks/bench_experience_data.py --experiences 20000 --json experience_data.json
+"""
+
+import argparse
+import dataclasses
+import json
+import os
+import platform
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+import dataset  # noqa: E402
+from bench_hot_paths import measure  # noqa: E402
+
+
+def orm_experience_data(db, exp_id):
+    """What get_experience used to do."""
+    from sqlalchemy.orm import joinedload, undefer_group
+    from models import Experience, ExperienceData
+
+    with db.session_scope() as s:
+        exp = s.query(Experience).options(
+            undefer_group('text'), joinedload(Experience.field), joinedload(Experience.major),
+            joinedload(Experience.professor), joinedload(Experience.course)
+        ).filter(Experience.id == exp_id).first()
+        return ExperienceData(
+            id=exp.id, user_id=exp.user_id, teaching_style=exp.teaching_style, notes=exp.notes,
+            project=exp.project, attendance_required=exp.attendance_required,
+            attendance_details=exp.attendance_details, exam=exp.exam, conclusion=exp.conclusion,
+            status=exp.status.value, field_name=exp.field.name if exp.field else "",
+            major_name=exp.major.name if exp.major else "", professor_name=exp.professor.name if exp.professor else "",
+            course_name=exp.course.name if exp.course else "", channel_message_id=exp.channel_message_id,
+            teaching_rating=exp.teaching_rating.value if exp.teaching_rating else None,
+            exam_difficulty=exp.exam_difficulty.value if exp.exam_difficulty else None,
+            overall_rating=exp.overall_rating, has_notes=exp.has_notes, has_project=exp.has_project,
+            has_exam=exp.has_exam, updated_at=exp.updated_at, created_at=exp.created_at
+        )
+
+
+def per_instance_bytes(build, rows) -> float:
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        instances = [build(row) for row in rows]
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    # The list itself is not part of an instance.
+    return round((after - before - sys.getsizeof(instances)) / len(instances), 1)
+
+
+def main(args):
+    report = {'benchmark': 'experience_data', 'python': platform.python_version(), 'results': {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        dataset.bench_env(args.database_url or f"sqlite:///{os.path.join(tmp, 'experience_data.db')}")
+        report['dataset'] = dataset.seed(args.experiences)
+        import database as db
+        from models import Experience, ExperienceData
+
+        plain = dataclasses.make_dataclass(
+            'PlainExperienceData',
+            [(f.name, f.type, dataclasses.field(default=f.default)) for f in dataclasses.fields(ExperienceData)])
+        exp_id = db.get_approved_experience_ids()[0]
+        with db.session_scope() as s:
+            rows = [tuple(row) for row in s.execute(db._EXPERIENCE_DATA_SELECT.limit(args.instances))]
+            row = s.execute(db._EXPERIENCE_DATA_SELECT.where(Experience.id == exp_id)).first()
+        converted = [db._experience_data(r) for r in rows]
+
+        def fetch():
+            with db.session_scope() as s:
+                return db.fetch_experience_data(s, exp_id)
+
+        assert orm_experience_data(db, exp_id) == fetch()
+        cases = {
+            'load.orm_joinedload': lambda: orm_experience_data(db, exp_id),
+            'load.projected_select': fetch,
+            'build.from_row': lambda: db._experience_data(row),
+        }
+        fields = [tuple(getattr(c, f.name) for f in dataclasses.fields(ExperienceData)) for c in converted]
+        cases['build.frozen_slotted'] = lambda: ExperienceData(*fields[0])
+        cases['build.plain_dataclass'] = lambda: plain(*fields[0])
+        for name, fn in cases.items():
+            report['results'][name] = measure(fn, args.min_time)
+            print(f"{name:<40} {report['results'][name]['median_us']:>10} us median")
+
+        for name, build in (('frozen_slotted', lambda f: ExperienceData(*f)), ('plain_dataclass', lambda f: plain(*f))):
+            size = per_instance_bytes(build, fields)
+            report['results'][f"memory.{name}"] = {'bytes_per_instance': size}
+            print(f"memory.{name:<33} {size:>10} bytes per instance (texts shared)")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--experiences', type=int, default=20000)
+    parser.add_argument('--instances', type=int, default=10000, help="rows used for the memory measurement")
+    parser.add_argument('--min-time', type=float, default=0.3, help="seconds spent on each case")
+    parser.add_argument('--database-url', help="empty database to seed instead of a throwaway SQLite file")
+    parser.add_argument('--json', help="write the report to this file")
+    sys.exit(main(parser.parse_args()))
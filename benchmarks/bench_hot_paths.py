@@ -0,0 +1,221 @@
+# benchmarks/bench_hot_paths.py
+
+"""
+Offline benchmarks of the hot paths: experience rendering, every keyboard builder,
+the database.py read functions and get_top_professors at growing table sizes.
+
+Runs against a throwaway SQLite database seeded by benchmarks/dataset.py (or an
+empty database given with --database-url, e.g. a local MariaDB) and writes a JSON report. Pass a previous
+report with --compare to list cases that got slower than --threshold; the exit
+status is 1 when there is any.
+
+    python benchmarks/bench_hot_paths.py --json report.json
+    python benchmarks/bench_hot_paths.py --top-professors-scales 10000 100000 1000000 --compare report.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+import dataset  # noqa: E402
+
+
+def measure(fn, min_time: float, min_calls: int = 5) -> dict:
+    samples = []
+    total = 0.0
+    while len(samples) < min_calls or total < min_time:
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        samples.append(elapsed)
+        total += elapsed
+    samples.sort()
+    return {
+        'calls': len(samples),
+        'mean_us': round(statistics.fmean(samples) * 1e6, 2),
+        'median_us': round(statistics.median(samples) * 1e6, 2),
+        'p95_us': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1e6, 2),
+    }
+
+
+def build_cases():
+    import database as db
+    import keyboards as kb
+    import main
+    from models import BotText, ExperienceStatus, Major, Professor, RequiredChannel
+
+    if not any(c['channel_id'] == '@bench_channel' for c in db.get_all_required_channels()):
+        db.add_item(RequiredChannel, channel_id='@bench_channel', channel_link='https://t.me/bench_channel')
+    approved_id = db.get_approved_experience_ids()[0]
+    exp = db.get_experience(approved_id)
+    user = db.get_user(exp.user_id)
+    experiences, _ = db.get_experiences_by_status(ExperienceStatus.PENDING)
+    items, _ = db.get_paginated_list(Professor)
+    texts, _ = db.get_paginated_list(BotText)
+    search_term = exp.professor_name.split()[-1]
+    db.save_persisted_states([('conversation:submission', '[1, 1]', b'\x80\x04K\x01.')])
+
+    def uncached_experience():
+        db.experience_cache.discard(approved_id)
+        return db.get_experience(approved_id)
+
+    cases = {
+        'render.format_experience': lambda: main.format_experience(exp),
+        'render.format_experience_redacted': lambda: main.format_experience(exp, redacted=True),
+        'render.render_experience_cached': lambda: main.render_experience(exp),
+    }
+
+    keyboards = {
+        'main_menu': lambda: kb.main_menu(),
+        'ranking_menu': lambda: kb.ranking_menu(),
+        'yes_no_keyboard': lambda: kb.yes_no_keyboard('notes'),
+        'admin_panel_main': lambda: kb.admin_panel_main(),
+        'admin_experience_menu': lambda: kb.admin_experience_menu(),
+        'admin_pending_experiences_keyboard': lambda: kb.admin_pending_experiences_keyboard(experiences, 2, 5),
+        'admin_search_results_keyboard': lambda: kb.admin_search_results_keyboard(experiences, search_term, 2, 5),
+        'user_search_inline_keyboard': lambda: kb.user_search_inline_keyboard(experiences),
+        'my_experiences_keyboard': lambda: kb.my_experiences_keyboard(experiences, 2, 5),
+        'experience_detail_keyboard': lambda: kb.experience_detail_keyboard(approved_id, 1),
+        'confirm_edit_keyboard': lambda: kb.confirm_edit_keyboard(approved_id, 1),
+        'admin_manage_item_list': lambda: kb.admin_manage_item_list(items, 'professor', 2, 5),
+        'admin_manage_texts_list': lambda: kb.admin_manage_texts_list(texts, 2, 5),
+        'confirm_delete_keyboard': lambda: kb.confirm_delete_keyboard('professor', 1, 1),
+        'back_to_list_keyboard': lambda: kb.back_to_list_keyboard('professor', 1),
+        'parent_field_selection_keyboard': lambda: kb.parent_field_selection_keyboard(items, 'course', 1),
+        'dynamic_list_keyboard': lambda: kb.dynamic_list_keyboard(items, 'professor', has_add_new=True),
+        'admin_approval_keyboard': lambda: kb.admin_approval_keyboard(approved_id, user, status=exp.status),
+        'admin_approval_keyboard_lookup': lambda: kb.admin_approval_keyboard(approved_id, user),
+        'rejection_reasons_keyboard': lambda: kb.rejection_reasons_keyboard(approved_id),
+        'join_channel_keyboard': lambda: kb.join_channel_keyboard(),
+        'admin_manage_channels_keyboard': lambda: kb.admin_manage_channels_keyboard(),
+        'teaching_rating_keyboard': lambda: kb.teaching_rating_keyboard(),
+        'exam_difficulty_keyboard': lambda: kb.exam_difficulty_keyboard(),
+        'overall_rating_keyboard': lambda: kb.overall_rating_keyboard(),
+    }
+    cases.update({f"keyboards.{name}": fn for name, fn in keyboards.items()})
+
+    queries = {
+        'get_text': lambda: db.get_text('welcome'),
+        'get_setting': lambda: db.get_setting('force_subscribe', 'false'),
+        'is_admin': lambda: db.is_admin(1),
+        'get_all_required_channels': lambda: db.get_all_required_channels(),
+        'get_experience_cached': lambda: db.get_experience(approved_id),
+        'get_experience_uncached': uncached_experience,
+        'get_experiences_by_status': lambda: db.get_experiences_by_status(ExperienceStatus.PENDING, page=3),
+        'search_experiences_by_professor': lambda: db.search_experiences_by_professor(search_term),
+        'search_experiences_for_user': lambda: db.search_experiences_for_user(search_term),
+        'search_experiences_for_inline': lambda: db.search_experiences_for_inline(search_term),
+        'get_paginated_list': lambda: db.get_paginated_list(Professor, page=3),
+        'get_all_items_by_parent': lambda: db.get_all_items_by_parent(Major, 'field_id', 1),
+        'get_user_experiences': lambda: db.get_user_experiences(exp.user_id),
+        'get_user': lambda: db.get_user(exp.user_id),
+        'add_user_existing': lambda: db.add_user(exp.user_id, 'Bench'),
+        'get_item_name': lambda: db.get_item_name(Professor, 1),
+        'get_all_users': lambda: db.get_all_users(),
+        'get_statistics': lambda: db.get_statistics(),
+        'get_top_professors': lambda: db.get_top_professors(),
+        'get_experience_document_text': lambda: db.get_experience_document_text(approved_id),
+        'get_redacted_experience_ids': lambda: db.get_redacted_experience_ids(),
+        'get_approved_experience_ids': lambda: db.get_approved_experience_ids(),
+        'load_persisted_state': lambda: db.load_persisted_state('conversation:submission', '[1, 1]'),
+        'load_persisted_namespace': lambda: db.load_persisted_namespace('conversation:submission'),
+        'get_channel_memberships': lambda: db.get_channel_memberships(exp.user_id, ['@bench_channel']),
+        'get_experience_with_session': lambda: _with_session(db, approved_id),
+    }
+    cases.update({f"db.{name}": fn for name, fn in queries.items()})
+    return cases
+
+
+def _with_session(db, exp_id):
+    with db.session_scope() as s:
+        return db.get_experience_with_session(s, exp_id)
+
+
+def run_suite(args) -> dict:
+    counts = dataset.seed(args.experiences)
+    cases = build_cases()
+    results = {}
+    for name, fn in cases.items():
+        if args.filter and args.filter not in name:
+            continue
+        results[name] = measure(fn, args.min_time)
+        print(f"{name:<50} {results[name]['median_us']:>12} us median  ({results[name]['calls']} calls)")
+    return {'dataset': counts, 'results': results}
+
+
+def top_professors_at_scale(experiences: int, min_time: float) -> dict:
+    """Seeds a fresh database of the given size in a child process and times get_top_professors."""
+    with tempfile.TemporaryDirectory() as tmp:
+        completed = subprocess.run(
+            [sys.executable, os.path.realpath(__file__), '--child-top-professors', str(experiences),
+             '--min-time', str(min_time), '--database-url', f"sqlite:///{os.path.join(tmp, 'scale.db')}"],
+            capture_output=True, text=True, check=True
+        )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def compare(report: dict, baseline_path: str, threshold: float) -> list:
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)['results']
+    regressions = []
+    for name, result in report['results'].items():
+        old = baseline.get(name)
+        if not old or not old['median_us']:
+            continue
+        ratio = result['median_us'] / old['median_us']
+        if ratio > 1 + threshold:
+            regressions.append({'case': name, 'before_us': old['median_us'], 'after_us': result['median_us'],
+                                'ratio': round(ratio, 2)})
+    return regressions
+
+
+def main(args):
+    if args.child_top_professors:
+        dataset.bench_env(args.database_url)
+        dataset.seed(args.child_top_professors, professors=max(500, args.child_top_professors // 200))
+        import database as db
+        print(json.dumps(measure(db.get_top_professors, args.min_time, min_calls=3)))
+        return 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dataset.bench_env(args.database_url or f"sqlite:///{os.path.join(tmp, 'hot_paths.db')}")
+        report = {'benchmark': 'hot_paths', 'python': platform.python_version(), **run_suite(args)}
+
+    for experiences in args.top_professors_scales:
+        name = f"db.get_top_professors@{experiences}"
+        report['results'][name] = top_professors_at_scale(experiences, args.min_time)
+        print(f"{name:<50} {report['results'][name]['median_us']:>12} us median")
+
+    exit_code = 0
+    if args.compare:
+        report['regressions'] = compare(report, args.compare, args.threshold)
+        for regression in report['regressions']:
+            print(f"REGRESSION {regression['case']}: {regression['before_us']} -> {regression['after_us']} us "
+                  f"(x{regression['ratio']})")
+        exit_code = 1 if report['regressions'] else 0
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return exit_code
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--experiences', type=int, default=5000, help="size of the main benchmark dataset")
+    parser.add_argument('--top-professors-scales', type=int, nargs='*', default=[10_000])
+    parser.add_argument('--min-time', type=float, default=0.2, help="seconds spent on each case")
+    parser.add_argument('--filter', help="only run cases whose name contains this text")
+    parser.add_argument('--database-url', help="empty database to seed instead of a throwaway SQLite file")
+    parser.add_argument('--compare', help="previous JSON report to diff against")
+    parser.add_argument('--threshold', type=float, default=0.2, help="allowed slowdown before flagging, 0.2 = 20%%")
+    parser.add_argument('--json', help="write the report to this file")
+    parser.add_argument('--child-top-professors', type=int, help=argparse.SUPPRESS)
+    sys.exit(main(parser.parse_args()))
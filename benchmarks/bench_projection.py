@@ -0,0 +1,110 @@
+# benchmarks/bench_projection.py
+
+"""
+Latency and memory of the experience list queries: whole ORM objects (the old
+way, every text column loaded) against the column projections database.py now
+runs, at the page sizes the bot uses (10 for the lists, 20 for user search).
+
+Memory is measured with tracemalloc: the peak while one page is loaded and what
+the returned page keeps alive afterwards.
+
+    python benchmarks/bench_projection.py --experiences 50000 --json projection.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+import dataset  # noqa: E402
+from bench_hot_paths import measure  # noqa: E402
+
+
+def orm_page(db, criteria, order_by, page, per_page, join_professor=False):
+    """What the list functions used to do: full Experience objects with course and professor joined."""
+    from sqlalchemy.orm import joinedload, undefer_group
+    from models import Experience, Professor
+
+    with db.session_scope() as s:
+        query = s.query(Experience).join(Professor) if join_professor else s.query(Experience)
+        exps = query.options(
+            undefer_group('text'), joinedload(Experience.course), joinedload(Experience.professor)
+        ).filter(*criteria).order_by(order_by).limit(per_page).offset((page - 1) * per_page).all()
+        return [{'id': exp.id, 'course_name': exp.course.name if exp.course else "نامشخص",
+                 'professor_name': exp.professor.name if exp.professor else "نامشخص", 'status': exp.status}
+                for exp in exps]
+
+
+def allocations(fn) -> dict:
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        result = fn()
+        current, peak = tracemalloc.get_traced_memory()
+        del result
+    finally:
+        tracemalloc.stop()
+    return {'peak_kb': round((peak - before) / 1024, 1), 'retained_kb': round((current - before) / 1024, 1)}
+
+
+def build_cases(per_page: int) -> dict:
+    import database as db
+    from sqlalchemy import func
+    from models import Experience, ExperienceStatus, Professor
+
+    with db.session_scope() as s:
+        busiest_user = s.query(Experience.user_id).group_by(Experience.user_id)\
+            .order_by(func.count(Experience.id).desc()).limit(1).scalar()
+    search_term = db.get_experience(db.get_approved_experience_ids()[0]).professor_name.split()[-1]
+    pending = Experience.status == ExperienceStatus.PENDING
+
+    return {
+        'get_experiences_by_status': (
+            lambda: orm_page(db, [pending], Experience.created_at.asc(), 2, per_page),
+            lambda: db.get_experiences_by_status(ExperienceStatus.PENDING, page=2, per_page=per_page),
+        ),
+        'get_user_experiences': (
+            lambda: orm_page(db, [Experience.user_id == busiest_user], Experience.created_at.desc(), 1, per_page),
+            lambda: db.get_user_experiences(busiest_user, per_page=per_page),
+        ),
+        'search_experiences_by_professor': (
+            lambda: orm_page(db, [Professor.name.like(f"%{search_term}%")], Experience.created_at.desc(), 1,
+                             per_page, join_professor=True),
+            lambda: db.search_experiences_by_professor(search_term, per_page=per_page),
+        ),
+    }
+
+
+def main(args):
+    report = {'benchmark': 'projection', 'python': platform.python_version(), 'results': {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        dataset.bench_env(args.database_url or f"sqlite:///{os.path.join(tmp, 'projection.db')}")
+        report['dataset'] = dataset.seed(args.experiences)
+        for per_page in args.page_sizes:
+            for name, (orm_fn, projected_fn) in build_cases(per_page).items():
+                for variant, fn in (('orm', orm_fn), ('projected', projected_fn)):
+                    key = f"{name}.{variant}@{per_page}"
+                    result = {**measure(fn, args.min_time), **allocations(fn)}
+                    report['results'][key] = result
+                    print(f"{key:<50} {result['median_us']:>10} us median  "
+                          f"{result['peak_kb']:>8} KB peak  {result['retained_kb']:>7} KB retained")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--experiences', type=int, default=20000)
+    parser.add_argument('--page-sizes', type=int, nargs='*', default=[10, 20, 50])
+    parser.add_argument('--min-time', type=float, default=0.3, help="seconds spent on each case")
+    parser.add_argument('--database-url', help="empty database to seed instead of a throwaway SQLite file")
+    parser.add_argument('--json', help="write the report to this file")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,118 @@
+# benchmarks/bench_singleflight.py
+
+"""
+A burst of identical requests, as when a channel post sends many users to the
+same button or search at once: --burst concurrent callers of one helper, run
+three ways.
+
+  blocking      each caller runs the helper on the event loop (the old handlers)
+  threads       each caller runs it in a worker thread, nothing shared
+  singleflight  main.py's way: one call in a worker thread, the others join it
+
+The ranking is cached in a TieredCache, which coalesces concurrent misses
+itself; main.py simply calls it in worker threads, so it has no singleflight
+row and its threads row is main.py's way.
+
+Reported per burst: wall time until every caller has its answer, and how many
+queries actually ran. The ranking cache is cleared before each burst so the
+ranking is really computed.
+
+    python benchmarks/bench_singleflight.py --experiences 20000 --burst 200 --json singleflight.json
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+import dataset  # noqa: E402
+
+
+def build_cases() -> dict:
+    import database as db
+
+    term = db.get_experience(db.get_approved_experience_ids()[0]).professor_name.split()[-1]
+    return {
+        'ranking': (None, db.get_top_professors, (10,)),
+        'statistics': (None, db.get_statistics, ()),
+        'search_user': (('user', term), db.search_experiences_for_user, (term,)),
+        'search_inline': (('inline', term), db.search_experiences_for_inline, (term,)),
+    }
+
+
+async def burst(mode: str, flights, name, key, fn, args, size: int):
+    if mode == 'blocking':
+        async def caller():
+            return fn(*args)
+    elif mode == 'threads':
+        async def caller():
+            return await asyncio.to_thread(fn, *args)
+    else:
+        async def caller():
+            return await flights.run(name, key, fn, *args)
+    started = time.perf_counter()
+    await asyncio.gather(*(caller() for _ in range(size)))
+    return time.perf_counter() - started
+
+
+async def run(args) -> dict:
+    import database as db
+    from singleflight import SingleFlight
+
+    results = {}
+    for name, (key, fn, fn_args) in build_cases().items():
+        cached = name == 'ranking'
+        for mode in ('blocking', 'threads') if cached else ('blocking', 'threads', 'singleflight'):
+            flights = SingleFlight()
+            calls = [0]
+
+            def counted(*a, fn=fn):
+                calls[0] += 1
+                return fn(*a)
+
+            if cached:
+                # Count the queries behind the cache, not the cached calls.
+                loader = db._top_professors
+                db._top_professors = functools.partial(counted, fn=loader)
+            samples = []
+            for _ in range(args.repeat):
+                db.ranking_cache.invalidate()
+                samples.append(await burst(mode, flights, name, key, fn if cached else counted, fn_args, args.burst))
+            if cached:
+                db._top_professors = loader
+            result = {'median_ms': round(statistics.median(samples) * 1000, 2),
+                      'calls_per_burst': calls[0] / args.repeat}
+            results[f"{name}.{mode}"] = result
+            print(f"{name + '.' + mode:<32} {result['median_ms']:>10} ms per burst  "
+                  f"{result['calls_per_burst']:>7g} calls")
+    return results
+
+
+def main(args):
+    report = {'benchmark': 'singleflight', 'python': platform.python_version(), 'burst': args.burst}
+    with tempfile.TemporaryDirectory() as tmp:
+        dataset.bench_env(args.database_url or f"sqlite:///{os.path.join(tmp, 'singleflight.db')}")
+        report['dataset'] = dataset.seed(args.experiences)
+        report['results'] = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--experiences', type=int, default=20000)
+    parser.add_argument('--burst', type=int, default=200, help="concurrent identical callers")
+    parser.add_argument('--repeat', type=int, default=5, help="bursts per case")
+    parser.add_argument('--database-url', help="empty database to seed instead of a throwaway SQLite file")
+    parser.add_argument('--json', help="write the report to this file")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,75 @@
+# benchmarks/bench_tiered_cache.py
+
+"""
+Latency of the catalog and ranking caches per tier: a local hit, a hit in the
+shared tier (the local copy dropped first, as after another instance's
+invalidation) and a miss that runs the query.
+
+The shared tier is the in-process stand-in unless --shared-url gives a Redis
+server, which adds the real network round trip to shared hits.
+
+    python benchmarks/bench_tiered_cache.py --experiences 20000 --json tiered_cache.json
+    python benchmarks/bench_tiered_cache.py --shared-url redis://localhost:6379/15
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+import dataset  # noqa: E402
+from bench_hot_paths import measure  # noqa: E402
+
+
+def build_cases() -> dict:
+    import database as db
+    from models import Course, Major, Professor
+
+    major_id = db.get_paginated_list(Major, per_page=1)[0][0]['id']
+    return {
+        'courses_of_major': (db.catalog_cache, lambda: db.get_all_items_by_parent(Course, 'major_id', major_id)),
+        'professor_list': (db.catalog_cache, lambda: db.get_paginated_list(Professor, per_page=100)),
+        'top_professors': (db.ranking_cache, lambda: db.get_top_professors()),
+    }
+
+
+def main(args):
+    report = {'benchmark': 'tiered_cache', 'python': platform.python_version(), 'results': {}}
+    os.environ['CACHE_SHARED_URL'] = args.shared_url
+    with tempfile.TemporaryDirectory() as tmp:
+        dataset.bench_env(args.database_url or f"sqlite:///{os.path.join(tmp, 'tiered_cache.db')}")
+        report['dataset'] = dataset.seed(args.experiences)
+        for name, (tiered, fn) in build_cases().items():
+            fn()
+
+            def shared_hit():
+                tiered.drop_local()
+                fn()
+
+            def miss():
+                tiered.invalidate()
+                fn()
+
+            for tier, case in (('local_hit', fn), ('shared_hit', shared_hit), ('miss', miss)):
+                key = f"{name}.{tier}"
+                report['results'][key] = measure(case, args.min_time)
+                print(f"{key:<40} {report['results'][key]['median_us']:>10} us median")
+            tiered.invalidate()
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--experiences', type=int, default=20000)
+    parser.add_argument('--shared-url', default='memory://', help="shared tier: memory:// or a redis:// URL")
+    parser.add_argument('--min-time', type=float, default=0.3, help="seconds spent on each case")
+    parser.add_argument('--database-url', help="empty database to seed instead of a throwaway SQLite file")
+    parser.add_argument('--json', help="write the report to this file")
+    sys.exit(main(parser.parse_args()))
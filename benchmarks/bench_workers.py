@@ -0,0 +1,106 @@
+# benchmarks/bench_workers.py
+
+"""
+Throughput of the sharded update dispatcher as the number of workers grows.
+
+Each simulated update waits --handler-ms milliseconds, like a handler that is
+mostly waiting on the database and the Bot API. Workers are UpdateDispatcher
+instances that each own one shard; they share an in-process backend by default
+or any STATE_BACKEND_URL passed with --backend. Per-user ordering is verified
+for every run.
+
+    python benchmarks/bench_workers.py --workers 1 2 4 8 16
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backends import create_backend  # noqa: E402
+from dispatcher import UpdateDispatcher  # noqa: E402
+
+
+def make_updates(users: int, updates_per_user: int):
+    updates = []
+    for seq in range(updates_per_user):
+        for user_id in range(1, users + 1):
+            updates.append({
+                'update_id': len(updates) + 1,
+                'message': {'from': {'id': user_id}, 'chat': {'id': user_id}, 'text': str(seq)},
+            })
+    return updates
+
+
+async def run_once(workers: int, updates, handler_seconds: float, backend_url: str) -> dict:
+    backend = create_backend(backend_url)
+    seen = {}
+    out_of_order = 0
+    done = asyncio.Event()
+    remaining = len(updates)
+
+    async def process(update_data):
+        nonlocal out_of_order, remaining
+        message = update_data['message']
+        user_id, seq = message['from']['id'], int(message['text'])
+        if seen.get(user_id, -1) + 1 != seq:
+            out_of_order += 1
+        seen[user_id] = seq
+        await asyncio.sleep(handler_seconds)
+        remaining -= 1
+        if remaining == 0:
+            done.set()
+
+    queue_prefix = f"bench:{workers}:{time.time_ns()}"
+    ingress = UpdateDispatcher(backend, process, shard_count=workers, local_shards=[], queue_prefix=queue_prefix)
+    consumers = [
+        UpdateDispatcher(backend, process, shard_count=workers, local_shards=[shard], queue_prefix=queue_prefix)
+        for shard in range(workers)
+    ]
+
+    started = time.perf_counter()
+    for consumer in consumers:
+        await consumer.start()
+    for update_data in updates:
+        await ingress.submit(update_data)
+    await done.wait()
+    elapsed = time.perf_counter() - started
+
+    for consumer in consumers:
+        await consumer.stop()
+    await backend.close()
+    return {
+        'workers': workers,
+        'updates': len(updates),
+        'seconds': round(elapsed, 4),
+        'updates_per_second': round(len(updates) / elapsed, 1),
+        'out_of_order': out_of_order,
+    }
+
+
+async def main(args):
+    updates = make_updates(args.users, args.updates_per_user)
+    results = []
+    for workers in args.workers:
+        result = await run_once(workers, updates, args.handler_ms / 1000, args.backend)
+        results.append(result)
+        print(f"{workers:>3} workers: {result['updates_per_second']:>9} updates/s "
+              f"({result['seconds']}s, out of order: {result['out_of_order']})")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'benchmark': 'workers', 'results': results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--updates-per-user', type=int, default=10)
+    parser.add_argument('--handler-ms', type=float, default=5.0)
+    parser.add_argument('--backend', default='memory://')
+    parser.add_argument('--json', help="write results to this file")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,294 @@
+# benchmarks/dataset.py
+
+"""
+Deterministic synthetic data for benchmarks: catalog, users, experiences and
+their search documents, written with bulk inserts so large sizes stay practical.
+
+Names are Persian, written the ways users type them: compound surnames with a
+ZWNJ, a space or nothing in between, and some with Arabic yeh/kaf. Professors,
+courses and users follow long-tailed popularity, ratings lean positive and text
+lengths are log-normal. The same seed always produces the same database.
+
+Set DATABASE_URL before importing this module; use bench_env() for the other
+required settings when running outside a configured deployment. As a script it
+fills an empty database, e.g. for benchmarks/explain_check.py:
+
+    python benchmarks/dataset.py --experiences 1000000 --database-url "mysql+pymysql://root:pw@127.0.0.1/bench?charset=utf8mb4"
+"""
+
+import argparse
+import datetime
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
+ZWNJ = '‌'
+
+WORDS = ['استاد', 'درس', 'کلاس', 'تمرین', 'پروژه', 'امتحان', 'جزوه', 'حضور', 'نمره', 'منابع',
+         'خوب', 'سخت', 'آسان', 'مفید', 'کامل', 'دقیق', 'منظم', 'جذاب', 'طولانی', 'کوتاه',
+         'می‌دهد', 'نمی‌گیرد', 'تمرین‌ها', 'کلاس‌ها', 'سؤال‌ها', 'میان‌ترم', 'پایان‌ترم', 'کوئیز',
+         'خیلی', 'معمولاً', 'بیشتر', 'کمتر', 'اصلاً', 'حتماً', 'ولی', 'و', 'با', 'از', 'برای', 'که',
+         'توضیح', 'مثال', 'اسلاید', 'کتاب', 'فصل', 'ارائه', 'گروهی', 'تحویل', 'مهلت', 'نمره‌دهی']
+FIRST_NAMES = ['علی', 'مریم', 'حسین', 'زهرا', 'رضا', 'فاطمه', 'محمد', 'سارا', 'امیر', 'نرگس',
+               'مهدی', 'لیلا', 'سعید', 'مینا', 'حمید', 'نازنین', 'مجید', 'الهام', 'کاوه', 'شیرین',
+               'بهرام', 'پریسا', 'یاسر', 'کیمیا', 'محمدرضا', 'امیرحسین', 'علی‌اکبر', 'فاطمه‌زهرا']
+LAST_NAMES = ['احمدی', 'رضایی', 'محمدی', 'حسینی', 'کریمی', 'موسوی', 'جعفری', 'صادقی', 'کاظمی', 'رحیمی',
+              'نوری', 'قاسمی', 'مرادی', 'ابراهیمی', 'اکبری', 'شریفی', 'حیدری', 'سلیمانی', 'یزدانی', 'طاهری',
+              'باقری', 'کیانی', 'زمانی', 'نجفی', 'هاشمی', 'صالحی', 'عباسی', 'فرهادی', 'میرزایی', 'یوسفی']
+# Compound surnames: stem + suffix, written with a ZWNJ, a space or joined.
+SURNAME_STEMS = ['حسین', 'علی', 'محمد', 'رضا', 'تقی', 'نور', 'کاظم', 'قلی', 'عبدالله', 'میر']
+SURNAME_SUFFIXES = ['زاده', 'پور', 'نیا', 'نژاد', 'فر', 'خانی']
+TITLES = ['دکتر ', 'مهندس ', '']
+ARABIC_LETTERS = str.maketrans({'ی': 'ي', 'ک': 'ك'})
+PERSIAN_DIGITS = str.maketrans('0123456789', '۰۱۲۳۴۵۶۷۸۹')
+
+FIELDS = [
+    ('مهندسی کامپیوتر', ['نرم‌افزار', 'هوش مصنوعی', 'معماری سیستم‌های کامپیوتری', 'فناوری اطلاعات']),
+    ('مهندسی برق', ['الکترونیک', 'مخابرات', 'قدرت', 'کنترل']),
+    ('مهندسی مکانیک', ['طراحی کاربردی', 'حرارت و سیالات', 'ساخت و تولید', 'مکاترونیک']),
+    ('علوم پایه', ['ریاضی محض', 'ریاضی کاربردی', 'فیزیک', 'شیمی']),
+    ('مهندسی عمران', ['سازه', 'آب', 'راه و ترابری', 'ژئوتکنیک']),
+    ('علوم انسانی', ['روان‌شناسی', 'حقوق', 'اقتصاد', 'مدیریت']),
+    ('مهندسی صنایع', ['بهینه‌سازی سیستم‌ها', 'مدیریت پروژه', 'کیفیت و بهره‌وری', 'لجستیک']),
+    ('مهندسی شیمی', ['فرایند', 'پلیمر', 'بیوتکنولوژی', 'محیط زیست']),
+]
+COURSE_TOPICS = ['ریاضی عمومی', 'فیزیک عمومی', 'معادلات دیفرانسیل', 'آمار و احتمال', 'برنامه‌سازی پیشرفته',
+                 'ساختمان داده‌ها', 'طراحی الگوریتم', 'پایگاه داده', 'سیستم‌عامل', 'شبکه‌های کامپیوتری',
+                 'مدار الکتریکی', 'الکترونیک', 'سیگنال‌ها و سیستم‌ها', 'کنترل خطی', 'ترمودینامیک',
+                 'مکانیک سیالات', 'استاتیک', 'دینامیک', 'مقاومت مصالح', 'زبان عمومی', 'اندیشه اسلامی',
+                 'تاریخ تحلیلی', 'ادبیات فارسی', 'اقتصاد خرد', 'روش تحقیق', 'آز فیزیک', 'کارگاه عمومی',
+                 'یادگیری ماشین', 'ریاضیات گسسته', 'جبر خطی', 'محاسبات عددی', 'انتقال حرارت']
+
+# Share of each overall rating 1..5, and the teaching rating users pick for it.
+OVERALL_RATING_WEIGHTS = [0.06, 0.09, 0.20, 0.33, 0.32]
+TEACHING_BY_RATING = {1: [0, 0, 2, 8], 2: [0, 1, 5, 4], 3: [1, 4, 4, 1], 4: [4, 5, 1, 0], 5: [8, 2, 0, 0]}
+# Median words and log-normal sigma of each free-text answer.
+TEXT_LENGTHS = {'teaching_style': (25, 0.8), 'notes': (10, 0.7), 'project': (12, 0.7), 'exam': (12, 0.7),
+                'attendance_details': (5, 0.6), 'conclusion': (18, 0.7)}
+MAX_WORDS = 600
+
+
+def bench_env(database_url: str):
+    """Fills the settings config.py insists on with harmless values for local runs."""
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.setdefault('BOT_TOKEN', '123456:BENCHMARK')
+    os.environ.setdefault('OWNER_ID', '1')
+    os.environ.setdefault('CHANNEL_ID', '-1001')
+    os.environ.setdefault('BACKUP_CHANNEL_ID', '-1002')
+    os.environ.setdefault('STATE_BACKEND_URL', 'memory://')
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+
+
+def _sentence(rng, words=12):
+    return ' '.join(rng.choices(WORDS, k=words))
+
+
+def _text(rng, column):
+    median, sigma = TEXT_LENGTHS[column]
+    return _sentence(rng, min(MAX_WORDS, max(1, int(rng.lognormvariate(math.log(median), sigma)))))
+
+
+def _batches(rows, size):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def _zipf_cum_weights(n, exponent):
+    """Cumulative weights of a Zipf distribution over n ranks, for random.choices()."""
+    return list(itertools.accumulate(1 / (rank ** exponent) for rank in range(1, n + 1)))
+
+
+def persian_name(rng, first_names=FIRST_NAMES, title_weights=(0.35, 0.05, 0.6)) -> str:
+    """A full name as users type it: optional title, ZWNJ/space/joined compounds, sometimes Arabic letters."""
+    if rng.random() < 0.3:
+        joiner = rng.choices([ZWNJ, ' ', ''], [0.6, 0.3, 0.1])[0]
+        surname = f"{rng.choice(SURNAME_STEMS)}{joiner}{rng.choice(SURNAME_SUFFIXES)}"
+    else:
+        surname = rng.choice(LAST_NAMES)
+    first = rng.choice(first_names)
+    if ZWNJ in first and rng.random() < 0.3:
+        first = first.replace(ZWNJ, ' ')
+    name = f"{rng.choices(TITLES, title_weights)[0]}{first} {surname}"
+    return name.translate(ARABIC_LETTERS) if rng.random() < 0.08 else name
+
+
+def build_catalog(rng, professors: int, fields: int, majors_per_field: int, courses_per_major: int):
+    field_rows, major_rows, course_rows = [], [], []
+    for field_id in range(1, fields + 1):
+        field_name, major_names = FIELDS[field_id - 1] if field_id <= len(FIELDS) else (f"رشته {field_id}", [])
+        field_rows.append({'id': field_id, 'name': field_name})
+        for index in range(majors_per_field):
+            major_id = len(major_rows) + 1
+            name = major_names[index] if index < len(major_names) else f"گرایش {major_id}"
+            major_rows.append({'id': major_id, 'name': name, 'field_id': field_id})
+            topics = rng.sample(COURSE_TOPICS, min(courses_per_major, len(COURSE_TOPICS)))
+            for index in range(courses_per_major):
+                topic = topics[index % len(topics)]
+                level = index // len(topics) + 1
+                name = topic if level == 1 else f"{topic} {str(level).translate(PERSIAN_DIGITS)}"
+                course_rows.append({'id': len(course_rows) + 1, 'name': name, 'major_id': major_id})
+
+    professor_rows, seen = [], set()
+    for professor_id in range(1, professors + 1):
+        name = persian_name(rng)
+        if name in seen:
+            name = f"{name} ({str(professor_id).translate(PERSIAN_DIGITS)})"
+        seen.add(name)
+        professor_rows.append({'id': professor_id, 'name': name})
+    return field_rows, major_rows, course_rows, professor_rows
+
+
+def seed(experiences: int, professors: int = 500, fields: int = 6, majors_per_field: int = 4,
+         courses_per_major: int = 12, users: int | None = None, approved_ratio: float = 0.8,
+         random_seed: int = 1, batch_size: int = 5000, documents: bool = True, span_days: int = 730) -> dict:
+    """Creates the schema and inserts the dataset; returns the counts that were written."""
+    from sqlalchemy import insert
+
+    import database as db
+    from models import (engine, create_tables, Field, Major, Course, Professor, User, Experience,
+                        ExperienceStatus, TeachingRating, ExamDifficulty)
+
+    rng = random.Random(random_seed)
+    users = users or max(10, experiences // 3)
+    create_tables()
+    db.initialize_database()
+
+    field_rows, major_rows, course_rows, professor_rows = build_catalog(
+        rng, professors, fields, majors_per_field, courses_per_major)
+    user_rows = [{'user_id': 10_000 + i, 'first_name': rng.choice(FIRST_NAMES)} for i in range(users)]
+
+    with engine.begin() as conn:
+        for model, rows in ((Field, field_rows), (Major, major_rows), (Course, course_rows),
+                            (Professor, professor_rows), (User, user_rows)):
+            for batch in _batches(rows, batch_size):
+                conn.execute(insert(model), batch)
+
+    # Each professor teaches a few courses of one major; a few professors and users account
+    # for most experiences, as in production.
+    courses_by_major = {}
+    for course in course_rows:
+        courses_by_major.setdefault(course['major_id'], []).append(course)
+    teaches = {}
+    for professor in professor_rows:
+        major_courses = courses_by_major[rng.choice(major_rows)['id']]
+        teaches[professor['id']] = rng.sample(major_courses, min(len(major_courses), rng.randint(1, 6)))
+    professor_ranks = [p['id'] for p in professor_rows]
+    rng.shuffle(professor_ranks)
+    professor_weights = _zipf_cum_weights(len(professor_ranks), 1.05)
+    user_ranks = [u['user_id'] for u in user_rows]
+    rng.shuffle(user_ranks)
+    user_weights = _zipf_cum_weights(len(user_ranks), 1.2)
+
+    majors_by_id = {m['id']: m for m in major_rows}
+    fields_by_id = {f['id']: f for f in field_rows}
+    professor_names = {p['id']: p['name'] for p in professor_rows}
+    statuses = [ExperienceStatus.APPROVED, ExperienceStatus.PENDING, ExperienceStatus.REJECTED]
+    weights = [approved_ratio, (1 - approved_ratio) * 0.4, (1 - approved_ratio) * 0.6]
+    # The newest experiences are mostly still waiting for review.
+    backlog_from = int(experiences * 0.99)
+    teaching_ratings, exam_difficulties = list(TeachingRating), list(ExamDifficulty)
+    started = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    step = datetime.timedelta(days=span_days) / max(1, experiences)
+
+    approved = 0
+    for first_id in range(1, experiences + 1, batch_size):
+        ids = range(first_id, min(first_id + batch_size, experiences + 1))
+        picked_professors = rng.choices(professor_ranks, cum_weights=professor_weights, k=len(ids))
+        picked_users = rng.choices(user_ranks, cum_weights=user_weights, k=len(ids))
+        experience_rows, document_rows = [], []
+        for exp_id, professor_id, user_id in zip(ids, picked_professors, picked_users):
+            course = rng.choice(teaches[professor_id])
+            major = majors_by_id[course['major_id']]
+            has_notes, has_project, has_exam = rng.random() < 0.55, rng.random() < 0.45, rng.random() < 0.85
+            if exp_id >= backlog_from:
+                status = ExperienceStatus.PENDING if rng.random() < 0.8 else ExperienceStatus.APPROVED
+            else:
+                status = rng.choices(statuses, weights)[0]
+            rating = rng.choices(range(1, 6), OVERALL_RATING_WEIGHTS)[0]
+            created_at = started + step * exp_id + datetime.timedelta(seconds=rng.randint(0, 3600))
+            row = {
+                'id': exp_id,
+                'user_id': user_id,
+                'field_id': major['field_id'],
+                'major_id': major['id'],
+                'professor_id': professor_id,
+                'course_id': course['id'],
+                'teaching_style': _text(rng, 'teaching_style'),
+                'notes': _text(rng, 'notes') if has_notes else None,
+                'project': _text(rng, 'project') if has_project else None,
+                'attendance_required': rng.random() < 0.6,
+                'attendance_details': _text(rng, 'attendance_details'),
+                'exam': _text(rng, 'exam') if has_exam else None,
+                'conclusion': _text(rng, 'conclusion'),
+                'status': status,
+                'teaching_rating': rng.choices(teaching_ratings, TEACHING_BY_RATING[rating])[0],
+                'exam_difficulty': rng.choice(exam_difficulties) if has_exam else None,
+                'overall_rating': rating,
+                'has_notes': has_notes,
+                'has_project': has_project,
+                'has_exam': has_exam,
+                'created_at': created_at,
+                'updated_at': created_at,
+            }
+            experience_rows.append(row)
+            if status == ExperienceStatus.APPROVED:
+                approved += 1
+                if documents:
+                    document_rows.append({
+                        'experience_id': exp_id,
+                        'field_name': fields_by_id[major['field_id']]['name'],
+                        'major_name': major['name'],
+                        'professor_name': professor_names[professor_id],
+                        'course_name': course['name'],
+                        'rendered_text': row['conclusion'],
+                        'description': row['conclusion'],
+                        'redacted': False,
+                        'published_at': created_at,
+                    })
+        with engine.begin() as conn:
+            conn.execute(insert(Experience), experience_rows)
+        if document_rows:
+            db.save_experience_documents(document_rows)
+
+    return {
+        'experiences': experiences, 'approved': approved, 'professors': professors,
+        'courses': len(course_rows), 'users': users,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', required=True, help="empty database to fill")
+    parser.add_argument('--experiences', type=int, default=100_000)
+    parser.add_argument('--professors', type=int, help="default: one per 200 experiences, at least 500")
+    parser.add_argument('--users', type=int, help="default: one per 3 experiences")
+    parser.add_argument('--fields', type=int, default=len(FIELDS))
+    parser.add_argument('--majors-per-field', type=int, default=4)
+    parser.add_argument('--courses-per-major', type=int, default=12)
+    parser.add_argument('--approved-ratio', type=float, default=0.8)
+    parser.add_argument('--no-documents', action='store_true', help="skip the search documents")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--json', help="write the counts and timing to this file")
+    args = parser.parse_args()
+
+    bench_env(args.database_url)
+    seed_started = time.perf_counter()
+    counts = seed(args.experiences, professors=args.professors or max(500, args.experiences // 200),
+                  fields=args.fields, majors_per_field=args.majors_per_field,
+                  courses_per_major=args.courses_per_major, users=args.users,
+                  approved_ratio=args.approved_ratio, random_seed=args.seed, batch_size=args.batch_size,
+                  documents=not args.no_documents)
+    seconds = time.perf_counter() - seed_started
+    result = {**counts, 'seed': args.seed, 'seconds': round(seconds, 1),
+              'experiences_per_second': round(args.experiences / seconds)}
+    print(json.dumps(result, ensure_ascii=False))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,132 @@
+# benchmarks/explain_check.py
+
+"""
+EXPLAINs every SELECT the database.py read functions run and flags full scans
+of the large tables, so a missing index shows up before production data does.
+
+The statements are captured while the db.* cases of bench_hot_paths.py run, with
+their real parameters, and explained on the same connection: EXPLAIN on
+MariaDB/MySQL (a 'ALL' access type over --min-rows rows is a finding), EXPLAIN
+QUERY PLAN on SQLite (a SCAN of a large table without an index is a finding).
+Use a database filled by benchmarks/dataset.py, or let it seed a throwaway
+SQLite one. The exit status is 1 when there are findings not excused by --allow.
+
+    python benchmarks/dataset.py --experiences 1000000 --database-url "$URL"
+    python benchmarks/explain_check.py --database-url "$URL" --json explain.json
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+import dataset  # noqa: E402
+
+LARGE_TABLES = frozenset({'experiences', 'experience_documents', 'users', 'bot_persistence', 'channel_memberships'})
+
+
+def capture_statements(engine, fn) -> list:
+    """Runs fn once and returns the (statement, parameters) of the SELECTs it executed."""
+    from sqlalchemy import event
+
+    captured = []
+
+    def _capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith('SELECT'):
+            captured.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', _capture)
+    try:
+        fn()
+    finally:
+        event.remove(engine, 'before_cursor_execute', _capture)
+    return captured
+
+
+def explain(engine, statement, parameters) -> tuple:
+    """Returns the plan rows and the findings for one statement."""
+    with engine.connect() as conn:
+        if engine.dialect.name == 'sqlite':
+            rows = [tuple(row) for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+            plan = [row[-1] for row in rows]
+            findings = [detail for detail in plan
+                        if detail.startswith('SCAN') and 'INDEX' not in detail
+                        and re.sub(r'_\d+$', '', detail.split()[1]) in LARGE_TABLES]
+            return plan, findings
+        result = conn.exec_driver_sql(f"EXPLAIN {statement}", parameters)
+        plan = [dict(zip(result.keys(), row)) for row in result]
+    return plan, None
+
+
+def mysql_findings(plan, min_rows: int) -> list:
+    findings = []
+    for row in plan:
+        table, rows = row.get('table') or '', int(row.get('rows') or 0)
+        if row.get('type') == 'ALL' and rows >= min_rows:
+            findings.append(f"full scan of {table} ({rows} rows)")
+        elif 'filesort' in (row.get('Extra') or '') and table in LARGE_TABLES and rows >= min_rows:
+            findings.append(f"filesort on {table} ({rows} rows)")
+    return findings
+
+
+def check(args) -> dict:
+    import bench_hot_paths
+    from models import engine
+
+    cases = {name: fn for name, fn in bench_hot_paths.build_cases().items() if name.startswith('db.')}
+    report = {}
+    for name, fn in cases.items():
+        if args.filter and args.filter not in name:
+            continue
+        statements = []
+        for statement, parameters in capture_statements(engine, fn):
+            plan, findings = explain(engine, statement, parameters)
+            if findings is None:
+                findings = mysql_findings(plan, args.min_rows)
+            allowed = any(pattern in name for pattern in args.allow)
+            statements.append({'statement': ' '.join(statement.split()), 'plan': plan,
+                               'findings': findings, 'allowed': allowed})
+        report[name] = statements
+    return report
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.database_url:
+            dataset.bench_env(args.database_url)
+            if args.experiences:
+                print(f"Seeded {dataset.seed(args.experiences)}")
+        else:
+            dataset.bench_env(f"sqlite:///{os.path.join(tmp, 'explain.db')}")
+            print(f"Seeded {dataset.seed(args.experiences or 50_000)}")
+        report = check(args)
+
+    failures = 0
+    for name, statements in report.items():
+        for entry in statements:
+            for finding in entry['findings']:
+                marker = 'allowed' if entry['allowed'] else 'FINDING'
+                failures += not entry['allowed']
+                print(f"{marker} {name}: {finding}\n    {entry['statement'][:200]}")
+    print(f"{sum(len(s) for s in report.values())} statements from {len(report)} cases explained, "
+          f"{failures} findings")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'benchmark': 'explain_check', 'results': report}, f, indent=2, ensure_ascii=False, default=str)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help="database already filled by dataset.py; default: seed a SQLite file")
+    parser.add_argument('--experiences', type=int, help="seed this many experiences first (into an empty database)")
+    parser.add_argument('--min-rows', type=int, default=1000, help="MySQL: ignore scans estimated below this")
+    parser.add_argument('--allow', action='append', default=[],
+                        help="case names containing this text may scan (e.g. get_all_users); repeatable")
+    parser.add_argument('--filter', help="only check cases whose name contains this text")
+    parser.add_argument('--json', help="write every plan to this file")
+    sys.exit(main(parser.parse_args()))
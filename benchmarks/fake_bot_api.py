@@ -0,0 +1,202 @@
+# benchmarks/fake_bot_api.py
+
+"""
+A stand-in for api.telegram.org that answers every Bot API method locally.
+
+Point the bot at it with TELEGRAM_API_BASE_URL=http://127.0.0.1:8081. Replies
+are delayed by --latency-ms (+ up to --jitter-ms) and a share of the requests
+can be refused with 429 / retry_after, like the real API under load. Every call
+is recorded per chat, callback query and inline query so a load generator can
+wait for the bot's answer to a given update (see benchmarks/load_test.py).
+
+    pip install -r benchmarks/requirements.txt
+    python benchmarks/fake_bot_api.py --port 8081 --latency-ms 40 --jitter-ms 20 --error-rate 0.01
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import Counter, defaultdict
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+BOT_USER = {'id': 123456, 'is_bot': True, 'first_name': 'Benchmark', 'username': 'benchmark_bot'}
+
+# Parameters PTB sends JSON-encoded inside the form body.
+JSON_PARAMETERS = frozenset({
+    'chat_id', 'from_chat_id', 'message_id', 'user_id', 'reply_markup', 'results', 'allowed_updates',
+    'entities', 'caption_entities', 'cache_time', 'show_alert', 'disable_notification', 'link_preview_options',
+})
+# Methods that do not write into a chat; the load generator waits on these by their own id.
+ANSWER_METHODS = {'answerCallbackQuery': 'callback_query_id', 'answerInlineQuery': 'inline_query_id'}
+MESSAGE_METHODS = frozenset({
+    'sendMessage', 'sendDocument', 'sendPhoto', 'sendVideo', 'sendAudio', 'sendVoice', 'sendAnimation', 'sendSticker',
+})
+EDIT_METHODS = frozenset({'editMessageText', 'editMessageReplyMarkup', 'editMessageCaption'})
+
+
+def _decode(form) -> dict:
+    params = {}
+    for key, value in form.items():
+        if key in JSON_PARAMETERS and isinstance(value, str):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                pass
+        params[key] = value if isinstance(value, (str, int, float, bool, dict, list)) or value is None else '<file>'
+    return params
+
+
+def _chat_type(chat_id) -> str:
+    return 'private' if isinstance(chat_id, int) and chat_id > 0 else 'channel'
+
+
+def inline_buttons(reply_markup) -> list:
+    """callback_data of every inline button of a reply_markup, in display order."""
+    if not isinstance(reply_markup, dict):
+        return []
+    return [button['callback_data'] for row in reply_markup.get('inline_keyboard', [])
+            for button in row if button.get('callback_data')]
+
+
+class FakeBotAPI:
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0,
+                 retry_after: int = 1, random_seed: int = 1):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.rng = random.Random(random_seed)
+        self.message_ids = itertools.count(1000)
+        self.calls = Counter()
+        self.throttled = Counter()
+        self.last_call = {}
+        self.last_message_id = {}
+        self.keyboards = {}
+        self._waiters = defaultdict(list)
+
+    # --- What the load generator uses ---
+
+    def expect(self, key: str, methods=None) -> asyncio.Future:
+        """Future resolved with (time, method, params) of the next call for key ('chat:<id>', 'callback:<id>', 'inline:<id>')."""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[key].append((future, methods))
+        return future
+
+    async def wait_quiet(self, chat_id, quiet: float, limit: float = 2.0):
+        """Waits until the bot has not written to the chat for quiet seconds, or limit seconds passed."""
+        deadline = time.perf_counter() + limit
+        while time.perf_counter() < deadline:
+            idle = time.perf_counter() - self.last_call.get(f"chat:{chat_id}", 0)
+            if idle >= quiet:
+                return
+            await asyncio.sleep(quiet - idle)
+
+    def buttons(self, chat_id) -> list:
+        return self.keyboards.get(chat_id, [])
+
+    def stats(self) -> dict:
+        return {'calls': dict(self.calls), 'throttled': dict(self.throttled)}
+
+    # --- Bot API ---
+
+    def _keys(self, method, params):
+        if method in ANSWER_METHODS:
+            return [f"{ANSWER_METHODS[method].split('_')[0]}:{params.get(ANSWER_METHODS[method])}"]
+        if 'chat_id' in params:
+            return [f"chat:{params['chat_id']}"]
+        return []
+
+    def _record(self, method, params):
+        now = time.perf_counter()
+        chat_id = params.get('chat_id')
+        if method in MESSAGE_METHODS or method == 'copyMessage':
+            self.last_message_id[chat_id] = next(self.message_ids)
+        if method in MESSAGE_METHODS or method in EDIT_METHODS:
+            self.keyboards[chat_id] = inline_buttons(params.get('reply_markup'))
+        for key in self._keys(method, params):
+            self.last_call[key] = now
+            pending = []
+            for future, methods in self._waiters.pop(key, []):
+                if future.done():
+                    continue
+                if methods is None or method in methods:
+                    future.set_result((now, method, params))
+                else:
+                    pending.append((future, methods))
+            if pending:
+                self._waiters[key] = pending
+
+    def _result(self, method, params):
+        chat_id = params.get('chat_id')
+        if method == 'getMe':
+            return BOT_USER
+        if method == 'getChatMember':
+            return {'status': 'member', 'user': {'id': params.get('user_id'), 'is_bot': False, 'first_name': 'User'}}
+        if method == 'getChat':
+            return {'id': chat_id, 'type': _chat_type(chat_id)}
+        if method == 'getWebhookInfo':
+            return {'url': '', 'has_custom_certificate': False, 'pending_update_count': 0}
+        if method == 'copyMessage':
+            return {'message_id': self.last_message_id[chat_id]}
+        if method in MESSAGE_METHODS or (method in EDIT_METHODS and chat_id is not None):
+            message = {
+                'message_id': params.get('message_id') or self.last_message_id.get(chat_id, 1),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': _chat_type(chat_id)},
+                'from': BOT_USER,
+            }
+            if 'text' in params:
+                message['text'] = params['text']
+            if isinstance(params.get('reply_markup'), dict) and 'inline_keyboard' in params['reply_markup']:
+                message['reply_markup'] = params['reply_markup']
+            return message
+        return True
+
+    def build_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.post("/bot{token}/{method}")
+        async def bot_method(token: str, method: str, request: Request):
+            if request.headers.get('content-type', '').startswith('application/json'):
+                params = await request.json()
+            else:
+                params = _decode(await request.form())
+            delay = self.latency + (self.rng.random() * self.jitter if self.jitter else 0)
+            if delay:
+                await asyncio.sleep(delay)
+            self.calls[method] += 1
+            if self.error_rate and method not in ('getMe', 'setWebhook') and self.rng.random() < self.error_rate:
+                self.throttled[method] += 1
+                return JSONResponse(status_code=429, content={
+                    'ok': False, 'error_code': 429,
+                    'description': f"Too Many Requests: retry after {self.retry_after}",
+                    'parameters': {'retry_after': self.retry_after},
+                })
+            self._record(method, params)
+            return {'ok': True, 'result': self._result(method, params)}
+
+        @app.get("/stats")
+        async def stats():
+            return self.stats()
+
+        return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency-ms', type=float, default=40.0, help="base delay of every reply")
+    parser.add_argument('--jitter-ms', type=float, default=20.0, help="random extra delay, 0..jitter")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of requests refused with 429")
+    parser.add_argument('--retry-after', type=int, default=1, help="retry_after sent with injected 429s")
+    args = parser.parse_args()
+    api = FakeBotAPI(args.latency_ms, args.jitter_ms, args.error_rate, args.retry_after)
+    uvicorn.run(api.build_app(), host=args.host, port=args.port, log_level='warning')
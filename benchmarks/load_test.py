@@ -0,0 +1,386 @@
+# benchmarks/load_test.py
+
+"""
+End-to-end load test: realistic user journeys posted to the webhook at a target
+rate, with the Bot API replaced by benchmarks/fake_bot_api.py.
+
+By default the bot runs in a child uvicorn process on a seeded throwaway SQLite
+database (or --database-url) and talks to a fake API started here. Pass
+--webhook-url to drive a bot that is already running instead; it must have
+TELEGRAM_API_BASE_URL pointing at --api-port of this machine.
+
+A journey is a sequence of updates sent by one virtual user, each sent only
+after the bot answered the previous one. The latency of a step is the time from
+posting the update to the bot's first Bot API call for it (a message or edit in
+the user's chat, or the answer to an inline query). Journeys:
+
+    submission  /start, the submit button and the whole wizard, pressing the buttons the bot offers
+    search      the search button, a professor name and one of the results
+    inline      an inline query for a professor name
+    approval    an admin approving a pending experience
+
+    pip install -r benchmarks/requirements.txt
+    python benchmarks/load_test.py --rate 20 --duration 60 --json load.json
+    python benchmarks/load_test.py --mix submission=1,search=3,inline=5,approval=1 --api-latency-ms 80
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+import uvicorn
+
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+import dataset  # noqa: E402
+from fake_bot_api import FakeBotAPI  # noqa: E402
+
+BOT_TOKEN = '123456:BENCHMARK'
+ADMIN_IDS = range(2, 12)
+FIRST_USER_ID = 5_000_000
+
+# Buttons the submission wizard offers, with the name each step is reported under.
+SUBMISSION_BUTTONS = [
+    ('field', re.compile(r'^field_select_\d+$')),
+    ('major', re.compile(r'^major_select_\d+$')),
+    ('course', re.compile(r'^course_select_\d+$')),
+    ('professor', re.compile(r'^professor_select_\d+$')),
+    ('teaching_rating', re.compile(r'^teaching_[A-Z]+$')),
+    ('yes_no', re.compile(r'^(notes|project|attendance|exam)_(yes|no)$')),
+    ('exam_difficulty', re.compile(r'^exam_[A-Z]+$')),
+    ('rating', re.compile(r'^rating_\d$')),
+]
+
+
+class StepFailed(Exception):
+    pass
+
+
+def percentile(samples, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, round(q * (len(ordered) - 1)))]
+
+
+def summarize(samples) -> dict:
+    if not samples:
+        return {'count': 0}
+    return {
+        'count': len(samples),
+        'p50_ms': round(percentile(samples, 0.5) * 1000, 2),
+        'p90_ms': round(percentile(samples, 0.9) * 1000, 2),
+        'p99_ms': round(percentile(samples, 0.99) * 1000, 2),
+        'max_ms': round(max(samples) * 1000, 2),
+    }
+
+
+class VirtualUser:
+    """Sends updates as one Telegram user and waits for the bot's answer to each."""
+
+    update_ids = itertools.count(1)
+    query_ids = itertools.count(1)
+
+    def __init__(self, user_id: int, run):
+        self.user_id = user_id
+        self.run = run
+        self.user = {'id': user_id, 'is_bot': False, 'first_name': 'Load', 'language_code': 'fa'}
+        self.chat = {'id': user_id, 'type': 'private', 'first_name': 'Load'}
+
+    async def _post(self, payload: dict, key: str, step: str, methods=None):
+        api = self.run.api
+        await api.wait_quiet(self.user_id, self.run.settle)
+        waiter = api.expect(key, methods)
+        started = time.perf_counter()
+        try:
+            response = await self.run.client.post(self.run.webhook_url, json={'update_id': next(self.update_ids), **payload})
+            response.raise_for_status()
+            answered_at, _, _ = await asyncio.wait_for(waiter, self.run.step_timeout)
+        except (asyncio.TimeoutError, httpx.HTTPError) as e:
+            self.run.errors[step] += 1
+            raise StepFailed(f"{step}: {type(e).__name__}") from e
+        finally:
+            waiter.cancel()
+        self.run.record(step, answered_at - started)
+        await asyncio.sleep(self.run.think_time())
+
+    async def send_text(self, text: str, step: str):
+        message = {'message_id': next(self.update_ids), 'date': int(time.time()), 'chat': self.chat,
+                   'from': self.user, 'text': text}
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        await self._post({'message': message}, f"chat:{self.user_id}", step)
+
+    async def press(self, data: str, step: str, methods=None):
+        message = {'message_id': self.run.api.last_message_id.get(self.user_id, 1), 'date': int(time.time()),
+                   'chat': self.chat, 'from': {'id': 123456, 'is_bot': True, 'first_name': 'Benchmark'}, 'text': '.'}
+        callback = {'id': str(next(self.query_ids)), 'from': self.user, 'chat_instance': str(self.user_id),
+                    'data': data, 'message': message}
+        await self._post({'callback_query': callback}, f"chat:{self.user_id}", step, methods)
+
+    async def inline(self, query: str, step: str):
+        inline_query = {'id': str(next(self.query_ids)), 'from': self.user, 'query': query, 'offset': ''}
+        await self._post({'inline_query': inline_query}, f"inline:{inline_query['id']}", step)
+
+
+class LoadRun:
+    def __init__(self, args, api: FakeBotAPI, webhook_url: str, pending_ids, buttons: dict):
+        self.args = args
+        self.api = api
+        self.webhook_url = webhook_url
+        self.pending_ids = list(pending_ids)
+        self.texts = buttons
+        self.rng = random.Random(args.seed)
+        self.settle = args.settle_ms / 1000
+        self.step_timeout = args.step_timeout
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.journeys = defaultdict(int)
+        self.admins = asyncio.Queue()
+        for admin_id in args.admin_ids:
+            self.admins.put_nowait(admin_id)
+        self.user_ids = itertools.count(FIRST_USER_ID)
+        self.client = None
+
+    def think_time(self) -> float:
+        return self.rng.uniform(0, 2 * self.args.think_ms / 1000) if self.args.think_ms else 0
+
+    def record(self, step: str, seconds: float):
+        self.latencies[step].append(seconds)
+
+    def professor_query(self) -> str:
+        return self.rng.choice(dataset.LAST_NAMES)
+
+    async def submission(self, user: VirtualUser):
+        await user.send_text('/start', 'submission.start')
+        await user.send_text(self.texts['btn_submit_experience'], 'submission.open')
+        for _ in range(20):
+            await self.api.wait_quiet(user.user_id, self.settle)
+            offered = [(name, data) for data in self.api.buttons(user.user_id)
+                       for name, pattern in SUBMISSION_BUTTONS if pattern.match(data)]
+            if not offered:
+                await user.send_text(' '.join(self.rng.choices(dataset.WORDS, k=8)), 'submission.text')
+                continue
+            name, data = self.rng.choice(offered)
+            await user.press(data, f"submission.{name}")
+            if name == 'rating':
+                return
+        raise StepFailed("submission: wizard did not finish in 20 steps")
+
+    async def search(self, user: VirtualUser):
+        await user.send_text('/start', 'search.start')
+        await user.send_text(self.texts['btn_search'], 'search.open')
+        await user.send_text(self.professor_query(), 'search.query')
+        await self.api.wait_quiet(user.user_id, self.settle)
+        results = [data for data in self.api.buttons(user.user_id) if data.startswith('user_search_result_')]
+        if results:
+            await user.press(self.rng.choice(results), 'search.result')
+
+    async def inline(self, user: VirtualUser):
+        await user.inline(self.professor_query(), 'inline.query')
+
+    async def approval(self, user: VirtualUser):
+        if not self.pending_ids:
+            self.errors['approval.no_pending'] += 1
+            return
+        admin_id = await self.admins.get()
+        try:
+            admin = VirtualUser(admin_id, self)
+            await admin.press(f"exp_approve_{self.pending_ids.pop()}", 'approval.approve', methods={'editMessageText'})
+        finally:
+            self.admins.put_nowait(admin_id)
+
+    async def journey(self, kind: str):
+        user = VirtualUser(next(self.user_ids), self)
+        try:
+            await getattr(self, kind)(user)
+            self.journeys[kind] += 1
+        except StepFailed:
+            self.errors[f"{kind}.aborted"] += 1
+
+    async def drive(self, mix: dict) -> float:
+        """Starts journeys at --rate per second (Poisson arrivals) for --duration seconds; returns the wall time."""
+        kinds, weights = list(mix), list(mix.values())
+        tasks = []
+        started = time.perf_counter()
+        async with httpx.AsyncClient(timeout=self.step_timeout) as self.client:
+            deadline = started + self.args.duration
+            next_start = started
+            while next_start < deadline:
+                await asyncio.sleep(max(0.0, next_start - time.perf_counter()))
+                tasks.append(asyncio.create_task(self.journey(self.rng.choices(kinds, weights)[0])))
+                next_start += self.rng.expovariate(self.args.rate)
+            await asyncio.gather(*tasks)
+        return time.perf_counter() - started
+
+    def report(self, wall_seconds: float) -> dict:
+        all_steps = [seconds for samples in self.latencies.values() for seconds in samples]
+        by_journey = defaultdict(list)
+        for step, samples in self.latencies.items():
+            by_journey[step.split('.')[0]].extend(samples)
+        return {
+            'wall_seconds': round(wall_seconds, 2),
+            'journeys_completed': dict(self.journeys),
+            'steps_per_second': round(len(all_steps) / wall_seconds, 2) if wall_seconds else 0,
+            'journeys_per_second': round(sum(self.journeys.values()) / wall_seconds, 2) if wall_seconds else 0,
+            'all_steps': summarize(all_steps),
+            'journeys': {kind: summarize(samples) for kind, samples in sorted(by_journey.items())},
+            'steps': {step: summarize(samples) for step, samples in sorted(self.latencies.items())},
+            'errors': dict(self.errors),
+            'bot_api': self.api.stats(),
+        }
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(','):
+        kind, _, weight = part.partition('=')
+        if kind.strip() not in ('submission', 'search', 'inline', 'approval'):
+            raise argparse.ArgumentTypeError(f"unknown journey {kind!r}")
+        mix[kind.strip()] = float(weight or 1)
+    return mix
+
+
+def prepare_database(args) -> list:
+    """Seeds the database, registers the load test admins and returns the ids of pending experiences."""
+    import database as db
+    from models import Admin, Experience, ExperienceStatus
+    from sqlalchemy import select
+
+    counts = dataset.seed(args.experiences)
+    print(f"Seeded {counts}")
+    for admin_id in args.admin_ids:
+        db.add_item(Admin, user_id=admin_id)
+    with db.session_scope() as s:
+        return list(s.scalars(select(Experience.id).where(Experience.status == ExperienceStatus.PENDING)))
+
+
+def start_bot_process(args, database_url: str) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        'DATABASE_URL': database_url,
+        'BOT_TOKEN': BOT_TOKEN,
+        'OWNER_ID': '1',
+        'CHANNEL_ID': '-1001',
+        'BACKUP_CHANNEL_ID': '-1002',
+        'STATE_BACKEND_URL': 'memory://',
+        'WORKER_ROLE': 'all',
+        'TELEGRAM_API_BASE_URL': f"http://127.0.0.1:{args.api_port}",
+    })
+    if args.unthrottled:
+        env['TELEGRAM_GLOBAL_RATE'] = '100000'
+    env.pop('DOMAIN_NAME', None)
+    return subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--host', '127.0.0.1', '--port', str(args.bot_port),
+         '--log-level', 'warning'],
+        cwd=dataset.ROOT, env=env
+    )
+
+
+async def wait_until_up(url: str, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.perf_counter() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"bot process exited with status {process.returncode}")
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"bot did not answer {url} within {timeout}s")
+
+
+async def run(args, database_url: str | None) -> dict:
+    api = FakeBotAPI(args.api_latency_ms, args.api_jitter_ms, args.api_error_rate, random_seed=args.seed)
+    api_server = uvicorn.Server(uvicorn.Config(api.build_app(), host='127.0.0.1', port=args.api_port,
+                                               log_level='warning'))
+    api_task = asyncio.create_task(api_server.serve())
+    bot = None
+    try:
+        while not api_server.started:
+            await asyncio.sleep(0.05)
+        import database as db
+        pending_ids = await asyncio.to_thread(prepare_database, args) if database_url else []
+        buttons = {key: db.DEFAULT_TEXTS[key] for key in ('btn_submit_experience', 'btn_search')}
+        webhook_url = args.webhook_url
+        if not webhook_url:
+            bot = start_bot_process(args, database_url)
+            await wait_until_up(f"http://127.0.0.1:{args.bot_port}/metrics", bot)
+            webhook_url = f"http://127.0.0.1:{args.bot_port}/{BOT_TOKEN}"
+        load = LoadRun(args, api, webhook_url, pending_ids, buttons)
+        report = load.report(await load.drive(parse_mix(args.mix)))
+    finally:
+        if bot:
+            bot.terminate()
+            bot.wait(timeout=30)
+        api_server.should_exit = True
+        await api_task
+    return report
+
+
+def print_report(report: dict):
+    print(f"{report['journeys_per_second']} journeys/s, {report['steps_per_second']} updates/s "
+          f"over {report['wall_seconds']}s; completed: {report['journeys_completed']}")
+    rows = [('all steps', report['all_steps'])] + list(report['journeys'].items()) + list(report['steps'].items())
+    for name, stats in rows:
+        if stats['count']:
+            print(f"  {name:<30} n={stats['count']:<6} p50 {stats['p50_ms']:>9} ms  p99 {stats['p99_ms']:>9} ms")
+    if report['errors']:
+        print(f"  errors: {report['errors']}")
+    print(f"  Bot API calls: {report['bot_api']['calls']}, throttled: {report['bot_api']['throttled']}")
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url
+        if not database_url and not args.webhook_url:
+            database_url = f"sqlite:///{os.path.join(tmp, 'load.db')}"
+        dataset.bench_env(database_url or 'sqlite://')
+        report = asyncio.run(run(args, database_url))
+    report = {'benchmark': 'load_test', 'python': platform.python_version(), 'settings': {
+        'rate': args.rate, 'duration': args.duration, 'mix': parse_mix(args.mix), 'think_ms': args.think_ms,
+        'api_latency_ms': args.api_latency_ms, 'api_jitter_ms': args.api_jitter_ms,
+        'api_error_rate': args.api_error_rate, 'unthrottled': args.unthrottled,
+    }, **report}
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rate', type=float, default=10.0, help="journeys started per second")
+    parser.add_argument('--duration', type=float, default=30.0, help="seconds during which journeys are started")
+    parser.add_argument('--mix', default='submission=2,search=3,inline=4,approval=1',
+                        help="relative weight of each journey")
+    parser.add_argument('--think-ms', type=float, default=300.0, help="mean pause of a user between two steps")
+    parser.add_argument('--settle-ms', type=float, default=50.0,
+                        help="quiet time in a chat before the next update, so late replies are not mistaken for answers")
+    parser.add_argument('--step-timeout', type=float, default=15.0)
+    parser.add_argument('--experiences', type=int, default=5000, help="size of the seeded dataset")
+    parser.add_argument('--database-url', help="empty database to seed instead of a throwaway SQLite file")
+    parser.add_argument('--webhook-url', help="drive an already running bot instead of starting one")
+    parser.add_argument('--admin-ids', type=int, nargs='*', default=list(ADMIN_IDS),
+                        help="admins approving experiences; registered when the database is seeded here")
+    parser.add_argument('--bot-port', type=int, default=8090)
+    parser.add_argument('--api-port', type=int, default=8081)
+    parser.add_argument('--api-latency-ms', type=float, default=40.0)
+    parser.add_argument('--api-jitter-ms', type=float, default=20.0)
+    parser.add_argument('--api-error-rate', type=float, default=0.0, help="share of Bot API calls refused with 429")
+    parser.add_argument('--unthrottled', action='store_true',
+                        help="lift the bot's global outgoing rate limit to measure the bot rather than Telegram's limits")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help="write the report to this file")
+    main(parser.parse_args())
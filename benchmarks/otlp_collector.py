@@ -0,0 +1,109 @@
+# benchmarks/otlp_collector.py
+
+"""
+Local stand-in for an OTLP/HTTP trace collector.
+
+Accepts the JSON-encoded OTLP requests the bot sends with TRACE_EXPORTER=otlp,
+appends the spans to --output in the same flat format as TRACE_EXPORTER=jsonl,
+and on exit (Ctrl+C) prints the slowest traces as trees. --summarize reads an
+existing JSONL file instead, e.g. the bot's own traces.jsonl.
+
+    TRACE_SAMPLE_RATE=0.1 TRACE_EXPORTER=otlp OTEL_EXPORTER_OTLP_ENDPOINT=http://127.0.0.1:4318 ...
+    python benchmarks/otlp_collector.py --port 4318 --output traces.jsonl
+    python benchmarks/otlp_collector.py --summarize traces.jsonl --top 5
+"""
+
+import argparse
+import json
+from collections import defaultdict
+
+from fastapi import FastAPI, Request
+
+
+def _attribute_value(value: dict):
+    for kind in ('stringValue', 'boolValue', 'doubleValue'):
+        if kind in value:
+            return value[kind]
+    if 'intValue' in value:
+        return int(value['intValue'])
+    return None
+
+
+def flatten(payload: dict) -> list:
+    """OTLP ExportTraceServiceRequest (JSON) to the flat span dicts written by tracing.JsonlExporter."""
+    spans = []
+    for resource_spans in payload.get('resourceSpans', []):
+        for scope_spans in resource_spans.get('scopeSpans', []):
+            for span in scope_spans.get('spans', []):
+                start, end = int(span['startTimeUnixNano']), int(span['endTimeUnixNano'])
+                status = span.get('status', {})
+                spans.append({
+                    'trace_id': span['traceId'], 'span_id': span['spanId'], 'parent_id': span.get('parentSpanId'),
+                    'name': span['name'], 'start_ns': start, 'end_ns': end,
+                    'duration_ms': round((end - start) / 1e6, 3),
+                    'attributes': {a['key']: _attribute_value(a['value']) for a in span.get('attributes', [])},
+                    'error': status.get('message') if status.get('code') == 2 else None,
+                })
+    return spans
+
+
+def print_slowest(spans, top: int):
+    traces = defaultdict(list)
+    for span in spans:
+        traces[span['trace_id']].append(span)
+    roots = [span for span in spans if not span['parent_id']]
+
+    def total_ms(root):
+        # The webhook span ends once the update is queued; the trace ends with its last span.
+        return (max(span['end_ns'] for span in traces[root['trace_id']]) - root['start_ns']) / 1e6
+
+    for root in sorted(roots, key=total_ms, reverse=True)[:top]:
+        print(f"trace {root['trace_id']}  {total_ms(root):.2f} ms")
+        children = defaultdict(list)
+        for span in traces[root['trace_id']]:
+            children[span['parent_id']].append(span)
+
+        def show(span, depth):
+            offset = (span['start_ns'] - root['start_ns']) / 1e6
+            detail = span['attributes'].get('db.statement', '')[:90]
+            error = f"  ERROR {span['error']}" if span['error'] else ''
+            print(f"  {'  ' * depth}+{offset:8.2f} ms {span['duration_ms']:9.2f} ms  {span['name']}  {detail}{error}")
+            for child in sorted(children[span['span_id']], key=lambda s: s['start_ns']):
+                show(child, depth + 1)
+
+        show(root, 0)
+
+
+def build_app(output: str, collected: list) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/v1/traces")
+    async def receive(request: Request):
+        spans = flatten(await request.json())
+        collected.extend(spans)
+        with open(output, 'a', encoding='utf-8') as f:
+            for span in spans:
+                f.write(json.dumps(span, ensure_ascii=False) + '\n')
+        return {}
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=4318)
+    parser.add_argument('--output', default='traces.jsonl')
+    parser.add_argument('--summarize', help="print the slowest traces of this JSONL file and exit")
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    if args.summarize:
+        with open(args.summarize, encoding='utf-8') as f:
+            print_slowest([json.loads(line) for line in f if line.strip()], args.top)
+    else:
+        import uvicorn
+
+        received = []
+        uvicorn.run(build_app(args.output, received), host=args.host, port=args.port, log_level='warning')
+        print_slowest(received, args.top)
@@ -0,0 +1,304 @@
+# benchmarks/replay.py
+
+"""
+Replays updates recorded in production (UPDATE_RECORDING_DIR) against a local
+bot and the fake Bot API, to compare handler latency and SQL per update across
+versions on the real traffic shape.
+
+The bot runs in a child uvicorn process on a seeded throwaway SQLite database
+(or --database-url), exactly as in benchmarks/load_test.py. Admins seen in the
+capture are registered under their pseudonymous ids. Updates are posted in
+recorded order, at the recorded pace divided by --speed (0 = as fast as the
+webhook accepts them); the report is the difference of the bot's /metrics
+before and after the replay. Pass a previous report with --compare to list
+handlers that got slower, or run more queries, than --threshold; the exit
+status is 1 when there is any.
+
+    python benchmarks/replay.py captures/updates-*.jsonl.gz --speed 10 --json replay.json
+    python benchmarks/replay.py captures/*.gz --speed 0 --compare replay.json
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import math
+import os
+import platform
+import re
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+import uvicorn
+
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+import dataset  # noqa: E402
+import load_test  # noqa: E402
+from fake_bot_api import FakeBotAPI  # noqa: E402
+
+SAMPLE_LINE = re.compile(r'^([a-zA-Z_:][\w:]*)(?:\{(.*)\})?\s+(\S+)$')
+LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def parse_metrics(text: str) -> dict:
+    """Prometheus text format to {(name, ((label, value), ...)): number}."""
+    samples = {}
+    for line in text.splitlines():
+        match = SAMPLE_LINE.match(line)
+        if not match or line.startswith('#'):
+            continue
+        name, labels, value = match.groups()
+        samples[(name, tuple(sorted(LABEL.findall(labels or ''))))] = float(value)
+    return samples
+
+
+def subtract(after: dict, before: dict) -> dict:
+    return {key: value - before.get(key, 0.0) for key, value in after.items()}
+
+
+def histograms(samples: dict, name: str, by: str | None = None) -> dict:
+    """Groups the samples of one histogram per value of label `by`: {group: {'buckets', 'sum', 'count'}}."""
+    grouped = defaultdict(lambda: {'buckets': [], 'sum': 0.0, 'count': 0.0})
+    for (sample, labels), value in samples.items():
+        labels = dict(labels)
+        group = labels.get(by, '') if by else ''
+        if sample == f"{name}_bucket":
+            bound = math.inf if labels['le'] == '+Inf' else float(labels['le'])
+            grouped[group]['buckets'].append((bound, value))
+        elif sample == f"{name}_sum":
+            grouped[group]['sum'] = value
+        elif sample == f"{name}_count":
+            grouped[group]['count'] = value
+    return {group: data for group, data in grouped.items() if data['count'] > 0}
+
+
+def quantile(buckets, count: float, q: float) -> float:
+    """Estimates a quantile from cumulative buckets by linear interpolation, like histogram_quantile()."""
+    buckets = sorted(buckets)
+    rank = q * count
+    lower_bound, lower_count = 0.0, 0.0
+    for bound, cumulative in buckets:
+        if cumulative >= rank:
+            if math.isinf(bound):
+                return lower_bound
+            if cumulative == lower_count:
+                return bound
+            return lower_bound + (bound - lower_bound) * (rank - lower_count) / (cumulative - lower_count)
+        lower_bound, lower_count = bound, cumulative
+    return lower_bound
+
+
+def describe(data: dict, scale: float = 1000.0, unit: str = 'ms') -> dict:
+    count = data['count']
+    return {
+        'count': int(count),
+        f"mean_{unit}": round(data['sum'] / count * scale, 3),
+        f"p50_{unit}": round(quantile(data['buckets'], count, 0.5) * scale, 3),
+        f"p99_{unit}": round(quantile(data['buckets'], count, 0.99) * scale, 3),
+    }
+
+
+def build_report(samples: dict) -> dict:
+    queries = histograms(samples, 'bot_update_db_queries').get('')
+    db_time = histograms(samples, 'bot_update_db_seconds').get('')
+    return {
+        'handlers': {name: describe(data) for name, data in
+                     sorted(histograms(samples, 'bot_handler_duration_seconds', 'handler').items())},
+        'updates': {kind: describe(data) for kind, data in
+                    sorted(histograms(samples, 'bot_update_duration_seconds', 'type').items())},
+        'db_queries_per_update': describe(queries, 1, 'queries') if queries else {},
+        'db_seconds_per_update': describe(db_time) if db_time else {},
+        'db_queries_total': int(sum(v for (name, _), v in samples.items() if name == 'db_queries_total')),
+        'handler_errors': {dict(labels)['handler']: int(v) for (name, labels), v in samples.items()
+                           if name == 'bot_handler_errors_total' and v},
+    }
+
+
+def load_capture(patterns) -> list:
+    from update_recorder import read_capture
+
+    paths = sorted({path for pattern in patterns for path in glob.glob(pattern)})
+    if not paths:
+        raise SystemExit(f"No capture files match {patterns}")
+    entries = sorted(read_capture(paths), key=lambda entry: entry['at'])
+    print(f"Loaded {len(entries)} updates from {len(paths)} files")
+    return entries
+
+
+def sender_id(update: dict):
+    return next((value['from'].get('id') for value in update.values()
+                 if isinstance(value, dict) and isinstance(value.get('from'), dict)), None)
+
+
+def prepare_database(args, entries) -> dict:
+    import database as db
+    from models import Admin
+
+    counts = dataset.seed(args.experiences)
+    admins = {sender_id(entry['update']) for entry in entries if entry.get('admin')} - {None}
+    for admin_id in admins:
+        db.add_item(Admin, user_id=admin_id)
+    return {**counts, 'admins': len(admins)}
+
+
+async def scrape(client, url: str) -> dict:
+    response = await client.get(url)
+    response.raise_for_status()
+    return parse_metrics(response.text)
+
+
+def processed_updates(samples: dict) -> float:
+    return sum(v for (name, _), v in samples.items() if name == 'bot_update_duration_seconds_count')
+
+
+async def replay(entries, webhook_url: str, metrics_url: str, speed: float, drain_timeout: float) -> dict:
+    async with httpx.AsyncClient(timeout=30) as client:
+        before = await scrape(client, metrics_url)
+        started = time.perf_counter()
+        first_at = entries[0]['at']
+        failed = 0
+        for entry in entries:
+            if speed:
+                delay = started + (entry['at'] - first_at) / speed - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            try:
+                (await client.post(webhook_url, json=entry['update'])).raise_for_status()
+            except httpx.HTTPError:
+                failed += 1
+        posted_in = time.perf_counter() - started
+
+        deadline = time.perf_counter() + drain_timeout
+        while True:
+            after = await scrape(client, metrics_url)
+            done = processed_updates(after) - processed_updates(before)
+            if done >= len(entries) - failed or time.perf_counter() > deadline:
+                break
+            await asyncio.sleep(0.2)
+        elapsed = time.perf_counter() - started
+
+    recorded_span = entries[-1]['at'] - first_at
+    return {
+        'updates': len(entries),
+        'post_failures': failed,
+        'processed': int(done),
+        'recorded_seconds': round(recorded_span, 2),
+        'posting_seconds': round(posted_in, 2),
+        'wall_seconds': round(elapsed, 2),
+        'updates_per_second': round(done / elapsed, 2) if elapsed else 0,
+        **build_report(subtract(after, before)),
+    }
+
+
+async def run(args, entries, database_url: str | None) -> dict:
+    api = FakeBotAPI(args.api_latency_ms, args.api_jitter_ms, args.api_error_rate)
+    api_server = uvicorn.Server(uvicorn.Config(api.build_app(), host='127.0.0.1', port=args.api_port,
+                                               log_level='warning'))
+    api_task = asyncio.create_task(api_server.serve())
+    bot = None
+    try:
+        while not api_server.started:
+            await asyncio.sleep(0.05)
+        dataset_counts = await asyncio.to_thread(prepare_database, args, entries) if database_url else {}
+        webhook_url, metrics_url = args.webhook_url, args.metrics_url
+        if not webhook_url:
+            bot = load_test.start_bot_process(args, database_url)
+            metrics_url = f"http://127.0.0.1:{args.bot_port}/metrics"
+            await load_test.wait_until_up(metrics_url, bot)
+            webhook_url = f"http://127.0.0.1:{args.bot_port}/{load_test.BOT_TOKEN}"
+        report = await replay(entries, webhook_url, metrics_url, args.speed, args.drain_timeout)
+        report['dataset'] = dataset_counts
+        report['bot_api'] = api.stats()
+    finally:
+        if bot:
+            bot.terminate()
+            bot.wait(timeout=30)
+        api_server.should_exit = True
+        await api_task
+    return report
+
+
+def compare(report: dict, baseline_path: str, threshold: float) -> list:
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    checks = [(f"handler {name}", 'mean_ms', stats, baseline['handlers'].get(name))
+              for name, stats in report['handlers'].items()]
+    checks.append(('db queries per update', 'mean_queries', report['db_queries_per_update'],
+                   baseline.get('db_queries_per_update')))
+    regressions = []
+    for name, field, new, old in checks:
+        if not new or not old or not old.get(field):
+            continue
+        ratio = new[field] / old[field]
+        if ratio > 1 + threshold:
+            regressions.append({'case': name, 'before': old[field], 'after': new[field], 'ratio': round(ratio, 2)})
+    return regressions
+
+
+def print_report(report: dict):
+    print(f"{report['processed']}/{report['updates']} updates processed in {report['wall_seconds']}s "
+          f"({report['updates_per_second']} updates/s; recorded over {report['recorded_seconds']}s)")
+    per_update = report['db_queries_per_update']
+    if per_update:
+        print(f"  SQL per update: mean {per_update['mean_queries']}, p99 {per_update['p99_queries']}; "
+              f"{report['db_queries_total']} statements in total")
+    for name, stats in sorted(report['handlers'].items(), key=lambda item: -item[1]['count']):
+        print(f"  {name:<45} n={stats['count']:<7} mean {stats['mean_ms']:>9} ms  p99 {stats['p99_ms']:>9} ms")
+    if report['handler_errors']:
+        print(f"  handler errors: {report['handler_errors']}")
+
+
+def main(args):
+    exit_code = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url
+        if not database_url and not args.webhook_url:
+            database_url = f"sqlite:///{os.path.join(tmp, 'replay.db')}"
+        dataset.bench_env(database_url or 'sqlite://')
+        entries = load_capture(args.captures)
+        if not entries:
+            raise SystemExit("The capture is empty")
+        report = asyncio.run(run(args, entries, database_url))
+    report = {'benchmark': 'replay', 'python': platform.python_version(), 'speed': args.speed, **report}
+    print_report(report)
+    if args.compare:
+        report['regressions'] = compare(report, args.compare, args.threshold)
+        for regression in report['regressions']:
+            print(f"REGRESSION {regression['case']}: {regression['before']} -> {regression['after']} "
+                  f"(x{regression['ratio']})")
+        exit_code = 1 if report['regressions'] else 0
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return exit_code
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('captures', nargs='+', help="capture files or glob patterns")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="replay pace relative to the recording, e.g. 10 = ten times faster; 0 = no pauses")
+    parser.add_argument('--drain-timeout', type=float, default=120.0,
+                        help="seconds to wait for the bot to finish the posted updates")
+    parser.add_argument('--experiences', type=int, default=5000, help="size of the seeded dataset")
+    parser.add_argument('--database-url', help="empty database to seed instead of a throwaway SQLite file")
+    parser.add_argument('--webhook-url', help="replay into an already running bot instead of starting one")
+    parser.add_argument('--metrics-url', help="/metrics of the bot given with --webhook-url")
+    parser.add_argument('--bot-port', type=int, default=8090)
+    parser.add_argument('--api-port', type=int, default=8081)
+    parser.add_argument('--api-latency-ms', type=float, default=40.0)
+    parser.add_argument('--api-jitter-ms', type=float, default=20.0)
+    parser.add_argument('--api-error-rate', type=float, default=0.0, help="share of Bot API calls refused with 429")
+    parser.add_argument('--unthrottled', action='store_true',
+                        help="lift the bot's global outgoing rate limit to measure the bot rather than Telegram's limits")
+    parser.add_argument('--compare', help="previous JSON report to diff against")
+    parser.add_argument('--threshold', type=float, default=0.2, help="allowed increase before flagging, 0.2 = 20%%")
+    parser.add_argument('--json', help="write the report to this file")
+    args = parser.parse_args()
+    if args.webhook_url and not args.metrics_url:
+        parser.error("--webhook-url needs --metrics-url")
+    sys.exit(main(args))
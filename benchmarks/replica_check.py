@@ -0,0 +1,124 @@
+# benchmarks/replica_check.py
+
+"""
+Checks the read replica routing in database.py end to end.
+
+By default the primary and the replica are two SQLite files: the replica is a
+copy of the seeded primary, so rows written afterwards exist only on the
+primary, like replication lag that never catches up. Give --primary-url and
+--replica-url to run against two real servers instead (e.g. a MariaDB primary
+and its replica, both already migrated); the lag check is skipped there.
+
+Checked: read-only helpers run on the replica and writes on the primary, a user
+who just wrote reads from the primary (and sees the write), other users stay
+on the replica, and reads fall back to the primary while the replica is down.
+The exit status is 1 when a check fails.
+
+    python benchmarks/replica_check.py
+    python benchmarks/replica_check.py --primary-url "$PRIMARY" --replica-url "$REPLICA"
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+import dataset  # noqa: E402
+
+
+def run_checks(lag_check: bool) -> list:
+    import database as db
+    import models
+    from sqlalchemy import create_engine, event
+    from models import Experience, ExperienceStatus
+
+    executed = Counter()
+    for name, target in (('primary', models.engine), ('replica', models.replica_engines[0])):
+        event.listen(target, 'after_cursor_execute',
+                     lambda *args, name=name: executed.update([name]))
+
+    def routed(fn):
+        executed.clear()
+        result = fn()
+        return result, dict(executed)
+
+    results = []
+
+    def check(name, ok, detail=''):
+        results.append(ok)
+        print(f"{'PASS' if ok else 'FAIL'} {name}{': ' + detail if detail else ''}")
+
+    writer, reader = 900_001, 900_002
+    _, where = routed(lambda: db.get_statistics())
+    check("read-only helper runs on the replica", where.get('replica') and not where.get('primary'), str(where))
+
+    _, where = routed(lambda: db.add_user(reader, 'Reader'))
+    check("write runs on the primary", where.get('primary') and not where.get('replica'), str(where))
+
+    with db.acting_user(writer):
+        def submit():
+            with db.session_scope() as s:
+                template = s.query(Experience).first()
+                s.add(Experience(user_id=writer, field_id=template.field_id, major_id=template.major_id,
+                                 professor_id=template.professor_id, course_id=template.course_id,
+                                 conclusion='replica check', status=ExperienceStatus.PENDING))
+        routed(submit)
+        (experiences, _), where = routed(lambda: db.get_user_experiences(writer))
+    check("the writing user reads from the primary", where.get('primary') and not where.get('replica'), str(where))
+    if lag_check:
+        check("the writing user sees their write", len(experiences) == 1, f"{len(experiences)} experiences")
+
+    with db.acting_user(reader):
+        (experiences, _), where = routed(lambda: db.get_user_experiences(writer))
+    check("another user still reads from the replica", where.get('replica') and not where.get('primary'), str(where))
+    if lag_check:
+        check("the replica lags behind", len(experiences) == 0, f"{len(experiences)} experiences")
+
+    healthy = models.replica_engines[0]
+    models.replica_engines[0] = create_engine('sqlite:////nonexistent-directory/replica.db')
+    try:
+        fallbacks = db.replica_stats['fallbacks']
+        stats, where = routed(lambda: db.get_statistics())
+        check("a failing replica falls back to the primary",
+              where.get('primary') and db.replica_stats['fallbacks'] == fallbacks + 1, str(where))
+        _, where = routed(lambda: db.get_statistics())
+        check("the failed replica is skipped afterwards", where.get('primary') and
+              db.replica_stats['fallbacks'] == fallbacks + 1, str(where))
+    finally:
+        models.replica_engines[0] = healthy
+        db._replica_down_until.clear()
+    print(f"Routing counters: {db.replica_stats}")
+    return results
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.primary_url:
+            os.environ['DATABASE_REPLICA_URLS'] = args.replica_url
+            dataset.bench_env(args.primary_url)
+            lag_check = False
+        else:
+            primary, replica = os.path.join(tmp, 'primary.db'), os.path.join(tmp, 'replica.db')
+            os.environ['DATABASE_REPLICA_URLS'] = f"sqlite:///{replica}"
+            dataset.bench_env(f"sqlite:///{primary}")
+            print(f"Seeded {dataset.seed(args.experiences)}")
+            source, target = sqlite3.connect(primary), sqlite3.connect(replica)
+            source.backup(target)
+            source.close()
+            target.close()
+            lag_check = True
+        results = run_checks(lag_check)
+    print(f"{sum(results)}/{len(results)} checks passed")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--experiences', type=int, default=2000, help="SQLite mode: size of the seeded primary")
+    parser.add_argument('--primary-url', help="an existing, migrated primary database")
+    parser.add_argument('--replica-url', help="a replica of --primary-url")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,333 @@
+# cache.py
+
+import contextvars
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from singleflight import BlockingSingleFlight
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class LRUCache:
+    """A small thread-safe, size-bounded LRU cache with hit/miss counters."""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def discard_where(self, predicate):
+        """Removes every entry whose key matches the predicate."""
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class TTLCache(LRUCache):
+    """An LRUCache whose entries also expire after a per-entry time to live (in seconds)."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60):
+        super().__init__(maxsize)
+        self.ttl = ttl
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: float | None = None):
+        super().set(key, (value, time.monotonic() + (self.ttl if ttl is None else ttl)))
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats['expirations'] = self.expirations
+        return stats
+
+
+# --- Shared tier ---
+
+class SharedStore:
+    """
+    A key/value store all bot instances read (values are bytes), behind the
+    local tiers of TieredCache. Counters made by incr() never expire.
+    """
+
+    def get(self, key: str) -> bytes | None:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl: float):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def incr(self, key: str) -> int:
+        raise NotImplementedError
+
+
+class InProcessSharedStore(SharedStore):
+    """Stand-in for Redis inside one process, for tests and benchmarks."""
+
+    def __init__(self):
+        self._cache = TTLCache(maxsize=100_000)
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        if key in self._counters:
+            return str(self._counters[key]).encode()
+        return self._cache.get(key)
+
+    def set(self, key, value, ttl):
+        self._cache.set(key, value, ttl=ttl)
+
+    def delete(self, key):
+        self._cache.discard(key)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+
+class RedisSharedStore(SharedStore):
+    """
+    Shared tier on any server speaking the Redis protocol. Calls are synchronous:
+    the cached database helpers using it run in worker threads, off the event loop.
+    """
+
+    def __init__(self, url: str, timeout: float = 0.25):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("CACHE_SHARED_URL points to Redis but the 'redis' package is not installed.") from e
+        self._redis = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+
+    def get(self, key):
+        return self._redis.get(key)
+
+    def set(self, key, value, ttl):
+        self._redis.set(key, value, px=max(1, int(ttl * 1000)))
+
+    def delete(self, key):
+        self._redis.delete(key)
+
+    def incr(self, key):
+        return self._redis.incr(key)
+
+
+def create_shared_store(url: str) -> SharedStore | None:
+    """'' for no shared tier, 'memory://' for the in-process stand-in, or 'redis://host:port/db'."""
+    if not url:
+        return None
+    if url.startswith('memory://'):
+        return InProcessSharedStore()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisSharedStore(url)
+    raise ValueError(f"Unsupported CACHE_SHARED_URL: {url}")
+
+
+# --- Tiered caches ---
+
+tiered_caches = {}
+_invalidation_listeners = []
+_local_only = contextvars.ContextVar('cache_local_only', default=False)
+
+
+class LocalMiss(Exception):
+    """Raised by TieredCache.get_or_load inside local_only() when the local tier has no value."""
+
+
+@contextmanager
+def local_only():
+    """Makes TieredCache.get_or_load raise LocalMiss instead of reading the shared tier or loading."""
+    token = _local_only.set(True)
+    try:
+        yield
+    finally:
+        _local_only.reset(token)
+
+
+def on_invalidated(listener):
+    """Registers a callback that receives (cache name, key or None for everything) for every invalidation."""
+    _invalidation_listeners.append(listener)
+    return listener
+
+
+def drop_local(name: str, key: str | None = None):
+    """Applies an invalidation announced by another instance to this process's local tier."""
+    cache = tiered_caches.get(name)
+    if cache is not None:
+        cache.drop_local(key)
+
+
+class TieredCache:
+    """
+    A TTLCache in front of an optional SharedStore. Values are stored as JSON in
+    the shared tier; get_or_load's decode turns the loaded JSON back into the
+    loader's types (tuples come back as lists). invalidate() clears the local
+    tier, moves the shared keys to a new version of the namespace and notifies
+    the on_invalidated listeners, which tell the other instances to clear their
+    local tiers. Entries of older versions are left to expire.
+
+    Concurrent misses of one key share a single shared-tier read and load; an
+    invalidation starts a new flight, so later callers never join a load that
+    began before it.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float, shared: SharedStore | None = None):
+        self.name = name
+        self.ttl = ttl
+        self.local = TTLCache(maxsize, ttl=ttl)
+        self.shared = shared
+        self.shared_hits = 0
+        self.shared_errors = 0
+        self._generation = 0
+        self._shared_version = None
+        self._flights = BlockingSingleFlight(name)
+        tiered_caches[name] = self
+
+    def _version_key(self) -> str:
+        return f"cache:{self.name}:version"
+
+    def _shared_key(self, key: str) -> str:
+        version = self._shared_version
+        if version is None:
+            data = self.shared.get(self._version_key())
+            version = self._shared_version = int(data) if data is not None else 0
+        return f"cache:{self.name}:{version}:{key}"
+
+    def get_or_load(self, key: str, loader, decode=None):
+        value = self.local.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if _local_only.get():
+            raise LocalMiss(key)
+        generation = self._generation
+        return self._flights.run((key, generation), lambda: self._load(key, loader, decode, generation))
+
+    def _load(self, key: str, loader, decode, generation: int):
+        if self.shared is not None:
+            try:
+                data = self.shared.get(self._shared_key(key))
+            except Exception as e:
+                self.shared_errors += 1
+                logger.warning(f"Shared cache read failed for {self.name}: {e}")
+                data = None
+            if data is not None:
+                self.shared_hits += 1
+                value = json.loads(data)
+                if decode is not None:
+                    value = decode(value)
+                if generation == self._generation:
+                    self.local.set(key, value)
+                return value
+        value = loader()
+        # Do not keep a value that was loaded while an invalidation ran.
+        if generation == self._generation:
+            self.local.set(key, value)
+            if self.shared is not None:
+                try:
+                    self.shared.set(self._shared_key(key),
+                                    json.dumps(value, separators=(',', ':')).encode(),
+                                    self.ttl)
+                except Exception as e:
+                    self.shared_errors += 1
+                    logger.warning(f"Shared cache write failed for {self.name}: {e}")
+        return value
+
+    def drop_local(self, key: str | None = None):
+        self._generation += 1
+        if key is None:
+            # Another instance may have moved the shared namespace; read its version again.
+            self._shared_version = None
+            self.local.clear()
+        else:
+            self.local.discard(key)
+
+    def invalidate(self, key: str | None = None):
+        """Drops one key (or everything) here, in the shared tier and, through the listeners, elsewhere."""
+        self.drop_local(key)
+        if self.shared is not None:
+            try:
+                if key is None:
+                    self._shared_version = self.shared.incr(self._version_key())
+                else:
+                    self.shared.delete(self._shared_key(key))
+            except Exception as e:
+                self.shared_errors += 1
+                logger.warning(f"Shared cache invalidation failed for {self.name}: {e}")
+        for listener in _invalidation_listeners:
+            listener(self.name, key)
+
+    def stats(self) -> dict:
+        stats = self.local.stats()
+        stats['coalesced'] = self._flights.coalesced
+        if self.shared is not None:
+            stats['shared_hits'] = self.shared_hits
+            stats['shared_errors'] = self.shared_errors
+        return stats
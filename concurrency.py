@@ -0,0 +1,113 @@
+# concurrency.py
+
+import asyncio
+import sys
+import time
+from contextlib import asynccontextmanager
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from database import acting_user
+from metrics import track_update
+
+
+class KeyedLocks:
+    """A set of asyncio locks created on demand per key and dropped once nobody holds or waits for them."""
+
+    def __init__(self):
+        self._entries = {}
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    @asynccontextmanager
+    async def hold(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = [asyncio.Lock(), 0]
+        lock = entry[0]
+        entry[1] += 1
+        try:
+            if lock.locked():
+                self.contended += 1
+                started = time.perf_counter()
+                await lock.acquire()
+                waited = time.perf_counter() - started
+                self.wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            else:
+                await lock.acquire()
+            self.acquisitions += 1
+            try:
+                yield
+            finally:
+                lock.release()
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and self._entries.get(key) is entry:
+                del self._entries[key]
+
+    def stats(self) -> dict:
+        return {
+            'active_keys': len(self._entries),
+            'acquisitions': self.acquisitions,
+            'contended': self.contended,
+            'contention_rate': round(self.contended / self.acquisitions, 4) if self.acquisitions else 0.0,
+            'wait_seconds_total': round(self.wait_seconds, 4),
+            'wait_seconds_max': round(self.max_wait_seconds, 4),
+        }
+
+
+def update_lock_key(update):
+    """Updates from one user share a lock; updates without a user fall back to their chat."""
+    if not isinstance(update, Update):
+        return None
+    if update.effective_user:
+        return ('user', update.effective_user.id)
+    if update.effective_chat:
+        return ('chat', update.effective_chat.id)
+    return None
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """
+    Processes up to max_concurrent_updates updates at once, but never two updates
+    of the same user (or chat) at the same time, so conversation steps and
+    user_data changes stay serialized per user.
+
+    An update waits for its user's lock before it takes one of the slots, so a
+    user who sends many updates at once occupies a single slot and the others
+    queue behind that user only. PTB's own semaphore, taken before
+    do_process_update, is therefore unbounded.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        self._limit = max_concurrent_updates
+        super().__init__(max_concurrent_updates)
+        # PTB sizes its semaphore from max_concurrent_updates; the limit is applied in do_process_update instead.
+        self._semaphore = asyncio.BoundedSemaphore(sys.maxsize)
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        self.locks = KeyedLocks()
+
+    @property
+    def max_concurrent_updates(self) -> int:
+        return self._limit
+
+    async def do_process_update(self, update, coroutine):
+        with track_update(update):
+            key = update_lock_key(update)
+            if key is None:
+                async with self._slots:
+                    await coroutine
+                return
+            with acting_user(key[1] if key[0] == 'user' else None):
+                async with self.locks.hold(key), self._slots:
+                    await coroutine
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
@@ -45,4 +45,103 @@ if not os.getenv("DB_NAME"):
     print("WARNING: DB_NAME is not set, using default 'ostadbank_db'.")
 
 
-DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?charset=utf8mb4"
\ No newline at end of file
+# DATABASE_URL overrides the DB_* settings, e.g. sqlite:///bench.db for benchmarks
+DATABASE_URL = os.getenv("DATABASE_URL") or f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?charset=utf8mb4"
+# Read replicas (comma-separated URLs like DATABASE_URL) for the read-only helpers in database.py
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# After a user's update writes, that user's reads stay on the primary this many seconds (replication lag)
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", 10))
+# A replica that failed is skipped for this many seconds; its reads go to the primary meanwhile
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", 30))
+
+# --- Cache Configurations ---
+# Number of ExperienceData objects and rendered experience texts kept in memory
+EXPERIENCE_CACHE_SIZE = int(os.getenv("EXPERIENCE_CACHE_SIZE", 2048))
+RENDER_CACHE_SIZE = int(os.getenv("RENDER_CACHE_SIZE", 2048))
+
+# Forced-subscription membership checks: seconds a "member" / "not a member" answer is trusted
+MEMBERSHIP_CACHE_SIZE = int(os.getenv("MEMBERSHIP_CACHE_SIZE", 50000))
+MEMBERSHIP_CACHE_TTL = float(os.getenv("MEMBERSHIP_CACHE_TTL", 600))
+MEMBERSHIP_NEGATIVE_CACHE_TTL = float(os.getenv("MEMBERSHIP_NEGATIVE_CACHE_TTL", 30))
+
+# Catalog lists (fields, majors, courses, professors) and the professor ranking, cached per
+# process and, with CACHE_SHARED_URL, in a tier shared by all instances: '' for none,
+# 'memory://' for an in-process stand-in, or a redis:// URL (usually STATE_BACKEND_URL).
+# The cache:<name>:version counters have no TTL; a volatile-* maxmemory policy never evicts them.
+CACHE_SHARED_URL = os.getenv("CACHE_SHARED_URL", "")
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", 300))
+RANKING_CACHE_TTL = float(os.getenv("RANKING_CACHE_TTL", 60))
+
+# Seconds between checks of the settings config_version written by other instances
+CONFIG_REFRESH_INTERVAL = float(os.getenv("CONFIG_REFRESH_INTERVAL", 15))
+
+
+# --- Persistence Configurations ---
+# Conversation states and user_data are written to the database in batches at most
+# this many seconds after they change.
+PERSISTENCE_FLUSH_INTERVAL = float(os.getenv("PERSISTENCE_FLUSH_INTERVAL", 2))
+
+# Worker threads for the blocking database helpers. More than the connection pool
+# (SQLAlchemy's default pool_size + max_overflow = 15) only makes threads wait for a connection.
+DB_THREADS = int(os.getenv("DB_THREADS", 10))
+
+# Conversations idle this many seconds end and their scratch user_data is cleared (0 = never)
+CONVERSATION_TIMEOUT = float(os.getenv("CONVERSATION_TIMEOUT", 1800))
+# At most this many users keep user_data and conversation states in memory; the least
+# recently active are dropped first, persisted rows included (0 = unlimited)
+MAX_USERS_IN_MEMORY = int(os.getenv("MAX_USERS_IN_MEMORY", 20000))
+# Start tracemalloc at boot with this many frames per allocation (0 = only via /memory start)
+TRACEMALLOC_FRAMES = int(os.getenv("TRACEMALLOC_FRAMES", 0))
+
+
+# --- Scale-out Configurations ---
+# Updates are sharded by user id; each shard is processed in order by one consumer.
+UPDATE_SHARD_COUNT = int(os.getenv("UPDATE_SHARD_COUNT", 8))
+# 'all' = receive webhooks and process every shard, 'ingress' = only enqueue webhooks,
+# 'worker' = only process the shards listed in WORKER_SHARDS (run worker.py). A shard is
+# consumed by one process at a time; others listing it wait as standbys.
+WORKER_ROLE = os.getenv("WORKER_ROLE", "all")
+WORKER_SHARDS = [int(s) for s in os.getenv("WORKER_SHARDS", "").split(",") if s.strip()] or None
+# 'memory://' keeps queues in-process; use a redis:// URL when running several processes.
+STATE_BACKEND_URL = os.getenv("STATE_BACKEND_URL", "memory://")
+
+# Updates of different users are processed concurrently up to this limit;
+# updates of the same user are always serialized.
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", 256))
+
+# Outgoing Bot API requests per second shared by all chats (Telegram allows about 30);
+# the buckets live in STATE_BACKEND_URL, so with Redis all processes share this budget.
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", 30))
+# Bot API server to talk to instead of api.telegram.org, e.g. a local telegram-bot-api
+# or the fake server in benchmarks/fake_bot_api.py (scheme, host and port only)
+TELEGRAM_API_BASE_URL = (os.getenv("TELEGRAM_API_BASE_URL") or "").rstrip("/") or None
+
+# When set, /metrics requires "Authorization: Bearer <token>" or ?token=<token>
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# SQL statements slower than this are logged with the handler that ran them
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 200))
+# Updates running more queries, or one statement shape this many times, are reported
+QUERY_BUDGET_PER_UPDATE = int(os.getenv("QUERY_BUDGET_PER_UPDATE", 40))
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", 8))
+
+# Sampling profiler: share of handler calls profiled continuously (0 = only during
+# /profile windows) and the stack sampling interval
+PROFILE_SAMPLE_PERCENT = float(os.getenv("PROFILE_SAMPLE_PERCENT", 0))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 5))
+
+# Tracing: share of webhook updates traced (0 = off), where finished spans go
+# ('jsonl' = TRACE_JSONL_PATH, 'otlp' = OTLP/HTTP collector at OTEL_EXPORTER_OTLP_ENDPOINT)
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 0))
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "jsonl")
+TRACE_JSONL_PATH = os.getenv("TRACE_JSONL_PATH", "traces.jsonl")
+OTEL_EXPORTER_OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318")
+OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "ostadbank-bot")
+
+# When set, webhook updates are recorded (anonymized) to gzip JSONL files in this
+# directory for benchmarks/replay.py; files rotate at UPDATE_RECORDING_MAX_MB.
+UPDATE_RECORDING_DIR = os.getenv("UPDATE_RECORDING_DIR")
+UPDATE_RECORDING_MAX_MB = float(os.getenv("UPDATE_RECORDING_MAX_MB", 50))
+UPDATE_RECORDING_MAX_FILES = int(os.getenv("UPDATE_RECORDING_MAX_FILES", 10))
+# Key of the id pseudonyms; keep it fixed to get the same fake ids across restarts
+UPDATE_RECORDING_SALT = os.getenv("UPDATE_RECORDING_SALT")
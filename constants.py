@@ -105,4 +105,9 @@ SEARCH_BTN_KEY = 'btn_search'
 RANKING_BTN_KEY = 'btn_ranking'
 USER_SEARCH_PROMPT_KEY = 'user_search_prompt'
 USER_SEARCH_NO_RESULTS_KEY = 'user_search_no_results'
-USER_SEARCH_HEADER_KEY = 'user_search_header'
\ No newline at end of file
+USER_SEARCH_HEADER_KEY = 'user_search_header'
+
+# --- Rendering ---
+# Bump whenever the layout produced by format_experience changes,
+# so cached renders from the old template are never served.
+EXPERIENCE_TEMPLATE_VERSION = 2
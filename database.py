@@ -1,94 +1,316 @@
 # database.py
 
-from sqlalchemy.orm import sessionmaker, joinedload
-from sqlalchemy import or_, func, case
+from sqlalchemy.orm import sessionmaker, joinedload, Session as OrmSession
+from sqlalchemy import func, case, select, event
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.exc import OperationalError, InterfaceError
 from contextlib import contextmanager
+from dataclasses import dataclass
+import contextvars
+import functools
+import hashlib
+import logging
 import math
-from models import (engine, User, Admin, BotText, Field,
+import re
+import threading
+import time
+import unicodedata
+from models import (engine, replica_engines, User, Admin, BotText, Field,
                     Major, Professor, Course, Experience, ExperienceStatus,
-                    RequiredChannel, Setting, ExperienceData, TeachingRating)
+                    RequiredChannel, Setting, ExperienceData, TeachingRating,
+                    ExperienceDocument, PersistedState, ChannelMembership,
+                    ExperienceSummary, InlineDocument, ProfessorRanking)
+from cache import LRUCache, TTLCache, TieredCache, create_shared_store
 import config
 
-Session = sessionmaker(bind=engine)
+logger = logging.getLogger(__name__)
+
+class RoutingSession(OrmSession):
+    """Reads from the replica chosen for the session (info['replica']), if any; flushes and DML go to the primary."""
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        replica = self.info.get('replica')
+        if replica is None or self._flushing or getattr(clause, 'is_dml', False):
+            return engine
+        return replica
+
+Session = sessionmaker(bind=engine, class_=RoutingSession)
+
+# Session-independent ExperienceData objects keyed by experience id.
+experience_cache = LRUCache(config.EXPERIENCE_CACHE_SIZE)
+_experience_invalidation_listeners = []
+
+# Catalog lists and the professor ranking; with CACHE_SHARED_URL every instance shares one copy.
+shared_cache_store = create_shared_store(config.CACHE_SHARED_URL)
+catalog_cache = TieredCache('catalog', 512, config.CATALOG_CACHE_TTL, shared_cache_store)
+ranking_cache = TieredCache('ranking', 16, config.RANKING_CACHE_TTL, shared_cache_store)
+
+def on_experience_invalidated(listener):
+    """Registers a callback that receives the id of every invalidated experience."""
+    _experience_invalidation_listeners.append(listener)
+    return listener
+
+def invalidate_experience(exp_id):
+    """Drops every cached representation of an experience after it was changed or deleted."""
+    experience_cache.discard(exp_id)
+    ranking_cache.invalidate()
+    for listener in _experience_invalidation_listeners:
+        listener(exp_id)
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """Rarely changing admin-panel state read on almost every update."""
+    settings: dict
+    channels: tuple
+    admin_ids: frozenset
+    texts: dict
+    version: int
+
+CONFIG_VERSION_KEY = 'config_version'
+_config_snapshot = None
+# Reloads run one at a time, so the one started last (after the latest write) is swapped in last.
+_config_reload_lock = threading.Lock()
+_config_invalidation_listeners = []
+
+def on_config_invalidated(listener):
+    """Registers a callback run after every admin-panel write, to tell other instances right away."""
+    _config_invalidation_listeners.append(listener)
+    return listener
+
+def _load_config_snapshot() -> ConfigSnapshot:
+    with session_scope() as s:
+        settings = {row.key: row.value for row in s.query(Setting).all()}
+        channels = tuple(
+            {'id': c.id, 'channel_id': c.channel_id, 'channel_link': c.channel_link}
+            for c in s.query(RequiredChannel).order_by(RequiredChannel.id).all()
+        )
+        admin_ids = frozenset(user_id for (user_id,) in s.query(Admin.user_id).all())
+        texts = {key: value for key, value in s.query(BotText.key, BotText.value).all()}
+    return ConfigSnapshot(settings, channels, admin_ids, texts, int(settings.get(CONFIG_VERSION_KEY, 0)))
+
+def config_snapshot() -> ConfigSnapshot:
+    """The current snapshot. Only the very first read loads it in place; start_bot loads it in a thread first."""
+    snapshot = _config_snapshot
+    if snapshot is None:
+        snapshot = reload_config()
+    return snapshot
+
+def reload_config() -> ConfigSnapshot:
+    """Loads a fresh snapshot and swaps it in; readers keep getting the previous one until then."""
+    global _config_snapshot
+    with _config_reload_lock:
+        _config_snapshot = _load_config_snapshot()
+        return _config_snapshot
+
+def invalidate_config(bump_version=True):
+    """
+    Reloads the snapshot after an admin-panel write, so it blocks like the write helpers
+    calling it. bump_version increments the config_version setting so other instances
+    notice the change in refresh_config_if_changed.
+    """
+    if bump_version:
+        with session_scope() as s:
+            row = s.query(Setting).filter_by(key=CONFIG_VERSION_KEY).with_for_update().first()
+            if row:
+                row.value = str(int(row.value) + 1)
+            else:
+                s.add(Setting(key=CONFIG_VERSION_KEY, value='1'))
+    reload_config()
+    if bump_version:
+        for listener in _config_invalidation_listeners:
+            listener()
+
+def refresh_config_if_changed() -> bool:
+    """Reloads the snapshot when another instance bumped config_version."""
+    snapshot = _config_snapshot
+    if snapshot is None:
+        return False
+    with session_scope() as s:
+        value = s.query(Setting.value).filter_by(key=CONFIG_VERSION_KEY).scalar()
+    if int(value or 0) == snapshot.version:
+        return False
+    invalidate_config(bump_version=False)
+    return True
+
+_CONFIG_MODELS = (Admin, RequiredChannel, Setting, BotText)
+_CATALOG_MODELS = (Field, Major, Course, Professor)
+
+# --- Read replica routing ---
+# Helpers decorated with @read_only run on a replica. Reads stay on the primary for a user
+# whose update wrote recently (read-your-writes), and a failing replica is skipped for a while.
+
+_read_only = contextvars.ContextVar('db_read_only', default=False)
+_acting_user = contextvars.ContextVar('db_acting_user', default=None)
+_recent_writers = TTLCache(maxsize=100_000, ttl=config.REPLICA_STICKY_SECONDS)
+_replica_down_until = {}
+_replica_turn = 0
+replica_stats = {'replica_reads': 0, 'sticky_reads': 0, 'replicas_down_reads': 0, 'fallbacks': 0}
+
+class _ReplicaFailed(Exception):
+    def __init__(self, replica, error):
+        super().__init__(str(error))
+        self.replica = replica
+
+@contextmanager
+def acting_user(user_id):
+    """Marks the user whose update is being processed, for read-your-writes routing."""
+    token = _acting_user.set(user_id)
+    try:
+        yield
+    finally:
+        _acting_user.reset(token)
+
+def _choose_replica():
+    global _replica_turn
+    if not replica_engines or not _read_only.get():
+        return None
+    user_id = _acting_user.get()
+    if user_id is not None and _recent_writers.get(user_id):
+        replica_stats['sticky_reads'] += 1
+        return None
+    now = time.monotonic()
+    for _ in range(len(replica_engines)):
+        _replica_turn = (_replica_turn + 1) % len(replica_engines)
+        replica = replica_engines[_replica_turn]
+        if _replica_down_until.get(replica, 0) <= now:
+            replica_stats['replica_reads'] += 1
+            return replica
+    replica_stats['replicas_down_reads'] += 1
+    return None
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _flushed(session, flush_context):
+    session.info['wrote'] = True
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _executed(orm_execute_state):
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info['wrote'] = True
+
+def read_only(fn):
+    """Runs a helper that only reads on a replica when one is configured, and on the primary if it fails."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not replica_engines or _read_only.get():
+            return fn(*args, **kwargs)
+        token = _read_only.set(True)
+        try:
+            return fn(*args, **kwargs)
+        except _ReplicaFailed as e:
+            _replica_down_until[e.replica] = time.monotonic() + config.REPLICA_RETRY_SECONDS
+            replica_stats['fallbacks'] += 1
+            logger.warning(f"Replica {e.replica.url.render_as_string(hide_password=True)} failed, "
+                           f"using the primary for {config.REPLICA_RETRY_SECONDS:g} s: {e}")
+        finally:
+            _read_only.reset(token)
+        token = _read_only.set(False)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _read_only.reset(token)
+    return wrapper
 
 @contextmanager
 def session_scope():
-    session = Session()
+    replica = _choose_replica()
+    session = Session(info={'replica': replica})
     try:
         yield session
         session.commit()
+        if replica_engines and session.info.get('wrote') and _acting_user.get() is not None:
+            _recent_writers.set(_acting_user.get(), True)
     except Exception as e:
         session.rollback()
+        if replica is not None and isinstance(e, (OperationalError, InterfaceError)):
+            raise _ReplicaFailed(replica, e) from e
         print(f"Session rollback due to error: {e}")
         raise
     finally:
         session.close()
 
-def initialize_database():
-    with session_scope() as session:
-        if not session.query(Admin).filter_by(user_id=config.OWNER_ID).first():
-            session.add(Admin(user_id=config.OWNER_ID))
-
-        if not session.query(Setting).filter_by(key='force_subscribe').first():
-            session.add(Setting(key='force_subscribe', value='false'))
-        
-        default_texts = {
-            'welcome': '🤖 سلام! به ربات بانک اساتید خوش آمدید. با این ربات می‌توانید تجربه خود را از اساتید مختلف ثبت کنید و به دیگران در انتخاب واحد کمک کنید. برای شروع، یکی از گزینه‌های زیر را انتخاب کنید.',
-            'rules': '📜 **قوانین و سوالات متداول:**\n\n۱\\. لطفا در بیان تجربیات خود صادق باشید\\.\n۲\\. از به کار بردن الفاظ توهین‌آمیز خودداری کنید\\.',
-            'my_experiences_empty': 'شما هنوز تجربه‌ای ثبت نکرده‌اید.',
-            'my_experiences_header': '📜 **تجربه‌های ثبت شده شما:**',
-            'not_an_admin': '🚫 شما دسترسی لازم برای این کار را ندارید.',
-            'operation_cancelled': 'عملیات لغو شد.',
-            'item_added_successfully': '✅ آیتم جدید با موفقیت اضافه شد.',
-            'item_deleted_successfully': '🗑️ آیتم با موفقیت حذف شد.',
-            'item_updated_successfully': '✏️ آیتم با موفقیت ویرایش شد.',
-            'submission_start': '✅ بسیار خب! فرآیند ثبت تجربه آغاز شد.\n\nلطفا **رشته تحصیلی** خود را از لیست زیر انتخاب کنید:',
-            'choose_major': '📚 عالی! حالا **گرایش** خود را انتخاب کنید:',
-            'choose_course': '📝 لطفا **درس** مورد نظر را انتخاب کنید:',
-            'choose_professor': '👨🏻‍🏫 لطفا **استاد** این درس را انتخاب کنید.',
-            'add_new_professor_prompt': 'لطفا نام کامل استاد جدید را وارد کنید:',
-            'ask_teaching_rating': 'چگونه **سبک تدریس** ایشان را ارزیابی می‌کنید؟',
-            'ask_teaching_style': '✏️ لطفا درباره **سبک تدریس** استاد توضیح دهید (حداکثر ۱۰۰۰ کاراکتر).',
-            'ask_notes_choice': '📚 آیا استاد **جزوه** خاصی دارند یا منبع خاصی معرفی می‌کنند؟',
-            'ask_notes_details': 'لطفا درباره جزوه یا منبع ایشان توضیح دهید (حداکثر ۱۰۰۰ کاراکتر).',
-            'ask_project_choice': '💻 آیا این درس **پروژه** دارد؟',
-            'ask_project_details': 'در صورت وجود، درباره پروژه توضیح دهید (حداکثر ۱۰۰۰ کاراکتر).',
-            'ask_attendance_choice': '🕒 آیا استاد بر روی **حضور و غیاب** حساس هستند؟',
-            'ask_attendance_details': 'لطفا جزئیات **حضور و غیاب** را بنویسید (حداکثر ۱۰۰۰ کاراکتر).',
-            'ask_exam_choice': '⭕️ آیا این درس **امتحان** پایان‌ترم دارد؟',
-            'ask_exam_difficulty': '**سطح سختی امتحان** ایشان چطور بود؟',
-            'ask_exam_details': 'درباره **امتحان** پایان‌ترم توضیح دهید (حداکثر ۱۰۰۰ کاراکتر).',
-            'ask_conclusion': '⚠️ و در آخر، به عنوان **نتیجه‌گیری**، چه توصیه‌ای برای دانشجویان دارید؟ (حداکثر ۱۰۰۰ کاراکتر)',
-            'ask_overall_rating': 'در نهایت، از ۱ تا ۵ ستاره، چه **امتیازی** به این استاد می‌دهید؟',
-            'submission_success': '👌 تجربه شما با موفقیت ثبت و برای بررسی به ادمین‌ها ارسال شد. متشکریم!',
-            'submission_cancel': '❌ فرآیند ثبت تجربه لغو شد.',
-            'admin_panel_welcome': '🔐 به پنل مدیریت خوش آمدید.',
-            'admin_manage_field_header': 'مدیریت رشته‌ها 🎓',
-            'admin_manage_major_header': 'مدیریت گرایش‌ها 📚',
-            'admin_manage_professor_header': 'مدیریت اساتید 👨🏻‍🏫',
-            'admin_manage_course_header': 'مدیریت دروس 📝',
-            'admin_manage_texts_header': 'مدیریت متن‌های ربات ⚙️',
-            'ask_for_new_item_name': 'لطفا نام جدید را وارد کنید:',
-            'ask_for_update_item_name': 'لطفا نام جدید را برای "{current_name}" وارد کنید:',
-            'ask_for_update_text_value': 'لطفا متن جدید را برای کلید `{key}` ارسال کنید:',
-            'confirm_delete': '⚠️ آیا از حذف "{item_name}" مطمئن هستید؟ این عمل غیرقابل بازگشت است.',
-            'select_parent_field': 'لطفا رشته والد را برای این آیتم انتخاب کنید:',
-            'rejection_reason_prompt': 'لطفا دلیل رد این تجربه را انتخاب کنید:',
-            'exp_format_field': '🔖 رشته',
-            'exp_format_professor': '👨🏻‍🏫 استاد',
-            'exp_format_course': '📝 درس',
-            'exp_format_teaching_rating': '📊 ارزیابی تدریس',
-            'exp_format_teaching': '✏️ سبک تدریس',
-            'exp_format_notes': '📚 جزوه',
-            'exp_format_project': '💻 پروژه',
-            'exp_format_attendance': '🕒 حضور و غیاب',
-            'exp_format_exam': '⭕️ امتحان',
-            'exp_format_exam_difficulty': '📈 سطح سختی امتحان',
-            'exp_format_conclusion': '⚠️ نتیجه گیری',
-            'exp_format_overall_rating': '⭐️ امتیاز نهایی',
-            'exp_format_yes': 'دارد',
-            'exp_format_no': 'ندارد',
-            'exp_format_footer': """➖➖➖➖➖➖➖➖➖➖
+def _upsert(session, model, rows, conflict_columns, update_columns):
+    """Inserts rows in one statement, updating update_columns when a key already exists."""
+    if not rows:
+        return
+    dialect = session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        stmt = sqlite.insert(model).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=conflict_columns,
+            set_={column: stmt.excluded[column] for column in update_columns}
+        )
+    else:
+        stmt = mysql.insert(model).values(rows)
+        stmt = stmt.on_duplicate_key_update({column: stmt.inserted[column] for column in update_columns})
+    session.execute(stmt)
+
+def _insert_ignore(session, model, rows, conflict_columns):
+    """Inserts rows in one statement, skipping rows whose key already exists."""
+    if not rows:
+        return
+    if session.get_bind().dialect.name == 'sqlite':
+        stmt = sqlite.insert(model).values(rows).on_conflict_do_nothing(index_elements=conflict_columns)
+    else:
+        stmt = mysql.insert(model).values(rows).prefix_with('IGNORE')
+    session.execute(stmt)
+
+DEFAULT_TEXTS = {
+    'welcome': '🤖 سلام! به ربات بانک اساتید خوش آمدید. با این ربات می‌توانید تجربه خود را از اساتید مختلف ثبت کنید و به دیگران در انتخاب واحد کمک کنید. برای شروع، یکی از گزینه‌های زیر را انتخاب کنید.',
+    'rules': '📜 **قوانین و سوالات متداول:**\n\n۱\\. لطفا در بیان تجربیات خود صادق باشید\\.\n۲\\. از به کار بردن الفاظ توهین‌آمیز خودداری کنید\\.',
+    'my_experiences_empty': 'شما هنوز تجربه‌ای ثبت نکرده‌اید.',
+    'my_experiences_header': '📜 **تجربه‌های ثبت شده شما:**',
+    'not_an_admin': '🚫 شما دسترسی لازم برای این کار را ندارید.',
+    'operation_cancelled': 'عملیات لغو شد.',
+    'item_added_successfully': '✅ آیتم جدید با موفقیت اضافه شد.',
+    'item_deleted_successfully': '🗑️ آیتم با موفقیت حذف شد.',
+    'item_updated_successfully': '✏️ آیتم با موفقیت ویرایش شد.',
+    'submission_start': '✅ بسیار خب! فرآیند ثبت تجربه آغاز شد.\n\nلطفا **رشته تحصیلی** خود را از لیست زیر انتخاب کنید:',
+    'choose_major': '📚 عالی! حالا **گرایش** خود را انتخاب کنید:',
+    'choose_course': '📝 لطفا **درس** مورد نظر را انتخاب کنید:',
+    'choose_professor': '👨🏻‍🏫 لطفا **استاد** این درس را انتخاب کنید.',
+    'add_new_professor_prompt': 'لطفا نام کامل استاد جدید را وارد کنید:',
+    'ask_teaching_rating': 'چگونه **سبک تدریس** ایشان را ارزیابی می‌کنید؟',
+    'ask_teaching_style': '✏️ لطفا درباره **سبک تدریس** استاد توضیح دهید (حداکثر ۱۰۰۰ کاراکتر).',
+    'ask_notes_choice': '📚 آیا استاد **جزوه** خاصی دارند یا منبع خاصی معرفی می‌کنند؟',
+    'ask_notes_details': 'لطفا درباره جزوه یا منبع ایشان توضیح دهید (حداکثر ۱۰۰۰ کاراکتر).',
+    'ask_project_choice': '💻 آیا این درس **پروژه** دارد؟',
+    'ask_project_details': 'در صورت وجود، درباره پروژه توضیح دهید (حداکثر ۱۰۰۰ کاراکتر).',
+    'ask_attendance_choice': '🕒 آیا استاد بر روی **حضور و غیاب** حساس هستند؟',
+    'ask_attendance_details': 'لطفا جزئیات **حضور و غیاب** را بنویسید (حداکثر ۱۰۰۰ کاراکتر).',
+    'ask_exam_choice': '⭕️ آیا این درس **امتحان** پایان‌ترم دارد؟',
+    'ask_exam_difficulty': '**سطح سختی امتحان** ایشان چطور بود؟',
+    'ask_exam_details': 'درباره **امتحان** پایان‌ترم توضیح دهید (حداکثر ۱۰۰۰ کاراکتر).',
+    'ask_conclusion': '⚠️ و در آخر، به عنوان **نتیجه‌گیری**، چه توصیه‌ای برای دانشجویان دارید؟ (حداکثر ۱۰۰۰ کاراکتر)',
+    'ask_overall_rating': 'در نهایت، از ۱ تا ۵ ستاره، چه **امتیازی** به این استاد می‌دهید؟',
+    'submission_success': '👌 تجربه شما با موفقیت ثبت و برای بررسی به ادمین‌ها ارسال شد. متشکریم!',
+    'submission_cancel': '❌ فرآیند ثبت تجربه لغو شد.',
+    'admin_panel_welcome': '🔐 به پنل مدیریت خوش آمدید.',
+    'admin_manage_field_header': 'مدیریت رشته‌ها 🎓',
+    'admin_manage_major_header': 'مدیریت گرایش‌ها 📚',
+    'admin_manage_professor_header': 'مدیریت اساتید 👨🏻‍🏫',
+    'admin_manage_course_header': 'مدیریت دروس 📝',
+    'admin_manage_texts_header': 'مدیریت متن‌های ربات ⚙️',
+    'ask_for_new_item_name': 'لطفا نام جدید را وارد کنید:',
+    'ask_for_update_item_name': 'لطفا نام جدید را برای "{current_name}" وارد کنید:',
+    'ask_for_update_text_value': 'لطفا متن جدید را برای کلید `{key}` ارسال کنید:',
+    'confirm_delete': '⚠️ آیا از حذف "{item_name}" مطمئن هستید؟ این عمل غیرقابل بازگشت است.',
+    'select_parent_field': 'لطفا رشته والد را برای این آیتم انتخاب کنید:',
+    'rejection_reason_prompt': 'لطفا دلیل رد این تجربه را انتخاب کنید:',
+    'exp_format_field': '🔖 رشته',
+    'exp_format_professor': '👨🏻‍🏫 استاد',
+    'exp_format_course': '📝 درس',
+    'exp_format_teaching_rating': '📊 ارزیابی تدریس',
+    'exp_format_teaching': '✏️ سبک تدریس',
+    'exp_format_notes': '📚 جزوه',
+    'exp_format_project': '💻 پروژه',
+    'exp_format_attendance': '🕒 حضور و غیاب',
+    'exp_format_exam': '⭕️ امتحان',
+    'exp_format_exam_difficulty': '📈 سطح سختی امتحان',
+    'exp_format_conclusion': '⚠️ نتیجه گیری',
+    'exp_format_overall_rating': '⭐️ امتیاز نهایی',
+    'exp_format_yes': 'دارد',
+    'exp_format_no': 'ندارد',
+    'exp_format_footer': """➖➖➖➖➖➖➖➖➖➖
 ❗️دوستانی که مایل به معرفی استاد هستن، می‌تونند با ما در ارتباط باشن تا استادشون رو معرفی کنیم و به بقیه کمک بشه برای انتخاب واحد بهتر.
 
 #همیارهمباشیم
@@ -98,196 +320,210 @@ def initialize_database():
 ثبت تجربه شما:
 🆔 @ShamsiOstadBankBot
 ➖➖➖➖➖➖➖➖➖➖""",
-            'exp_format_tags': '♊️ تگ‌ها',
-            'status_pending': '⏳ در انتظار تایید',
-            'status_approved': '✅ تایید شده',
-            'status_rejected': '❌ رد شده',
-            'admin_new_experience_notification': 'یک تجربه جدید برای بررسی ثبت شد - ID: {exp_id}\n\n',
-            'admin_recheck_experience': 'بررسی مجدد تجربه ID: {exp_id}\n\n',
-            'admin_approval_success': '✅ تجربه با ID {exp_id} تایید و در کانال منتشر شد.',
-            'admin_rejection_success': '❌ تجربه با ID {exp_id} به دلیل «{reason}» رد شد.',
-            'user_approval_notification': "✅ تجربه شما برای درس '{course_name}' تایید شد!",
-            'user_rejection_notification': "❌ متاسفانه تجربه شما برای درس '{course_name}' به دلیل «{reason}» رد شد.",
-            'force_subscribe_message': 'کاربر گرامی، برای استفاده از ربات، لطفا ابتدا در کانال‌های زیر عضو شوید و سپس دکمه "عضو شدم" را فشار دهید.',
-            'broadcast_prompt': 'لطفا پیامی که می‌خواهید به تمام کاربران ربات ارسال شود را وارد کنید. می‌توانید از فرمت Markdown استفاده کنید.',
-            'broadcast_success': 'پیام شما برای ارسال به تمام کاربران در صف قرار گرفت. تعداد کل کاربران: {user_count}',
-            'single_message_user_prompt': 'لطفا یوزرنیم (با @) یا آیدی عددی کاربری که می‌خواهید به او پیام ارسال کنید را وارد نمایید.',
-            'single_message_prompt': 'لطفا پیامی که می‌خواهید برای کاربر {target_user} ارسال شود را وارد کنید.',
-            'single_message_success': 'پیام شما با موفقیت برای کاربر {target_user} ارسال شد.',
-            'single_message_fail': 'ارسال پیام به کاربر {target_user} ناموفق بود. خطای دریافتی: {error}',
-            'stats_message': '📊 **آمار ربات:**\n\n👥 تعداد کل کاربران: {total_users}\n✍️ تعداد کل تجربیات ثبت شده: {total_experiences}\n✅ تجربیات تایید شده: {approved_experiences}\n❌ تجربیات رد شده: {rejected_experiences}\n⏳ تجربیات در انتظار تایید: {pending_experiences}',
-            'btn_submit_experience': '✍️ ثبت تجربه',
-            'btn_my_experiences': '📖 تجربه‌های من',
-            'btn_rules': '📜 قوانین',
-            'btn_search': '🔎 جستجو',
-            'btn_ranking': '🏆 رتبه‌بندی اساتید',
-            'btn_best_professors': '🥇 بهترین اساتید',
-            'ranking_menu_header': '🏆 **منوی رتبه‌بندی** 🏆\n\nاز این بخش می‌توانید به لیست اساتید برتر دسترسی داشته باشید\\.',
-            'top_professors_header': '🏆 **۱۰ استاد برتر از نظر دانشجویان** 🏆\n\n',
-            'top_professors_no_results': 'هنوز استادی با حداقل ۳ نظر ثبت شده برای رتبه‌بندی وجود ندارد\\.',
-            'btn_admin_stats': '📊 آمار ربات',
-            'btn_admin_broadcast': '📢 ارسال پیام همگانی',
-            'btn_admin_single_message': '👤 ارسال پیام به کاربر',
-            'btn_admin_manage_channels': '🔗 مدیریت کانال‌ها',
-            'btn_admin_manage_experiences': '📖 تاریخچه نظرات',
-            'btn_admin_manage_admins': '👮‍♂️ مدیریت ادمین‌ها',
-            'btn_main_menu': '⬅️ بازگشت به منوی اصلی',
-            'btn_admin_manage_fields': '🎓 مدیریت رشته‌ها',
-            'btn_admin_manage_majors': '📚 مدیریت گرایش‌ها',
-            'btn_admin_manage_professors': '👨🏻‍🏫 مدیریت اساتید',
-            'btn_admin_manage_courses': '📝 مدیریت دروس',
-            'btn_admin_manage_texts': '⚙️ مدیریت متن‌ها',
-            'btn_add_new': '➕ افزودن آیتم جدید',
-            'btn_add_new_professor': '➕ استاد جدید',
-            'btn_edit': '✏️ ویرایش',
-            'btn_delete': '🗑️ حذف',
-            'btn_yes': '✅ بله',
-            'btn_no': '⛔️ خیر',
-            'btn_back_to_panel': '🔙 بازگشت به پنل اصلی',
-            'btn_back_to_list': '🔙 بازگشت به لیست',
-            'btn_cancel': '❌ لغو',
-            'btn_confirm_delete': '✅ بله، حذف کن',
-            'btn_cancel_delete': '❌ خیر، بازگشت',
-            'btn_approve_exp': '✅ تایید تجربه',
-            'btn_reject_exp': '❌ رد تجربه',
-            'btn_delete_content_by_request': '🗑 حذف به درخواست استاد',
-            'btn_next_page': 'صفحه بعد ◀️',
-            'btn_prev_page': '▶️ صفحه قبل',
-            'btn_reject_reason_1': 'توهین‌آمیز',
-            'btn_reject_reason_2': 'نامفهوم',
-            'btn_reject_reason_3': 'اسپم',
-            'btn_i_am_member': 'عضو شدم ✅',
-            'admin_experiences_menu_header': '📜 مدیریت نظرات',
-            'btn_admin_pending_reviews': '⏳ مشاهده نظرات در انتظار تایید',
-            'btn_admin_search_edit': '🔍 جستجو و ویرایش نظرات',
-            'admin_pending_header': '⏳ لیست نظرات در انتظار تایید:',
-            'admin_no_pending_experiences': 'هیچ نظر جدیدی برای بررسی وجود ندارد.',
-            'admin_search_prompt': 'لطفا نام استاد مورد نظر را برای جستجو وارد کنید. می‌توانید بخشی از نام را نیز وارد کنید.',
-            'admin_search_results_header': 'نتایج جستجو برای "{query}":',
-            'admin_search_no_results': 'هیچ نتیجه‌ای برای "{query}" یافت نشد.',
-            'user_search_prompt': '🔎 لطفا نام استاد یا درس مورد نظر خود را برای جستجو وارد کنید:',
-            'user_search_no_results': '🤷‍♂️ متاسفانه هیچ نتیجه‌ای برای جستجوی شما یافت نشد.',
-            'user_search_header': 'نتایج جستجو برای "{query}":',
-            'content_deleted_by_request': 'به درخواست استاد این محتوا حذف شد',
-            'admin_content_deleted_success': '✅ محتوای نظر با موفقیت در کانال ویرایش شد.'
-        }
+    'exp_format_tags': '♊️ تگ‌ها',
+    'status_pending': '⏳ در انتظار تایید',
+    'status_approved': '✅ تایید شده',
+    'status_rejected': '❌ رد شده',
+    'admin_new_experience_notification': 'یک تجربه جدید برای بررسی ثبت شد - ID: {exp_id}\n\n',
+    'admin_recheck_experience': 'بررسی مجدد تجربه ID: {exp_id}\n\n',
+    'admin_approval_success': '✅ تجربه با ID {exp_id} تایید و در کانال منتشر شد.',
+    'admin_rejection_success': '❌ تجربه با ID {exp_id} به دلیل «{reason}» رد شد.',
+    'user_approval_notification': "✅ تجربه شما برای درس '{course_name}' تایید شد!",
+    'user_rejection_notification': "❌ متاسفانه تجربه شما برای درس '{course_name}' به دلیل «{reason}» رد شد.",
+    'force_subscribe_message': 'کاربر گرامی، برای استفاده از ربات، لطفا ابتدا در کانال‌های زیر عضو شوید و سپس دکمه "عضو شدم" را فشار دهید.',
+    'broadcast_prompt': 'لطفا پیامی که می‌خواهید به تمام کاربران ربات ارسال شود را وارد کنید. می‌توانید از فرمت Markdown استفاده کنید.',
+    'broadcast_success': 'پیام شما برای ارسال به تمام کاربران در صف قرار گرفت. تعداد کل کاربران: {user_count}',
+    'single_message_user_prompt': 'لطفا یوزرنیم (با @) یا آیدی عددی کاربری که می‌خواهید به او پیام ارسال کنید را وارد نمایید.',
+    'single_message_prompt': 'لطفا پیامی که می‌خواهید برای کاربر {target_user} ارسال شود را وارد کنید.',
+    'single_message_success': 'پیام شما با موفقیت برای کاربر {target_user} ارسال شد.',
+    'single_message_fail': 'ارسال پیام به کاربر {target_user} ناموفق بود. خطای دریافتی: {error}',
+    'stats_message': '📊 **آمار ربات:**\n\n👥 تعداد کل کاربران: {total_users}\n✍️ تعداد کل تجربیات ثبت شده: {total_experiences}\n✅ تجربیات تایید شده: {approved_experiences}\n❌ تجربیات رد شده: {rejected_experiences}\n⏳ تجربیات در انتظار تایید: {pending_experiences}',
+    'btn_submit_experience': '✍️ ثبت تجربه',
+    'btn_my_experiences': '📖 تجربه‌های من',
+    'btn_rules': '📜 قوانین',
+    'btn_search': '🔎 جستجو',
+    'btn_ranking': '🏆 رتبه‌بندی اساتید',
+    'btn_best_professors': '🥇 بهترین اساتید',
+    'ranking_menu_header': '🏆 **منوی رتبه‌بندی** 🏆\n\nاز این بخش می‌توانید به لیست اساتید برتر دسترسی داشته باشید\\.',
+    'top_professors_header': '🏆 **۱۰ استاد برتر از نظر دانشجویان** 🏆\n\n',
+    'top_professors_no_results': 'هنوز استادی با حداقل ۳ نظر ثبت شده برای رتبه‌بندی وجود ندارد\\.',
+    'btn_admin_stats': '📊 آمار ربات',
+    'btn_admin_broadcast': '📢 ارسال پیام همگانی',
+    'btn_admin_single_message': '👤 ارسال پیام به کاربر',
+    'btn_admin_manage_channels': '🔗 مدیریت کانال‌ها',
+    'btn_admin_manage_experiences': '📖 تاریخچه نظرات',
+    'btn_admin_manage_admins': '👮‍♂️ مدیریت ادمین‌ها',
+    'btn_main_menu': '⬅️ بازگشت به منوی اصلی',
+    'btn_admin_manage_fields': '🎓 مدیریت رشته‌ها',
+    'btn_admin_manage_majors': '📚 مدیریت گرایش‌ها',
+    'btn_admin_manage_professors': '👨🏻‍🏫 مدیریت اساتید',
+    'btn_admin_manage_courses': '📝 مدیریت دروس',
+    'btn_admin_manage_texts': '⚙️ مدیریت متن‌ها',
+    'btn_add_new': '➕ افزودن آیتم جدید',
+    'btn_add_new_professor': '➕ استاد جدید',
+    'btn_edit': '✏️ ویرایش',
+    'btn_delete': '🗑️ حذف',
+    'btn_yes': '✅ بله',
+    'btn_no': '⛔️ خیر',
+    'btn_back_to_panel': '🔙 بازگشت به پنل اصلی',
+    'btn_back_to_list': '🔙 بازگشت به لیست',
+    'btn_cancel': '❌ لغو',
+    'btn_confirm_delete': '✅ بله، حذف کن',
+    'btn_cancel_delete': '❌ خیر، بازگشت',
+    'btn_approve_exp': '✅ تایید تجربه',
+    'btn_reject_exp': '❌ رد تجربه',
+    'btn_delete_content_by_request': '🗑 حذف به درخواست استاد',
+    'btn_next_page': 'صفحه بعد ◀️',
+    'btn_prev_page': '▶️ صفحه قبل',
+    'btn_reject_reason_1': 'توهین‌آمیز',
+    'btn_reject_reason_2': 'نامفهوم',
+    'btn_reject_reason_3': 'اسپم',
+    'btn_i_am_member': 'عضو شدم ✅',
+    'admin_experiences_menu_header': '📜 مدیریت نظرات',
+    'btn_admin_pending_reviews': '⏳ مشاهده نظرات در انتظار تایید',
+    'btn_admin_search_edit': '🔍 جستجو و ویرایش نظرات',
+    'admin_pending_header': '⏳ لیست نظرات در انتظار تایید:',
+    'admin_no_pending_experiences': 'هیچ نظر جدیدی برای بررسی وجود ندارد.',
+    'admin_search_prompt': 'لطفا نام استاد مورد نظر را برای جستجو وارد کنید. می‌توانید بخشی از نام را نیز وارد کنید.',
+    'admin_search_results_header': 'نتایج جستجو برای "{query}":',
+    'admin_search_no_results': 'هیچ نتیجه‌ای برای "{query}" یافت نشد.',
+    'user_search_prompt': '🔎 لطفا نام استاد یا درس مورد نظر خود را برای جستجو وارد کنید:',
+    'user_search_no_results': '🤷‍♂️ متاسفانه هیچ نتیجه‌ای برای جستجوی شما یافت نشد.',
+    'user_search_header': 'نتایج جستجو برای "{query}":',
+    'content_deleted_by_request': 'به درخواست استاد این محتوا حذف شد',
+    'admin_content_deleted_success': '✅ محتوای نظر با موفقیت در کانال ویرایش شد.'
+}
+
+# Changes whenever a text key is added or removed, so unchanged deployments skip seeding.
+TEXT_SEED_VERSION = hashlib.sha1('\n'.join(sorted(DEFAULT_TEXTS)).encode('utf-8')).hexdigest()
+TEXT_SEED_VERSION_KEY = 'text_seed_version'
 
+def initialize_database():
+    with session_scope() as session:
+        if not session.query(Admin).filter_by(user_id=config.OWNER_ID).first():
+            session.add(Admin(user_id=config.OWNER_ID))
+
+        if not session.query(Setting).filter_by(key='force_subscribe').first():
+            session.add(Setting(key='force_subscribe', value='false'))
 
-        for key, value in default_texts.items():
-            if not session.query(BotText).filter_by(key=key).first():
-                session.add(BotText(key=key, value=value))
+        seed_version = session.query(Setting).filter_by(key=TEXT_SEED_VERSION_KEY).first()
+        if seed_version and seed_version.value == TEXT_SEED_VERSION:
+            return 0
+
+        existing_keys = {key for (key,) in session.query(BotText.key).all()}
+        missing = [{'key': key, 'value': value} for key, value in DEFAULT_TEXTS.items() if key not in existing_keys]
+        _insert_ignore(session, BotText, missing, ['key'])
+
+        if seed_version:
+            seed_version.value = TEXT_SEED_VERSION
+        else:
+            session.add(Setting(key=TEXT_SEED_VERSION_KEY, value=TEXT_SEED_VERSION))
+    invalidate_config(bump_version=False)
+    return len(missing)
 
 def get_text(key, **kwargs):
-    with session_scope() as s:
-        txt = s.query(BotText).filter_by(key=key).first()
-        if not txt:
-            return f"⚠️[{key}]"
-        return txt.value.format(**kwargs)
+    value = config_snapshot().texts.get(key)
+    if value is None:
+        return f"⚠️[{key}]"
+    return value.format(**kwargs)
 
+def set_text(key, value):
+    with session_scope() as s:
+        text_item = s.query(BotText).filter_by(key=key).first()
+        if not text_item:
+            return False
+        text_item.value = value
+    invalidate_config()
+    return True
+
+UNKNOWN_NAME = "نامشخص"
+
+def _summary_query(s, *criteria):
+    """Selects only what the experience lists show: no ORM objects and none of the text columns."""
+    return s.query(Experience.id, Course.name, Professor.name, Experience.status)\
+        .outerjoin(Course, Experience.course_id == Course.id)\
+        .outerjoin(Professor, Experience.professor_id == Professor.id)\
+        .filter(*criteria)
+
+def _summaries(rows) -> list[ExperienceSummary]:
+    return [ExperienceSummary(exp_id, course_name or UNKNOWN_NAME, professor_name or UNKNOWN_NAME, status)
+            for exp_id, course_name, professor_name, status in rows]
+
+@read_only
 def get_experiences_by_status(status: ExperienceStatus, page=1, per_page=10):
     with session_scope() as s:
-        query = s.query(Experience).options(
-            joinedload(Experience.course),
-            joinedload(Experience.professor)
-        ).filter_by(status=status)
-
-        total_items = query.count()
+        total_items = s.query(func.count(Experience.id)).filter(Experience.status == status).scalar()
         total_pages = math.ceil(total_items / per_page)
-        
-        offset = (page - 1) * per_page
-        exps = query.order_by(Experience.created_at.asc()).limit(per_page).offset(offset).all()
 
-        results = []
-        for exp in exps:
-            course_name = exp.course.name if exp.course else "نامشخص"
-            professor_name = exp.professor.name if exp.professor else "نامشخص"
-            results.append({
-                'id': exp.id,
-                'course_name': course_name,
-                'professor_name': professor_name,
-                'status': exp.status
-            })
-        return results, total_pages
+        offset = (page - 1) * per_page
+        rows = _summary_query(s, Experience.status == status)\
+            .order_by(Experience.created_at.asc()).limit(per_page).offset(offset).all()
+        return _summaries(rows), total_pages
 
+@read_only
 def search_experiences_by_professor(query_str: str, page=1, per_page=10):
     with session_scope() as s:
-        query = s.query(Experience).join(Professor).filter(Professor.name.like(f"%{query_str}%"))
-        
-        total_items = query.count()
+        matches = Professor.name.like(f"%{query_str}%")
+        total_items = s.query(func.count(Experience.id))\
+            .join(Professor, Experience.professor_id == Professor.id).filter(matches).scalar()
         total_pages = math.ceil(total_items / per_page)
-        
+
         offset = (page - 1) * per_page
-        exps = query.options(
-            joinedload(Experience.course),
-            joinedload(Experience.professor)
-        ).order_by(Experience.created_at.desc()).limit(per_page).offset(offset).all()
+        rows = _summary_query(s, matches)\
+            .order_by(Experience.created_at.desc()).limit(per_page).offset(offset).all()
+        return _summaries(rows), total_pages
 
-        results = []
-        for exp in exps:
-            course_name = exp.course.name if exp.course else "نامشخص"
-            professor_name = exp.professor.name if exp.professor else "نامشخص"
-            results.append({
-                'id': exp.id,
-                'course_name': course_name,
-                'professor_name': professor_name,
-                'status': exp.status
-            })
-        return results, total_pages
+# Words shorter than this are not in a MariaDB/MySQL full-text index (innodb_ft_min_token_size).
+FULLTEXT_MIN_WORD = 3
+_FULLTEXT_OPERATORS = re.compile(r'[+\-<>()~*"@]+')
 
-def search_experiences_for_user(query_str: str, page=1, per_page=10):
+def _document_search_filter(query_str: str):
+    """
+    Matches documents whose search text contains the query: MATCH ... AGAINST on the
+    full-text index on MariaDB/MySQL, a LIKE scan elsewhere (SQLite) or for very short words.
+    """
+    text = normalize_search_text(query_str)
+    words = _FULLTEXT_OPERATORS.sub(' ', text).split()
+    if engine.dialect.name == 'mysql' and words and min(len(w) for w in words) >= FULLTEXT_MIN_WORD:
+        return ExperienceDocument.search_text.match(' '.join(f"+{w}*" for w in words))
+    return ExperienceDocument.search_text.contains(text, autoescape=True)
+
+@read_only
+def search_experiences_for_user(query_str: str, limit=20):
+    """Searches approved experiences by professor or course name using the document table."""
     with session_scope() as s:
-        search_filter = or_(
-            Professor.name.like(f"%{query_str}%"),
-            Course.name.like(f"%{query_str}%")
-        )
-        query = s.query(Experience)\
-                 .join(Professor)\
-                 .join(Course)\
-                 .filter(Experience.status == ExperienceStatus.APPROVED)\
-                 .filter(search_filter)
-        
-        total_items = query.count()
-        total_pages = math.ceil(total_items / per_page)
-        
-        offset = (page - 1) * per_page
-        exps = query.options(
-            joinedload(Experience.course),
-            joinedload(Experience.professor)
-        ).order_by(Experience.created_at.desc()).limit(per_page).offset(offset).all()
-
-        results = []
-        for exp in exps:
-            course_name = exp.course.name if exp.course else "نامشخص"
-            professor_name = exp.professor.name if exp.professor else "نامشخص"
-            results.append({
-                'id': exp.id,
-                'course_name': course_name,
-                'professor_name': professor_name
-            })
-        return results, total_pages
+        docs = s.query(
+            ExperienceDocument.experience_id,
+            ExperienceDocument.course_name,
+            ExperienceDocument.professor_name
+        ).filter(_document_search_filter(query_str))\
+         .order_by(ExperienceDocument.published_at.desc())\
+         .limit(limit).all()
+        # Only approved experiences have documents.
+        return [ExperienceSummary(d.experience_id, d.course_name, d.professor_name, ExperienceStatus.APPROVED)
+                for d in docs]
 
+@read_only
 def search_experiences_for_inline(query_str: str, limit=10):
+    """Returns pre-rendered documents of approved experiences matching the query."""
     with session_scope() as s:
-        search_filter = or_(
-            Professor.name.like(f"%{query_str}%"),
-            Course.name.like(f"%{query_str}%")
-        )
-        exps = s.query(Experience)\
-                .join(Professor)\
-                .join(Course)\
-                .filter(Experience.status == ExperienceStatus.APPROVED)\
-                .filter(search_filter)\
-                .options(
-                    joinedload(Experience.course),
-                    joinedload(Experience.professor),
-                    joinedload(Experience.field),
-                    joinedload(Experience.major)
-                )\
-                .order_by(Experience.created_at.desc())\
-                .limit(limit).all()
-        return exps
+        docs = s.query(
+            ExperienceDocument.experience_id,
+            ExperienceDocument.title,
+            ExperienceDocument.description,
+            ExperienceDocument.rendered_text
+        ).filter(_document_search_filter(query_str))\
+         .order_by(ExperienceDocument.published_at.desc())\
+         .limit(limit).all()
+        return [InlineDocument(*d) for d in docs]
 
 def get_paginated_list(model, page=1, per_page=8):
+    if model in _CATALOG_MODELS:
+        return catalog_cache.get_or_load(f"{model.__tablename__}:page:{page}:{per_page}",
+                                         lambda: _paginated_list(model, page, per_page), decode=tuple)
+    return _paginated_list(model, page, per_page)
+
+def _paginated_list(model, page, per_page):
     with session_scope() as s:
         query = s.query(model)
         
@@ -317,75 +553,68 @@ def get_paginated_list(model, page=1, per_page=8):
         return results, total_pages
 
 def is_admin(user_id):
-    with session_scope() as s:
-        return s.query(Admin).filter_by(user_id=user_id).first() is not None
+    return user_id in config_snapshot().admin_ids
 
 def get_all_items_by_parent(model, parent_id_field, parent_id):
-    with session_scope() as s:
-        items = s.query(model).filter(getattr(model, parent_id_field) == parent_id).order_by(model.name).all()
-        return [{'id': item.id, 'name': item.name} for item in items]
+    def load():
+        with session_scope() as s:
+            items = s.query(model).filter(getattr(model, parent_id_field) == parent_id).order_by(model.name).all()
+            return [{'id': item.id, 'name': item.name} for item in items]
+    return catalog_cache.get_or_load(f"{model.__tablename__}:{parent_id_field}:{parent_id}", load)
+
+# One row per experience in ExperienceData field order; names of missing relations become "".
+_EXPERIENCE_DATA_SELECT = select(
+    Experience.id, Experience.user_id, Experience.teaching_style, Experience.notes, Experience.project,
+    Experience.attendance_required, Experience.attendance_details, Experience.exam, Experience.conclusion,
+    Experience.status,
+    func.coalesce(Field.name, ''), func.coalesce(Major.name, ''),
+    func.coalesce(Professor.name, ''), func.coalesce(Course.name, ''),
+    Experience.channel_message_id, Experience.teaching_rating, Experience.exam_difficulty,
+    Experience.overall_rating, Experience.has_notes, Experience.has_project, Experience.has_exam,
+    Experience.updated_at, Experience.created_at
+).select_from(Experience)\
+    .outerjoin(Field, Experience.field_id == Field.id)\
+    .outerjoin(Major, Experience.major_id == Major.id)\
+    .outerjoin(Professor, Experience.professor_id == Professor.id)\
+    .outerjoin(Course, Experience.course_id == Course.id)
+
+def _experience_data(row) -> ExperienceData:
+    teaching_rating, exam_difficulty = row[15], row[16]
+    return ExperienceData(
+        *row[:9], row[9].value, *row[10:15],
+        teaching_rating.value if teaching_rating else None,
+        exam_difficulty.value if exam_difficulty else None,
+        *row[17:]
+    )
+
+def fetch_experience_data(session, exp_id) -> ExperienceData | None:
+    """Reads one experience as ExperienceData in a single select, without creating ORM objects."""
+    row = session.execute(_EXPERIENCE_DATA_SELECT.where(Experience.id == exp_id)).first()
+    return _experience_data(row) if row else None
 
 def get_experience(exp_id) -> ExperienceData | None:
     """Fetches an experience and returns it as a session-independent dataclass."""
+    cached = experience_cache.get(exp_id)
+    if cached is not None:
+        return cached
+
     with session_scope() as s:
-        exp = s.query(Experience).options(
-            joinedload(Experience.field),
-            joinedload(Experience.major),
-            joinedload(Experience.professor),
-            joinedload(Experience.course)
-        ).filter(Experience.id == exp_id).first()
-        
-        if not exp:
-            return None
-            
-        return ExperienceData(
-            id=exp.id,
-            user_id=exp.user_id,
-            teaching_style=exp.teaching_style,
-            notes=exp.notes,
-            project=exp.project,
-            attendance_required=exp.attendance_required,
-            attendance_details=exp.attendance_details,
-            exam=exp.exam,
-            conclusion=exp.conclusion,
-            status=exp.status.value,
-            field_name=exp.field.name if exp.field else "",
-            major_name=exp.major.name if exp.major else "",
-            professor_name=exp.professor.name if exp.professor else "",
-            course_name=exp.course.name if exp.course else "",
-            channel_message_id=exp.channel_message_id,
-            teaching_rating=exp.teaching_rating.value if exp.teaching_rating else None,
-            exam_difficulty=exp.exam_difficulty.value if exp.exam_difficulty else None,
-            overall_rating=exp.overall_rating,
-            has_notes=exp.has_notes,
-            has_project=exp.has_project,
-            has_exam=exp.has_exam
-        )
+        exp_data = fetch_experience_data(s, exp_id)
+    if exp_data is None:
+        return None
+    experience_cache.set(exp_id, exp_data)
+    return exp_data
 
+@read_only
 def get_user_experiences(user_id, page=1, per_page=10):
     with session_scope() as s:
-        query = s.query(Experience).options(
-            joinedload(Experience.course),
-            joinedload(Experience.professor)
-        ).filter_by(user_id=user_id)
-
-        total_items = query.count()
+        total_items = s.query(func.count(Experience.id)).filter(Experience.user_id == user_id).scalar()
         total_pages = math.ceil(total_items / per_page)
-        
-        offset = (page - 1) * per_page
-        exps = query.order_by(Experience.created_at.desc()).limit(per_page).offset(offset).all()
 
-        results = []
-        for exp in exps:
-            course_name = exp.course.name if exp.course else "نامشخص"
-            professor_name = exp.professor.name if exp.professor else "نامشخص"
-            results.append({
-                'id': exp.id,
-                'course_name': course_name,
-                'professor_name': professor_name,
-                'status': exp.status
-            })
-        return results, total_pages
+        offset = (page - 1) * per_page
+        rows = _summary_query(s, Experience.user_id == user_id)\
+            .order_by(Experience.created_at.desc()).limit(per_page).offset(offset).all()
+        return _summaries(rows), total_pages
 
 def add_item(model, **kwargs):
     with session_scope() as s:
@@ -393,6 +622,10 @@ def add_item(model, **kwargs):
         s.add(new_item)
         s.flush()
         s.expunge(new_item)
+    if model in _CONFIG_MODELS:
+        invalidate_config()
+    if model in _CATALOG_MODELS:
+        catalog_cache.invalidate()
     return new_item
 
 def update_item(model, item_id, **kwargs):
@@ -401,17 +634,43 @@ def update_item(model, item_id, **kwargs):
         if item:
             for key, value in kwargs.items():
                 setattr(item, key, value)
-            return True
-        return False
+            updated = True
+        else:
+            updated = False
+    if updated and model is Experience:
+        invalidate_experience(item_id)
+    if updated and model in _CONFIG_MODELS:
+        invalidate_config()
+    if updated and model in _CATALOG_MODELS:
+        catalog_cache.invalidate()
+    return updated
 
 def update_experience_status(exp_id: int, status: ExperienceStatus):
     with session_scope() as s:
         exp = s.query(Experience).get(exp_id)
-        if exp:
-            exp.status = status
-            return True
-        return False
+        if not exp:
+            return False
+        exp.status = status
+        if status != ExperienceStatus.APPROVED:
+            s.query(ExperienceDocument).filter_by(experience_id=exp_id).delete(synchronize_session=False)
+    invalidate_experience(exp_id)
+    return True
         
+def add_experience(fields: dict) -> ExperienceData:
+    """Inserts a submitted experience and returns it as ExperienceData."""
+    with session_scope() as s:
+        exp = Experience(**fields)
+        s.add(exp)
+        s.flush()
+        return fetch_experience_data(s, exp.id)
+
+def set_experience_channel_message_id(exp_id: int, message_id: int):
+    with session_scope() as s:
+        updated = s.query(Experience).filter_by(id=exp_id).update(
+            {Experience.channel_message_id: message_id}, synchronize_session=False)
+    invalidate_experience(exp_id)
+    return bool(updated)
+
 def set_experience_admin_message_id(exp_id: int, message_id: int, chat_id: int):
     with session_scope() as s:
         exp = s.query(Experience).get(exp_id)
@@ -424,10 +683,20 @@ def set_experience_admin_message_id(exp_id: int, message_id: int, chat_id: int):
 def reset_experience_status_for_resubmission(exp_id: int):
     with session_scope() as s:
         exp = s.query(Experience).get(exp_id)
-        if exp:
-            exp.status = ExperienceStatus.PENDING
-            return True
-        return False
+        if not exp:
+            return False
+        exp.status = ExperienceStatus.PENDING
+        s.query(ExperienceDocument).filter_by(experience_id=exp_id).delete(synchronize_session=False)
+    invalidate_experience(exp_id)
+    return True
+
+def get_user(user_id):
+    """Returns a detached User row for a Telegram user id, or None."""
+    with session_scope() as s:
+        user = s.query(User).filter_by(user_id=user_id).first()
+        if user:
+            s.expunge(user)
+        return user
 
 def add_user(user_id, first_name):
     with session_scope() as s:
@@ -438,9 +707,19 @@ def delete_item(model, item_id):
     with session_scope() as s:
         item = s.query(model).get(item_id)
         if item:
+            if model is Experience:
+                s.query(ExperienceDocument).filter_by(experience_id=item_id).delete(synchronize_session=False)
             s.delete(item)
-            return True
-        return False
+            deleted = True
+        else:
+            deleted = False
+    if deleted and model is Experience:
+        invalidate_experience(item_id)
+    if deleted and model in _CONFIG_MODELS:
+        invalidate_config()
+    if deleted and model in _CATALOG_MODELS:
+        catalog_cache.invalidate()
+    return deleted
 
 def get_item_name(model, item_id):
     with session_scope() as s:
@@ -453,11 +732,13 @@ def get_item_name(model, item_id):
             return f"ID: {item.user_id}"
         return f"ID: {item.id}"
 
+@read_only
 def get_all_users():
     with session_scope() as s:
         users = s.query(User).all()
         return [{'user_id': user.user_id} for user in users]
 
+@read_only
 def get_statistics():
     with session_scope() as s:
         stats = {
@@ -470,9 +751,7 @@ def get_statistics():
         return stats
 
 def get_setting(key, default=None):
-    with session_scope() as s:
-        setting = s.query(Setting).filter_by(key=key).first()
-        return setting.value if setting else default
+    return config_snapshot().settings.get(key, default)
 
 def set_setting(key, value):
     with session_scope() as s:
@@ -481,25 +760,25 @@ def set_setting(key, value):
             setting.value = str(value)
         else:
             s.add(Setting(key=key, value=str(value)))
+    invalidate_config()
 
 def get_all_required_channels():
-    with session_scope() as s:
-        channels = s.query(RequiredChannel).all()
-        return [{'id': c.id, 'channel_id': c.channel_id, 'channel_link': c.channel_link} for c in channels]
+    return [dict(c) for c in config_snapshot().channels]
 
 def get_experience_with_session(session, exp_id):
-    return session.query(Experience).options(
-        joinedload(Experience.field),
-        joinedload(Experience.major),
-        joinedload(Experience.professor),
-        joinedload(Experience.course)
-    ).filter(Experience.id == exp_id).first()
-
-def get_top_professors(limit=10):
+    """The Experience row to change inside a session; render it with fetch_experience_data."""
+    return session.query(Experience).options(joinedload(Experience.course)).filter(Experience.id == exp_id).first()
+
+def get_top_professors(limit=10) -> list[ProfessorRanking]:
     """
     Calculates and returns the top professors based on a weighted score
     of overall and teaching ratings.
     """
+    return ranking_cache.get_or_load(str(limit), lambda: _top_professors(limit),
+                                     decode=lambda rows: [ProfessorRanking(*row) for row in rows])
+
+@read_only
+def _top_professors(limit):
     with session_scope() as s:
         # Map enum to a numerical value for calculation
         teaching_rating_score = case(
@@ -530,4 +809,110 @@ def get_top_professors(limit=10):
          .order_by(func.coalesce((subquery.c.avg_overall * 0.6 + subquery.c.avg_teaching * 0.4), 0).desc())\
          .limit(limit).all()
         
-        return professors
\ No newline at end of file
+        # MySQL averages are Decimals; floats keep the cached rows JSON-serializable.
+        return [ProfessorRanking(name, count, None if score is None else float(score))
+                for name, count, score in professors]
+
+# --- Denormalized search documents ---
+
+_ARABIC_TO_PERSIAN = str.maketrans({'ي': 'ی', 'ى': 'ی', 'ك': 'ک', 'ة': 'ه', 'ۀ': 'ه', 'ـ': None})
+
+def normalize_search_text(text: str) -> str:
+    """Folds Arabic/Persian letter variants, ZWNJ and case so search matches spelling variants."""
+    if not text:
+        return ""
+    text = unicodedata.normalize('NFKC', text).translate(_ARABIC_TO_PERSIAN)
+    text = re.sub(r'[\s\u200c\u200f\u200e]+', ' ', text)
+    return text.strip().casefold()
+
+def _make_tag(name: str) -> str:
+    return '#' + re.sub(r'[\s\u200c-]+', '_', name.strip())
+
+def save_experience_documents(documents):
+    """
+    Inserts or refreshes search documents. Each document is a dict with experience_id,
+    field_name, major_name, professor_name, course_name, rendered_text, description,
+    redacted and published_at.
+    """
+    rows = []
+    for doc in documents:
+        names = [doc['field_name'], doc['major_name'], doc['professor_name'], doc['course_name']]
+        rows.append({
+            'experience_id': doc['experience_id'],
+            'professor_name': doc['professor_name'],
+            'course_name': doc['course_name'],
+            'title': f"{doc['professor_name']} - {doc['course_name']}",
+            'description': (doc.get('description') or '')[:255],
+            'rendered_text': doc['rendered_text'],
+            # Search matches professor and course names, like the joined queries it replaced.
+            'search_text': normalize_search_text(f"{doc['professor_name']} {doc['course_name']}"),
+            'tags': ' '.join(_make_tag(n) for n in names if n),
+            'redacted': bool(doc.get('redacted')),
+            'published_at': doc.get('published_at'),
+        })
+    update_columns = [c for c in rows[0] if c != 'experience_id'] if rows else []
+    with session_scope() as s:
+        _upsert(s, ExperienceDocument, rows, ['experience_id'], update_columns)
+
+def delete_experience_document(exp_id):
+    with session_scope() as s:
+        s.query(ExperienceDocument).filter_by(experience_id=exp_id).delete(synchronize_session=False)
+
+@read_only
+def get_experience_document_text(exp_id):
+    with session_scope() as s:
+        doc = s.query(ExperienceDocument.rendered_text).filter_by(experience_id=exp_id).first()
+        return doc.rendered_text if doc else None
+
+def get_redacted_experience_ids():
+    with session_scope() as s:
+        rows = s.query(ExperienceDocument.experience_id).filter_by(redacted=True).all()
+        return {r.experience_id for r in rows}
+
+def get_approved_experience_ids(missing_documents_only=False):
+    """Returns ids of approved experiences, optionally only those without a search document."""
+    with session_scope() as s:
+        query = s.query(Experience.id).filter(Experience.status == ExperienceStatus.APPROVED)
+        if missing_documents_only:
+            query = query.outerjoin(ExperienceDocument, ExperienceDocument.experience_id == Experience.id)\
+                         .filter(ExperienceDocument.experience_id.is_(None))
+        return [r.id for r in query.order_by(Experience.id).all()]
+
+# --- Bot persistence ---
+
+def load_persisted_state(namespace, key):
+    with session_scope() as s:
+        row = s.query(PersistedState.data).filter_by(namespace=namespace, key=key).first()
+        return row.data if row else None
+
+def load_persisted_namespace(namespace):
+    with session_scope() as s:
+        rows = s.query(PersistedState.key, PersistedState.data).filter_by(namespace=namespace).all()
+        return {row.key: row.data for row in rows}
+
+def save_persisted_states(items):
+    """Writes a batch of (namespace, key, data) in one transaction; data=None deletes the row."""
+    upserts = [{'namespace': ns, 'key': key, 'data': data} for ns, key, data in items if data is not None]
+    deletes = [(ns, key) for ns, key, data in items if data is None]
+    with session_scope() as s:
+        _upsert(s, PersistedState, upserts, ['namespace', 'key'], ['data'])
+        for ns, key in deletes:
+            s.query(PersistedState).filter_by(namespace=ns, key=key).delete(synchronize_session=False)
+
+def get_channel_memberships(user_id, channel_ids):
+    """Returns {channel_id: is_member} for the channels we have a stored answer for."""
+    with session_scope() as s:
+        rows = s.query(ChannelMembership.channel_id, ChannelMembership.is_member).filter(
+            ChannelMembership.user_id == user_id,
+            ChannelMembership.channel_id.in_(channel_ids)
+        ).all()
+        return {channel_id: is_member for channel_id, is_member in rows}
+
+def save_channel_membership(user_id, channel_id, is_member):
+    with session_scope() as s:
+        _upsert(s, ChannelMembership, [{'user_id': user_id, 'channel_id': channel_id, 'is_member': is_member}],
+                ['user_id', 'channel_id'], ['is_member'])
+
+def delete_channel_memberships(channel_id):
+    with session_scope() as s:
+        s.query(ChannelMembership).filter_by(channel_id=channel_id).delete(synchronize_session=False)
@@ -0,0 +1,224 @@
+# dispatcher.py
+
+import asyncio
+import json
+import logging
+import os
+import socket
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# A shard is consumed by one process at a time, the holder of its lease, renewed every third of this.
+LEASE_SECONDS = 15
+
+# Update types whose sender is found under 'from' (or 'user' for poll answers).
+_USER_UPDATE_KEYS = (
+    'message', 'edited_message', 'callback_query', 'inline_query', 'chosen_inline_result',
+    'shipping_query', 'pre_checkout_query', 'my_chat_member', 'chat_member',
+    'chat_join_request', 'poll_answer', 'message_reaction'
+)
+_CHAT_UPDATE_KEYS = ('channel_post', 'edited_channel_post')
+
+
+def update_shard_key(update_data: dict) -> int:
+    """Returns the id every update of one user shares, so they land on the same shard."""
+    for key in _USER_UPDATE_KEYS:
+        payload = update_data.get(key)
+        if payload:
+            sender = payload.get('from') or payload.get('user')
+            if sender and 'id' in sender:
+                return int(sender['id'])
+            chat = payload.get('chat')
+            if chat and 'id' in chat:
+                return int(chat['id'])
+    for key in _CHAT_UPDATE_KEYS:
+        payload = update_data.get(key)
+        if payload and payload.get('chat'):
+            return int(payload['chat']['id'])
+    return int(update_data.get('update_id', 0))
+
+
+class UpdateDispatcher:
+    """
+    Shards incoming updates by user id onto backend queues and consumes a set of shards.
+
+    All updates of a user land on one shard, and a shard is consumed by one process
+    at a time: the holder of its lease in the backend, so extra workers configured
+    for the same shards wait as standbys instead of consuming them too. The consumer
+    pops updates in order into a backlog per user, drained by one task per user, so
+    a user's updates run one after another and wait in that backlog rather than in
+    one of the max_in_flight processing slots. Up to max_buffered popped updates
+    wait at once; beyond that the consumer stops popping.
+
+    on_shard_acquired(shard) runs before a shard taken over from another process
+    is consumed, to reload its users' state; before_release() runs once the
+    in-flight updates are done and before the leases are given up on stop.
+    """
+
+    def __init__(self, backend, process, shard_count: int = 1, local_shards=None, queue_prefix: str = 'updates',
+                 max_in_flight: int = 256, max_buffered: int = 10000, on_shard_acquired=None,
+                 before_release=None):
+        self.backend = backend
+        self.process = process
+        self.shard_count = max(1, shard_count)
+        self.local_shards = list(range(self.shard_count)) if local_shards is None else list(local_shards)
+        self.queue_prefix = queue_prefix
+        self.max_in_flight = max_in_flight
+        self.max_buffered = max(max_buffered, max_in_flight)
+        self.on_shard_acquired = on_shard_acquired
+        self.before_release = before_release
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.processed = [0] * self.shard_count
+        self.failed = [0] * self.shard_count
+        self._leased = set()
+        self._slots = None
+        self._room = None
+        self._backlogs = {}
+        self._drainers = {}
+        self._processing = 0
+        self._tasks = []
+        self._running = False
+
+    def shard_for(self, update_data: dict) -> int:
+        return self.shard_of(update_shard_key(update_data))
+
+    def shard_of(self, user_id: int) -> int:
+        return user_id % self.shard_count
+
+    def queue_name(self, shard: int) -> str:
+        return f"{self.queue_prefix}:{shard}"
+
+    async def submit(self, update_data: dict):
+        await self.backend.push(self.queue_name(self.shard_for(update_data)), json.dumps(update_data))
+
+    def lease_name(self, shard: int) -> str:
+        return f"{self.queue_name(shard)}:lease"
+
+    async def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._room = asyncio.Semaphore(self.max_buffered)
+        # The caller has just loaded all persisted state; shards held from the start need no reload.
+        await self._renew_leases(initial=True)
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._keep_leases())]
+        self._tasks += [loop.create_task(self._consume(shard)) for shard in self.local_shards]
+        logger.info(f"Update dispatcher consuming shards {sorted(self._leased)} of {self.shard_count} "
+                    f"(configured: {self.local_shards}).")
+
+    async def stop(self):
+        self._running = False
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Updates already popped are finished before the leases are given up.
+        await asyncio.gather(*self._drainers.values(), return_exceptions=True)
+        if self.before_release and self._leased:
+            try:
+                await self.before_release()
+            except Exception as e:
+                logger.error(f"Failed to prepare the update shards for handover: {e}")
+        for shard in list(self._leased):
+            await self.backend.release_lease(self.lease_name(shard), self.owner)
+        self._leased.clear()
+
+    async def _renew_leases(self, initial: bool = False):
+        for shard in self.local_shards:
+            try:
+                held = await self.backend.acquire_lease(self.lease_name(shard), self.owner, LEASE_SECONDS)
+            except Exception as e:
+                logger.error(f"Could not renew the lease of shard {shard}: {e}")
+                held = False
+            if held and shard not in self._leased:
+                if self.on_shard_acquired and not initial:
+                    try:
+                        await self.on_shard_acquired(shard)
+                    except Exception as e:
+                        # Consuming with stale state is worse than waiting for the next renewal.
+                        logger.error(f"Could not reload the state of update shard {shard}: {e}")
+                        await self.backend.release_lease(self.lease_name(shard), self.owner)
+                        continue
+                self._leased.add(shard)
+                logger.info(f"Took over update shard {shard}.")
+            elif not held and shard in self._leased:
+                self._leased.discard(shard)
+                logger.warning(f"Lost the lease of update shard {shard}; another process consumes it now.")
+
+    async def _keep_leases(self):
+        while self._running:
+            await asyncio.sleep(LEASE_SECONDS / 3)
+            await self._renew_leases()
+
+    async def _consume(self, shard: int):
+        queue = self.queue_name(shard)
+        while self._running:
+            if shard not in self._leased:
+                await asyncio.sleep(1.0)
+                continue
+            await self._room.acquire()
+            try:
+                item = await self.backend.pop(queue, timeout=1.0)
+            except BaseException:
+                self._room.release()
+                raise
+            if item is None:
+                self._room.release()
+                continue
+            self._enqueue(shard, item)
+
+    def _enqueue(self, shard: int, item: str):
+        try:
+            update_data = json.loads(item)
+        except ValueError as e:
+            self._room.release()
+            self.failed[shard] += 1
+            logger.error(f"Dropped an unreadable update on shard {shard}: {e}")
+            return
+        key = update_shard_key(update_data)
+        backlog = self._backlogs.get(key)
+        if backlog is None:
+            backlog = self._backlogs[key] = deque()
+            self._drainers[key] = asyncio.get_running_loop().create_task(self._drain(shard, key, backlog))
+        backlog.append(update_data)
+
+    async def _drain(self, shard: int, key: int, backlog: deque):
+        """Processes one user's updates in the order they were popped."""
+        try:
+            while backlog:
+                update_data = backlog.popleft()
+                try:
+                    async with self._slots:
+                        await self._process(shard, update_data)
+                finally:
+                    self._room.release()
+        finally:
+            del self._backlogs[key]
+            del self._drainers[key]
+
+    async def _process(self, shard: int, update_data: dict):
+        self._processing += 1
+        try:
+            await self.process(update_data)
+            self.processed[shard] += 1
+        except Exception as e:
+            self.failed[shard] += 1
+            logger.error(f"Error processing update on shard {shard}: {e}")
+        finally:
+            self._processing -= 1
+
+    def stats(self) -> dict:
+        return {
+            'leased_shards': sorted(self._leased),
+            'in_flight': self._processing,
+            'buffered': sum(len(backlog) for backlog in self._backlogs.values()),
+            'active_users': len(self._backlogs),
+            'processed': sum(self.processed),
+            'failed': sum(self.failed),
+        }
+
+    async def queue_depths(self) -> dict:
+        return {shard: await self.backend.queue_length(self.queue_name(shard)) for shard in self.local_shards}
@@ -3,17 +3,13 @@
 # Exit immediately if a command exits with a non-zero status.
 set -e
 
-# Wait for the database to be ready
-echo "Waiting for database connection..."
-while ! nc -z db 3306; do
-  sleep 1
-done
-echo "Database is ready!"
-
-# Run database migrations automatically
-echo "Running database migrations..."
-alembic upgrade head
-
-# Start the main application
+# Wait for the database and run migrations unless the schema is already at head
+python migrate.py
+
+# Start the main application (or the command passed in, e.g. a shard worker)
+if [ "$#" -gt 0 ]; then
+  echo "Starting: $*"
+  exec "$@"
+fi
 echo "Starting application..."
 exec uvicorn main:app --host 0.0.0.0 --port 8000
\ No newline at end of file
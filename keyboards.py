@@ -54,8 +54,8 @@ def admin_pending_experiences_keyboard(experiences, current_page, total_pages):
     keyboard = []
 
     for exp in experiences:
-        button_text = f"ID: {exp['id']} - {exp['course_name']} - {exp['professor_name']}"
-        keyboard.append([InlineKeyboardButton(button_text, callback_data=f"admin_pending_detail_{current_page}_{exp['id']}")])
+        button_text = f"ID: {exp.id} - {exp.course_name} - {exp.professor_name}"
+        keyboard.append([InlineKeyboardButton(button_text, callback_data=f"admin_pending_detail_{current_page}_{exp.id}")])
 
     pagination_row = []
     if current_page > 1:
@@ -79,9 +79,9 @@ def admin_search_results_keyboard(experiences, query, current_page, total_pages)
     }
 
     for exp in experiences:
-        status_emoji = status_map.get(exp['status'], '❔')
-        button_text = f"{status_emoji} ID: {exp['id']} - {exp['course_name']}"
-        keyboard.append([InlineKeyboardButton(button_text, callback_data=f"admin_search_detail_{current_page}_{exp['id']}")])
+        status_emoji = status_map.get(exp.status, '❔')
+        button_text = f"{status_emoji} ID: {exp.id} - {exp.course_name}"
+        keyboard.append([InlineKeyboardButton(button_text, callback_data=f"admin_search_detail_{current_page}_{exp.id}")])
 
     pagination_row = []
     if current_page > 1:
@@ -99,8 +99,8 @@ def user_search_inline_keyboard(experiences):
     """Creates an inline keyboard for user search results."""
     keyboard = []
     for exp in experiences:
-        button_text = f"{exp['course_name']} - {exp['professor_name']}"
-        keyboard.append([InlineKeyboardButton(button_text, callback_data=f"user_search_result_{exp['id']}")])
+        button_text = f"{exp.course_name} - {exp.professor_name}"
+        keyboard.append([InlineKeyboardButton(button_text, callback_data=f"user_search_result_{exp.id}")])
     return InlineKeyboardMarkup(keyboard)
 
 def my_experiences_keyboard(experiences, current_page, total_pages):
@@ -114,9 +114,9 @@ def my_experiences_keyboard(experiences, current_page, total_pages):
     }
 
     for exp in experiences:
-        status_emoji = status_map.get(exp['status'], '❔')
-        button_text = f"{status_emoji} {exp['course_name']} - {exp['professor_name']}"
-        keyboard.append([InlineKeyboardButton(button_text, callback_data=f"exp_detail_{current_page}_{exp['id']}")])
+        status_emoji = status_map.get(exp.status, '❔')
+        button_text = f"{status_emoji} {exp.course_name} - {exp.professor_name}"
+        keyboard.append([InlineKeyboardButton(button_text, callback_data=f"exp_detail_{current_page}_{exp.id}")])
 
     pagination_row = []
     if current_page > 1:
@@ -223,7 +223,8 @@ def dynamic_list_keyboard(items, prefix, has_add_new=False):
     keyboard.append([InlineKeyboardButton(db.get_text('btn_cancel'), callback_data="cancel_submission")])
     return InlineKeyboardMarkup(keyboard)
 
-def admin_approval_keyboard(experience_id, user, from_list_page=None, from_search=False):
+def admin_approval_keyboard(experience_id, user, from_list_page=None, from_search=False, status=None):
+    """Pass the experience status when the caller already has it, to avoid loading the experience again."""
     telegram_user_id = getattr(user, 'user_id', getattr(user, 'id', None))
     
     keyboard = [
@@ -237,8 +238,10 @@ def admin_approval_keyboard(experience_id, user, from_list_page=None, from_searc
         ]
     ]
     
-    exp = db.get_experience(experience_id)
-    if exp and exp.status == ExperienceStatus.APPROVED:
+    if status is None:
+        exp = db.get_experience(experience_id)
+        status = exp.status if exp else None
+    if status == ExperienceStatus.APPROVED:
         keyboard.insert(1, [InlineKeyboardButton(db.get_text('btn_delete_content_by_request'), callback_data=f"exp_delete_content_{experience_id}")])
 
     if hasattr(user, 'username') and user.username:
@@ -1,17 +1,22 @@
 import logging
 import asyncio
 import datetime
+import json
 import os
 import re
+import secrets
+import time
 import unicodedata
+from concurrent.futures import ThreadPoolExecutor
 from telegram import Update, constants, ChatMember, InlineKeyboardMarkup, ReplyKeyboardRemove
 from telegram.ext import (
     Application, CommandHandler, MessageHandler, ConversationHandler,
-    CallbackQueryHandler, ContextTypes, filters, InlineQueryHandler
+    CallbackQueryHandler, ContextTypes, filters, InlineQueryHandler, ChatMemberHandler, TypeHandler
 )
 from telegram.helpers import escape_markdown
 from telegram.error import TelegramError, BadRequest
 from fastapi import FastAPI, Request, Response
+from fastapi.responses import PlainTextResponse
 from contextlib import asynccontextmanager
 from uuid import uuid4
 from telegram import InlineQueryResultArticle, InputTextMessageContent
@@ -21,7 +26,7 @@ import config
 import database as db
 import keyboards as kb
 from models import (Field, Major, Professor, Course, Experience, BotText, Admin,
-                    ExperienceStatus, RequiredChannel, Setting, User, ExperienceData,
+                    ExperienceStatus, RequiredChannel, Setting, ExperienceData,
                     TeachingRating, ExamDifficulty) # Added new models
 from constants import (
     States,
@@ -35,14 +40,27 @@ from constants import (
     ADMIN_LIST_PENDING_EXPERIENCES, ADMIN_PENDING_EXPERIENCE_DETAIL,
     ADMIN_SEARCH_EXPERIENCES, ADMIN_SEARCH_RESULTS_PAGE, ADMIN_SEARCH_DETAIL,
     EXPERIENCE_DELETE_CONTENT, USER_SEARCH_RESULT, USER_SEARCH_NO_RESULTS_KEY,
-    USER_SEARCH_HEADER_KEY, USER_SEARCH_PROMPT_KEY
+    USER_SEARCH_HEADER_KEY, USER_SEARCH_PROMPT_KEY, EXPERIENCE_TEMPLATE_VERSION
 )
+import cache
+from cache import LRUCache, TTLCache
+from persistence import DatabasePersistence
+from backends import create_backend
+from singleflight import flights
+from dispatcher import UpdateDispatcher
+from concurrency import PerUserUpdateProcessor
+from rate_limiter import OutgoingRequestScheduler, Priority
+from update_recorder import UpdateRecorder
+from profiler import profiler
+import memory
+import tracing
+from tracing import tracer
+from models import engine, replica_engines
+import metrics
 
 logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-db.initialize_database()
-
 MODEL_MAP = {
     'field': Field, 'major': Major, 'professor': Professor,
     'course': Course, 'admin': Admin, 'text': BotText
@@ -78,13 +96,15 @@ async def backup_database(context: ContextTypes.DEFAULT_TYPE):
         if process.returncode != 0:
             error_message = stderr.decode().strip()
             logger.error(f"Database backup failed! Error: {error_message}")
-            await context.bot.send_message(chat_id=config.OWNER_ID, text=f"🔴 DB Backup Failed: `{error_message}`")
+            await context.bot.send_message(chat_id=config.OWNER_ID, text=f"🔴 DB Backup Failed: `{error_message}`",
+                                           rate_limit_args=Priority.NOTIFY)
             return
         with open(backup_filename, 'rb') as backup_file:
             await context.bot.send_document(
                 chat_id=config.BACKUP_CHANNEL_ID,
                 document=backup_file,
-                caption=f"✅ DB Backup\n🗓 `{timestamp}`"
+                caption=f"✅ DB Backup\n🗓 `{timestamp}`",
+                rate_limit_args=Priority.BULK
             )
         logger.info(f"DB backup successful: {backup_filename}")
     except Exception as e:
@@ -93,6 +113,24 @@ async def backup_database(context: ContextTypes.DEFAULT_TYPE):
         if os.path.exists(backup_filename):
             os.remove(backup_filename)
 
+async def log_runtime_stats(context: ContextTypes.DEFAULT_TYPE):
+    logger.info(f"Experience cache: {db.experience_cache.stats()}")
+    logger.info(f"Rendered experience cache: {rendered_experience_cache.stats()}")
+    logger.info(f"Channel membership cache: {membership_cache.stats()}")
+    for name, tiered in cache.tiered_caches.items():
+        logger.info(f"{name.capitalize()} cache: {tiered.stats()}")
+    logger.info(f"Coalesced reads: {flights.stats()}")
+    logger.info(f"Update dispatcher: {update_dispatcher.stats()}")
+    logger.info(f"Per-user update locks: {context.application.update_processor.locks.stats()}")
+    logger.info(f"Outgoing request scheduler: {context.bot.rate_limiter.stats()}")
+    logger.info(f"Per-user state: {user_state_limiter.stats()}")
+    if replica_engines:
+        logger.info(f"Read replicas: {db.replica_stats}")
+
+async def refresh_config(context: ContextTypes.DEFAULT_TYPE):
+    if await asyncio.to_thread(db.refresh_config_if_changed):
+        logger.info("Settings, channels or admins changed on another instance; snapshot reloaded.")
+
 async def check_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
     is_admin_user = db.is_admin(update.effective_user.id)
     if not is_admin_user:
@@ -102,24 +140,57 @@ async def check_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> boo
             await update.message.reply_text(db.get_text('not_an_admin'))
     return is_admin_user
 
-async def check_channel_membership(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+MEMBER_STATUSES = [ChatMember.MEMBER, ChatMember.ADMINISTRATOR, ChatMember.OWNER]
+
+# (user_id, channel_id) -> bool in front of the channel_memberships table;
+# "not a member" expires sooner so joining is noticed quickly.
+membership_cache = TTLCache(config.MEMBERSHIP_CACHE_SIZE, ttl=config.MEMBERSHIP_CACHE_TTL)
+
+def remember_membership(user_id, channel_id, is_member):
+    membership_cache.set((user_id, channel_id), is_member,
+                         ttl=None if is_member else config.MEMBERSHIP_NEGATIVE_CACHE_TTL)
+
+async def lookup_memberships(user_id, channel_ids) -> dict:
+    """Answers from the in-memory cache, then from the channel_memberships table."""
+    statuses = {}
+    for channel_id in channel_ids:
+        cached = membership_cache.get((user_id, channel_id))
+        if cached is not None:
+            statuses[channel_id] = cached
+    missing = [channel_id for channel_id in channel_ids if channel_id not in statuses]
+    if missing:
+        for channel_id, is_member in (await asyncio.to_thread(db.get_channel_memberships, user_id, missing)).items():
+            remember_membership(user_id, channel_id, is_member)
+            statuses[channel_id] = is_member
+    return statuses
+
+async def fetch_channel_membership(bot, channel_id, user_id) -> bool:
+    """Asks Telegram and seeds the table; used when no chat_member update has been seen yet."""
+    try:
+        member = await bot.get_chat_member(chat_id=channel_id, user_id=user_id)
+    except TelegramError as e:
+        logger.error(f"Error checking membership for channel {channel_id}: {e}")
+        return False
+    is_member = member.status in MEMBER_STATUSES
+    await asyncio.to_thread(db.save_channel_membership, user_id, channel_id, is_member)
+    remember_membership(user_id, channel_id, is_member)
+    return is_member
+
+async def check_channel_membership(update: Update, context: ContextTypes.DEFAULT_TYPE, refresh=False) -> bool:
     if db.get_setting('force_subscribe', 'false') == 'false':
         return True
     user_id = update.effective_user.id
     required_channels = db.get_all_required_channels()
     if not required_channels:
         return True
-    is_member_of_all = True
-    for channel in required_channels:
-        try:
-            member = await context.bot.get_chat_member(chat_id=channel['channel_id'], user_id=user_id)
-            if member.status not in [ChatMember.MEMBER, ChatMember.ADMINISTRATOR, ChatMember.OWNER]:
-                is_member_of_all = False
-                break
-        except TelegramError as e:
-            logger.error(f"Error checking membership for channel {channel['channel_id']}: {e}")
-            is_member_of_all = False
-            break
+    channel_ids = [channel['channel_id'] for channel in required_channels]
+    # refresh is used by the "I joined" button, in case a chat_member update was missed.
+    statuses = {} if refresh else await lookup_memberships(user_id, channel_ids)
+    missing = [channel_id for channel_id in channel_ids if channel_id not in statuses]
+    if missing:
+        results = await asyncio.gather(*(fetch_channel_membership(context.bot, channel_id, user_id) for channel_id in missing))
+        statuses.update(zip(missing, results))
+    is_member_of_all = all(statuses.values())
     if not is_member_of_all:
         target = update.callback_query.message if update.callback_query else update.message
         await target.reply_text(
@@ -128,7 +199,7 @@ async def check_channel_membership(update: Update, context: ContextTypes.DEFAULT
         )
     return is_member_of_all
 
-def format_experience(exp, md_version: int = 2, redacted=False) -> str:
+def format_experience(exp: ExperienceData, md_version: int = 2, redacted=False) -> str:
     def def_md(text):
         if text is None:
             return ""
@@ -162,18 +233,16 @@ def format_experience(exp, md_version: int = 2, redacted=False) -> str:
             logger.error(f"Error in make_safe_tag for input '{name}': {e}")
             return name.replace(' ', '\\_').replace('\u200c', '\\_')
 
-    is_dataclass = isinstance(exp, ExperienceData)
-
-    field_name = def_md(exp.field_name if is_dataclass else (exp.field.name if exp.field else ""))
-    major_name = def_md(exp.major_name if is_dataclass else (exp.major.name if exp.major else ""))
-    professor_name = def_md(exp.professor_name if is_dataclass else (exp.professor.name if exp.professor else ""))
-    course_name = def_md(exp.course_name if is_dataclass else (exp.course.name if exp.course else ""))
+    field_name = def_md(exp.field_name)
+    major_name = def_md(exp.major_name)
+    professor_name = def_md(exp.professor_name)
+    course_name = def_md(exp.course_name)
 
     # --- RATING FORMATTING (NEW) ---
-    teaching_rating_val = exp.teaching_rating if is_dataclass else (exp.teaching_rating.value if exp.teaching_rating else 'ثبت نشده')
+    teaching_rating_val = exp.teaching_rating or 'ثبت نشده'
     teaching_rating_str = f"*{def_md(db.get_text('exp_format_teaching_rating'))}*: {def_md(teaching_rating_val)}\n\n"
     
-    exam_difficulty_val = exp.exam_difficulty if is_dataclass else (exp.exam_difficulty.value if exp.exam_difficulty else 'ثبت نشده')
+    exam_difficulty_val = exp.exam_difficulty or 'ثبت نشده'
     exam_difficulty_str = f"*{def_md(db.get_text('exp_format_exam_difficulty'))}*: {def_md(exam_difficulty_val)}\n\n"
     
     overall_rating_stars = ("⭐️" * exp.overall_rating) if exp.overall_rating else "بدون امتیاز"
@@ -192,10 +261,10 @@ def format_experience(exp, md_version: int = 2, redacted=False) -> str:
         exam = def_md(exp.exam) if exp.has_exam else def_md(db.get_text('exp_format_no'))
         conclusion = def_md(exp.conclusion)
 
-    tags = (f"\\#{make_safe_tag(exp.field_name if is_dataclass else (exp.field.name if exp.field else ''))} "
-            f"\\#{make_safe_tag(exp.major_name if is_dataclass else (exp.major.name if exp.major else ''))} "
-            f"\\#{make_safe_tag(exp.professor_name if is_dataclass else (exp.professor.name if exp.professor else ''))} "
-            f"\\#{make_safe_tag(exp.course_name if is_dataclass else (exp.course.name if exp.course else ''))}")
+    tags = (f"\\#{make_safe_tag(exp.field_name)} "
+            f"\\#{make_safe_tag(exp.major_name)} "
+            f"\\#{make_safe_tag(exp.professor_name)} "
+            f"\\#{make_safe_tag(exp.course_name)}")
             
     # Conditional formatting for Yes/No fields
     notes_status = db.get_text('exp_format_yes') if exp.has_notes else db.get_text('exp_format_no')
@@ -229,9 +298,92 @@ def format_experience(exp, md_version: int = 2, redacted=False) -> str:
             f"{def_md(db.get_text('exp_format_footer'))}\n\n"
             f"*{def_md(db.get_text('exp_format_tags'))}*: {tags}")
 
+# --- Rendered experience cache ---
+# Keys are (exp_id, updated_at, template_version, redacted); entries for an experience
+# are dropped explicitly whenever it changes status, is edited or deleted.
+rendered_experience_cache = LRUCache(config.RENDER_CACHE_SIZE)
+
+@db.on_experience_invalidated
+def _drop_rendered_experience(exp_id):
+    rendered_experience_cache.discard_where(lambda key: key[0] == exp_id)
+
+def clear_experience_caches(broadcast=False):
+    """Drops every cached experience and render, e.g. after a catalog name or format text changed."""
+    db.experience_cache.clear()
+    rendered_experience_cache.clear()
+    if broadcast:
+        # Their keys do not change with the catalog or the texts, so the other processes are told too.
+        _publish(CACHE_INVALIDATION_CHANNEL, json.dumps([EXPERIENCE_CACHES, None]))
+
+@db.on_experience_invalidated
+def _restart_experience_reads(exp_id):
+    # Searches and statistics starting now must not join a read that began before the change.
+    flights.invalidate('search')
+    flights.invalidate('statistics')
+
+async def read_cached(fn, *args, **kwargs):
+    """Calls a TieredCache-backed db helper on the loop when the local tier has the value, else in a worker thread."""
+    try:
+        with cache.local_only():
+            return fn(*args, **kwargs)
+    except cache.LocalMiss:
+        return await asyncio.to_thread(fn, *args, **kwargs)
+
+def render_experience(exp, redacted=False) -> str:
+    """Returns the MarkdownV2 text of an experience, reusing a cached render when possible."""
+    key = (exp.id, exp.updated_at, EXPERIENCE_TEMPLATE_VERSION, redacted)
+    text = rendered_experience_cache.get(key)
+    if text is None:
+        text = format_experience(exp, md_version=2, redacted=redacted)
+        rendered_experience_cache.set(key, text)
+    return text
+
+def build_experience_document(exp: ExperienceData, redacted=False) -> dict:
+    """Collects everything the search paths need for an approved experience."""
+    if redacted:
+        description = db.get_text('content_deleted_by_request')
+    else:
+        description = (exp.conclusion or '')[:100]
+    return {
+        'experience_id': exp.id,
+        'field_name': exp.field_name,
+        'major_name': exp.major_name,
+        'professor_name': exp.professor_name,
+        'course_name': exp.course_name,
+        'rendered_text': render_experience(exp, redacted=redacted),
+        'description': description,
+        'redacted': redacted,
+        'published_at': exp.created_at,
+    }
+
+async def save_experience_document(exp: ExperienceData | None, redacted=False):
+    if exp is None:
+        return
+    try:
+        await asyncio.to_thread(db.save_experience_documents, [build_experience_document(exp, redacted=redacted)])
+        flights.invalidate('search')
+    except Exception as e:
+        logger.error(f"Failed to save search document for experience {exp.id}: {e}")
+
+async def rebuild_experience_documents(context: ContextTypes.DEFAULT_TYPE):
+    """Job that (re)builds search documents; job data 'missing_only' limits it to approved experiences without one."""
+    missing_only = bool(context.job.data and context.job.data.get('missing_only'))
+    exp_ids = await asyncio.to_thread(db.get_approved_experience_ids, missing_documents_only=missing_only)
+    redacted_ids = await asyncio.to_thread(db.get_redacted_experience_ids)
+
+    def rebuild(batch_ids):
+        exps = [db.get_experience(exp_id) for exp_id in batch_ids]
+        db.save_experience_documents([build_experience_document(exp, redacted=exp.id in redacted_ids)
+                                      for exp in exps if exp])
+
+    for start in range(0, len(exp_ids), 100):
+        await asyncio.to_thread(rebuild, exp_ids[start:start + 100])
+    flights.invalidate('search')
+    logger.info(f"Rebuilt {len(exp_ids)} experience search documents (missing_only={missing_only}).")
+
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    db.add_user(update.effective_user.id, update.effective_user.first_name)
+    await asyncio.to_thread(db.add_user, update.effective_user.id, update.effective_user.first_name)
     if await check_channel_membership(update, context):
         await update.message.reply_text(db.get_text('welcome'), reply_markup=kb.main_menu())
 
@@ -242,7 +394,7 @@ async def back_to_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def membership_check_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
-    if await check_channel_membership(update, context):
+    if await check_channel_membership(update, context, refresh=True):
         await query.message.delete()
         await context.bot.send_message(
             chat_id=update.effective_chat.id,
@@ -250,12 +402,33 @@ async def membership_check_callback(update: Update, context: ContextTypes.DEFAUL
             reply_markup=kb.main_menu()
         )
 
+def required_channel_id_for(chat):
+    """Maps a chat to the channel_id it was registered with (numeric id or @username)."""
+    for channel in db.get_all_required_channels():
+        channel_id = channel['channel_id']
+        if channel_id == str(chat.id):
+            return channel_id
+        if chat.username and channel_id.lstrip('@').lower() == chat.username.lower():
+            return channel_id
+    return None
+
+async def track_channel_membership(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    change = update.chat_member
+    channel_id = required_channel_id_for(change.chat)
+    if channel_id is None:
+        return
+    user_id = change.new_chat_member.user.id
+    is_member = change.new_chat_member.status in MEMBER_STATUSES
+    await asyncio.to_thread(db.save_channel_membership, user_id, channel_id, is_member)
+    remember_membership(user_id, channel_id, is_member)
+    await state_backend.publish(MEMBERSHIP_INVALIDATION_CHANNEL, json.dumps([user_id, channel_id]))
+
 async def my_experiences_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await check_channel_membership(update, context):
         return
 
     user_id = update.effective_user.id
-    experiences, total_pages = db.get_user_experiences(user_id, page=1)
+    experiences, total_pages = await asyncio.to_thread(db.get_user_experiences, user_id, page=1)
 
     if not experiences:
         await update.message.reply_text(db.get_text('my_experiences_empty'))
@@ -271,7 +444,7 @@ async def my_experiences_page_callback(update: Update, context: ContextTypes.DEF
     page = int(query.data.split('_')[-1])
     user_id = update.effective_user.id
     
-    experiences, total_pages = db.get_user_experiences(user_id, page=page)
+    experiences, total_pages = await asyncio.to_thread(db.get_user_experiences, user_id, page=page)
     
     if not experiences:
         try:
@@ -296,7 +469,7 @@ async def experience_detail_callback(update: Update, context: ContextTypes.DEFAU
     exp_id = int(parts[-1])
     page = int(parts[-2])
     
-    exp = db.get_experience(exp_id)
+    exp = await asyncio.to_thread(db.get_experience, exp_id)
     if not exp:
         try:
             await query.edit_message_text("متاسفانه این تجربه پیدا نشد.")
@@ -308,7 +481,7 @@ async def experience_detail_callback(update: Update, context: ContextTypes.DEFAU
     keyboard = kb.experience_detail_keyboard(exp_id, page)
     try:
         await query.edit_message_text(
-            format_experience(exp, md_version=2),
+            render_experience(exp),
             parse_mode=constants.ParseMode.MARKDOWN_V2,
             reply_markup=keyboard
         )
@@ -316,6 +489,24 @@ async def experience_detail_callback(update: Update, context: ContextTypes.DEFAU
         if "Message is not modified" not in str(e):
             raise
 
+async def notify_admins_of_experience(context: ContextTypes.DEFAULT_TYPE, exp: ExperienceData, text: str, user):
+    """Sends a submitted experience to every admin for review and records the first message sent."""
+    first_admin_message = None
+    for admin_id in sorted(db.config_snapshot().admin_ids):
+        try:
+            msg = await context.bot.send_message(
+                chat_id=admin_id, text=text,
+                reply_markup=kb.admin_approval_keyboard(exp.id, user, status=exp.status),
+                parse_mode=constants.ParseMode.MARKDOWN_V2,
+                rate_limit_args=Priority.NOTIFY
+            )
+            if not first_admin_message:
+                first_admin_message = msg
+        except Exception as e:
+            logger.error(f"Failed to send notification to admin {admin_id}: {e}")
+    if first_admin_message:
+        await asyncio.to_thread(db.set_experience_admin_message_id, exp.id, first_admin_message.message_id, first_admin_message.chat_id)
+
 async def edit_experience_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -324,50 +515,29 @@ async def edit_experience_callback(update: Update, context: ContextTypes.DEFAULT
     exp_id = int(parts[-2])
     page = int(parts[-1])
     
-    with db.session_scope() as s:
-        exp = db.get_experience_with_session(s, exp_id)
-        if not exp:
-            await query.edit_message_text("این تجربه پیدا نشد.")
-            return
-
-        if exp.status in [ExperienceStatus.REJECTED, ExperienceStatus.APPROVED]:
-            exp.status = ExperienceStatus.PENDING
-            
-            admins = s.query(Admin).all()
-            user = s.query(User).filter_by(user_id=exp.user_id).first()
-            
-            notification_text = f"*تجربه برای بررسی مجدد ارسال شد*\n\n" + escape_markdown(db.get_text('admin_new_experience_notification', exp_id=exp.id), version=2)
-            admin_message_text = notification_text + format_experience(exp)
-            
-            first_admin_message = None
-            for admin in admins:
-                try:
-                    msg = await context.bot.send_message(
-                        chat_id=admin.user_id, 
-                        text=admin_message_text,
-                        reply_markup=kb.admin_approval_keyboard(exp.id, user),
-                        parse_mode=constants.ParseMode.MARKDOWN_V2
-                    )
-                    if not first_admin_message:
-                        first_admin_message = msg
-                except Exception as e:
-                    logger.error(f"Failed to resend notification to admin {admin.user_id}: {e}")
-            
-            if first_admin_message:
-                exp.admin_message_id = first_admin_message.message_id
-                exp.admin_chat_id = first_admin_message.chat_id
-
-            await query.edit_message_text("✅ تجربه شما با موفقیت برای بازبینی مجدد به ادمین‌ها ارسال شد.", reply_markup=kb.experience_detail_keyboard(exp_id, page))
+    exp = await asyncio.to_thread(db.get_experience, exp_id)
+    if not exp:
+        await query.edit_message_text("این تجربه پیدا نشد.")
+        return
 
-        elif exp.status == ExperienceStatus.PENDING:
-            text_part1 = "⚠️ **آیا از ویرایش این تجربه مطمئن هستید؟**\n\n"
-            text_part2 = "تجربه فعلی شما حذف و فرآیند ثبت مجدد از ابتدا آغاز خواهد شد."
-            final_text = text_part1 + escape_markdown(text_part2, version=2)
-            await query.edit_message_text(
-                text=final_text,
-                parse_mode=constants.ParseMode.MARKDOWN_V2,
-                reply_markup=kb.confirm_edit_keyboard(exp_id, page)
-            )
+    if exp.status in [ExperienceStatus.REJECTED, ExperienceStatus.APPROVED]:
+        # Committed before the admins are notified, so no transaction waits on the Bot API.
+        await asyncio.to_thread(db.reset_experience_status_for_resubmission, exp_id)
+        exp = await asyncio.to_thread(db.get_experience, exp_id)
+        notification_text = f"*تجربه برای بررسی مجدد ارسال شد*\n\n" + escape_markdown(db.get_text('admin_new_experience_notification', exp_id=exp.id), version=2)
+        await notify_admins_of_experience(context, exp, notification_text + render_experience(exp),
+                                          await asyncio.to_thread(db.get_user, exp.user_id))
+        await query.edit_message_text("✅ تجربه شما با موفقیت برای بازبینی مجدد به ادمین‌ها ارسال شد.", reply_markup=kb.experience_detail_keyboard(exp_id, page))
+
+    elif exp.status == ExperienceStatus.PENDING:
+        text_part1 = "⚠️ **آیا از ویرایش این تجربه مطمئن هستید؟**\n\n"
+        text_part2 = "تجربه فعلی شما حذف و فرآیند ثبت مجدد از ابتدا آغاز خواهد شد."
+        final_text = text_part1 + escape_markdown(text_part2, version=2)
+        await query.edit_message_text(
+            text=final_text,
+            parse_mode=constants.ParseMode.MARKDOWN_V2,
+            reply_markup=kb.confirm_edit_keyboard(exp_id, page)
+        )
 
 async def edit_experience_confirm_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
@@ -376,7 +546,7 @@ async def edit_experience_confirm_callback(update: Update, context: ContextTypes
     parts = query.data.split('_')
     exp_id = int(parts[-2])
     
-    db.delete_item(Experience, exp_id)
+    await asyncio.to_thread(db.delete_item, Experience, exp_id)
     
     try:
         await query.edit_message_text("تجربه قبلی حذف شد. لطفاً اطلاعات جدید را وارد کنید.")
@@ -393,7 +563,7 @@ async def rules_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def submission_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> States:
     if not await check_channel_membership(update, context): return ConversationHandler.END
     context.user_data['experience'] = {}
-    fields, _ = db.get_paginated_list(Field, per_page=100)
+    fields, _ = await read_cached(db.get_paginated_list, Field, per_page=100)
     
     target = update.message or update.callback_query.message
     
@@ -408,7 +578,7 @@ async def select_field(update: Update, context: ContextTypes.DEFAULT_TYPE) -> St
     await query.answer()
     field_id = int(query.data.split('_')[-1])
     context.user_data['experience']['field_id'] = field_id
-    majors = db.get_all_items_by_parent(Major, 'field_id', field_id)
+    majors = await read_cached(db.get_all_items_by_parent, Major, 'field_id', field_id)
     try:
         await query.edit_message_text(db.get_text('choose_major'), reply_markup=kb.dynamic_list_keyboard(majors, 'major'))
     except BadRequest as e:
@@ -421,7 +591,7 @@ async def select_major(update: Update, context: ContextTypes.DEFAULT_TYPE) -> St
     await query.answer()
     major_id = int(query.data.split('_')[-1])
     context.user_data['experience']['major_id'] = major_id
-    courses = db.get_all_items_by_parent(Course, 'major_id', major_id)
+    courses = await read_cached(db.get_all_items_by_parent, Course, 'major_id', major_id)
     try:
         await query.edit_message_text(db.get_text('choose_course'), reply_markup=kb.dynamic_list_keyboard(courses, 'course'))
     except BadRequest as e:
@@ -433,7 +603,7 @@ async def select_course(update: Update, context: ContextTypes.DEFAULT_TYPE) -> S
     query = update.callback_query
     await query.answer()
     context.user_data['experience']['course_id'] = int(query.data.split('_')[-1])
-    professors, _ = db.get_paginated_list(Professor, per_page=100)
+    professors, _ = await read_cached(db.get_paginated_list, Professor, per_page=100)
     try:
         await query.edit_message_text(db.get_text('choose_professor'), reply_markup=kb.dynamic_list_keyboard(professors, 'professor', has_add_new=True))
     except BadRequest as e:
@@ -468,7 +638,7 @@ async def add_new_professor_receive_name(update: Update, context: ContextTypes.D
     if not prof_name or len(prof_name) > 255:
         await update.message.reply_text("نام استاد نامعتبر است. لطفا دوباره تلاش کنید:")
         return States.ADDING_PROFESSOR
-    new_prof_obj = db.add_item(Professor, name=prof_name)
+    new_prof_obj = await asyncio.to_thread(db.add_item, Professor, name=prof_name)
     context.user_data['experience']['professor_id'] = new_prof_obj.id
     await update.message.reply_text(db.get_text('ask_teaching_rating'), reply_markup=kb.teaching_rating_keyboard())
     return States.GETTING_TEACHING_RATING
@@ -604,32 +774,10 @@ async def get_overall_rating_and_finish(update: Update, context: ContextTypes.DE
     user = update.effective_user
     exp_data['user_id'] = user.id
 
-    with db.session_scope() as s:
-        new_exp_obj = Experience(**exp_data)
-        s.add(new_exp_obj)
-        s.flush()  
-        s.refresh(new_exp_obj, attribute_names=['field', 'major', 'professor', 'course', 'teaching_rating', 'exam_difficulty'])
-        
-        notification_text = escape_markdown(db.get_text('admin_new_experience_notification', exp_id=new_exp_obj.id), version=2)
-        admin_message_text = notification_text + format_experience(new_exp_obj, md_version=2)
-        
-        first_admin_message = None
-        admins = s.query(Admin).all()
-        for admin in admins: 
-            try:
-                msg = await context.bot.send_message(
-                    chat_id=admin.user_id, text=admin_message_text,
-                    reply_markup=kb.admin_approval_keyboard(new_exp_obj.id, user),
-                    parse_mode=constants.ParseMode.MARKDOWN_V2
-                )
-                if not first_admin_message:
-                    first_admin_message = msg
-            except Exception as e:
-                logger.error(f"Failed to send notification to admin {admin.user_id}: {e}")
-
-        if first_admin_message:
-            new_exp_obj.admin_message_id = first_admin_message.message_id
-            new_exp_obj.admin_chat_id = first_admin_message.chat_id
+    new_exp_data = await asyncio.to_thread(db.add_experience, exp_data)
+    notification_text = escape_markdown(db.get_text('admin_new_experience_notification', exp_id=new_exp_data.id), version=2)
+    await notify_admins_of_experience(context, new_exp_data,
+                                      notification_text + format_experience(new_exp_data, md_version=2), user)
     
     await query.message.delete()
     await context.bot.send_message(
@@ -659,6 +807,73 @@ async def admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if await check_admin(update, context):
         await update.message.reply_text(db.get_text('admin_panel_welcome'), reply_markup=kb.admin_panel_main())
 
+PROFILE_JOB_NAME = 'profile_report'
+PROFILE_MAX_SECONDS = 600
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/profile [seconds] [percent] profiles handler calls for a window and sends the report as a file;
+    /profile stop ends the window early, /profile report sends what continuous sampling collected."""
+    if not await check_admin(update, context): return
+    args = context.args or []
+    chat_id = update.effective_chat.id
+    if args and args[0] in ('stop', 'report'):
+        for job in context.job_queue.get_jobs_by_name(PROFILE_JOB_NAME):
+            job.schedule_removal()
+        await send_profile_report(context.bot, chat_id, window_ended=args[0] == 'stop' or bool(profiler.until))
+        return
+    if profiler.active and profiler.until:
+        await update.message.reply_text("یک پروفایل در حال اجراست. برای پایان زودتر /profile stop را بفرستید.")
+        return
+    try:
+        seconds = min(float(args[0]) if args else 30, PROFILE_MAX_SECONDS)
+        percent = min(max(float(args[1]) if len(args) > 1 else 100, 0.1), 100)
+    except ValueError:
+        await update.message.reply_text("استفاده: /profile [ثانیه] [درصد] یا /profile stop یا /profile report")
+        return
+    profiler.start(percent / 100, seconds)
+    context.job_queue.run_once(profile_window_finished, when=seconds + 0.5, chat_id=chat_id, name=PROFILE_JOB_NAME)
+    await update.message.reply_text(f"پروفایل {percent:g}٪ درخواست‌ها به مدت {seconds:g} ثانیه شروع شد؛ "
+                                    f"گزارش به صورت فایل ارسال می‌شود.")
+
+async def profile_window_finished(context: ContextTypes.DEFAULT_TYPE):
+    await send_profile_report(context.bot, context.job.chat_id, window_ended=True)
+
+async def send_profile_report(bot, chat_id, window_ended: bool):
+    """Sends the profile as a document; after a window, continuous sampling (if configured) starts over."""
+    if window_ended:
+        profiler.stop()
+    report = profiler.report()
+    if window_ended and config.PROFILE_SAMPLE_PERCENT:
+        profiler.start(config.PROFILE_SAMPLE_PERCENT / 100)
+    elif not window_ended:
+        profiler.reset()
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    await bot.send_document(chat_id=chat_id, document=report.encode('utf-8'), filename=f"profile_{timestamp}.txt",
+                            rate_limit_args=Priority.INTERACTIVE)
+
+async def memory_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/memory sends PTB state sizes and, while tracemalloc runs, the top allocation sites and their
+    growth since the last /memory; /memory start [frames] and /memory stop switch tracemalloc."""
+    if not await check_admin(update, context): return
+    args = context.args or []
+    if args and args[0] == 'start':
+        try:
+            frames = max(int(args[1]) if len(args) > 1 else 1, 1)
+        except ValueError:
+            await update.message.reply_text("استفاده: /memory یا /memory start [تعداد فریم] یا /memory stop")
+            return
+        memory.start_tracing(frames)
+        await update.message.reply_text(f"tracemalloc با {frames} فریم روشن شد.")
+        return
+    if args and args[0] == 'stop':
+        memory.stop_tracing()
+        await update.message.reply_text("tracemalloc خاموش شد.")
+        return
+    report = memory.report(context.application, user_state_limiter)
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    await context.bot.send_document(chat_id=update.effective_chat.id, document=report.encode('utf-8'),
+                                    filename=f"memory_{timestamp}.txt", rate_limit_args=Priority.INTERACTIVE)
+
 async def admin_panel_callback_inline(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -670,7 +885,7 @@ async def admin_panel_callback_inline(update: Update, context: ContextTypes.DEFA
 
 async def show_stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await check_admin(update, context): return
-    stats = db.get_statistics()
+    stats = await flights.run('statistics', None, db.get_statistics)
     await update.message.reply_text(
         db.get_text('stats_message', **stats),
         parse_mode=constants.ParseMode.MARKDOWN_V2,
@@ -683,13 +898,13 @@ async def admin_list_items_command(update: Update, context: ContextTypes.DEFAULT
     page = 1
     
     if prefix == 'texts':
-        items, total_pages = db.get_paginated_list(BotText, page=page)
+        items, total_pages = await asyncio.to_thread(db.get_paginated_list, BotText, page=page)
         keyboard = kb.admin_manage_texts_list(items, page, total_pages)
         header_key = 'admin_manage_texts_header'
     else:
         model = MODEL_MAP.get(prefix)
         if not model: return
-        items, total_pages = db.get_paginated_list(model, page=page)
+        items, total_pages = await asyncio.to_thread(db.get_paginated_list, model, page=page)
         keyboard = kb.admin_manage_item_list(items, prefix, page, total_pages)
         header_key = f'admin_manage_{prefix}_header'
 
@@ -716,7 +931,7 @@ async def admin_pending_reviews_callback(update: Update, context: ContextTypes.D
 
     page = int(query.data.split('_')[-1])
     
-    experiences, total_pages = db.get_experiences_by_status(ExperienceStatus.PENDING, page=page)
+    experiences, total_pages = await asyncio.to_thread(db.get_experiences_by_status, ExperienceStatus.PENDING, page=page)
     
     if not experiences:
         try:
@@ -741,21 +956,18 @@ async def admin_pending_detail_callback(update: Update, context: ContextTypes.DE
     exp_id = int(parts[-1])
     page = int(parts[-2])
 
-    with db.session_scope() as s:
-        exp = db.get_experience_with_session(s, exp_id)
-        if not exp:
-            await query.edit_message_text("متاسفانه این تجربه پیدا نشد.")
-            return
-        
-        user = s.query(User).filter_by(user_id=exp.user_id).first()
-        if not user:
-            user = update.effective_user 
+    exp = await asyncio.to_thread(db.get_experience, exp_id)
+    if not exp:
+        await query.edit_message_text("متاسفانه این تجربه پیدا نشد.")
+        return
 
-        await query.edit_message_text(
-            format_experience(exp, md_version=2),
-            parse_mode=constants.ParseMode.MARKDOWN_V2,
-            reply_markup=kb.admin_approval_keyboard(exp.id, user, from_list_page=page)
-        )
+    user = await asyncio.to_thread(db.get_user, exp.user_id) or update.effective_user
+
+    await query.edit_message_text(
+        render_experience(exp),
+        parse_mode=constants.ParseMode.MARKDOWN_V2,
+        reply_markup=kb.admin_approval_keyboard(exp.id, user, from_list_page=page, status=exp.status)
+    )
 
 async def experience_approval_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await check_admin(update, context): return
@@ -765,43 +977,56 @@ async def experience_approval_handler(update: Update, context: ContextTypes.DEFA
     action, exp_id_str = data[1], data[2]
     exp_id = int(exp_id_str)
     
-    with db.session_scope() as s:
-        exp = db.get_experience_with_session(s, exp_id)
-        if not exp:
-            await query.edit_message_text("این تجربه دیگر وجود ندارد.")
-            return
+    exp = await asyncio.to_thread(db.get_experience, exp_id)
+    if not exp:
+        await query.edit_message_text("این تجربه دیگر وجود ندارد.")
+        return
 
-        if action == "approve":
-            exp.status = ExperienceStatus.APPROVED
+    # Status changes are committed before any Bot API call, which can wait for a rate-limit
+    # token; the channel message id is recorded afterwards in a second short transaction.
+    if action == "approve":
+        await asyncio.to_thread(db.update_experience_status, exp_id, ExperienceStatus.APPROVED)
+        exp = await asyncio.to_thread(db.get_experience, exp_id)
+        try:
             sent_message = await context.bot.send_message(
-                chat_id=config.CHANNEL_ID, text=format_experience(exp, md_version=2), parse_mode=constants.ParseMode.MARKDOWN_V2
+                chat_id=config.CHANNEL_ID, text=render_experience(exp),
+                parse_mode=constants.ParseMode.MARKDOWN_V2,
+                rate_limit_args=Priority.CHANNEL
             )
-            exp.channel_message_id = sent_message.message_id
-            await query.edit_message_text(db.get_text('admin_approval_success', exp_id=exp_id))
-            try:
-                await context.bot.send_message(
-                    chat_id=exp.user_id, text=db.get_text('user_approval_notification', course_name=exp.course.name)
-                )
-            except Exception as e:
-                logger.warning(f"Could not notify user {exp.user_id} about approval: {e}")
-
-        elif action == "reject":
-            await query.edit_message_text(
-                db.get_text('rejection_reason_prompt'), reply_markup=kb.rejection_reasons_keyboard(exp_id)
+        except Exception:
+            # Not published, so it goes back to the queue and can be approved again.
+            await asyncio.to_thread(db.update_experience_status, exp_id, ExperienceStatus.PENDING)
+            raise
+        await asyncio.to_thread(db.set_experience_channel_message_id, exp_id, sent_message.message_id)
+        await save_experience_document(await asyncio.to_thread(db.get_experience, exp_id))
+        await query.edit_message_text(db.get_text('admin_approval_success', exp_id=exp_id))
+        try:
+            await context.bot.send_message(
+                chat_id=exp.user_id, text=db.get_text('user_approval_notification', course_name=exp.course_name),
+                rate_limit_args=Priority.NOTIFY
             )
+        except Exception as e:
+            logger.warning(f"Could not notify user {exp.user_id} about approval: {e}")
 
-        elif action == "reason":
-            reason_key = f'btn_reject_reason_{data[3]}'
-            reason_text = db.get_text(reason_key)
-            exp.status = ExperienceStatus.REJECTED
-            await query.edit_message_text(db.get_text('admin_rejection_success', exp_id=exp_id, reason=reason_text))
-            try:
-                await context.bot.send_message(
-                    chat_id=exp.user_id,
-                    text=db.get_text('user_rejection_notification', course_name=exp.course.name, reason=reason_text)
-                )
-            except Exception as e:
-                logger.warning(f"Could not notify user {exp.user_id} about rejection: {e}")
+    elif action == "reject":
+        await query.edit_message_text(
+            db.get_text('rejection_reason_prompt'), reply_markup=kb.rejection_reasons_keyboard(exp_id)
+        )
+
+    elif action == "reason":
+        reason_key = f'btn_reject_reason_{data[3]}'
+        reason_text = db.get_text(reason_key)
+        # Also drops the search document.
+        await asyncio.to_thread(db.update_experience_status, exp_id, ExperienceStatus.REJECTED)
+        await query.edit_message_text(db.get_text('admin_rejection_success', exp_id=exp_id, reason=reason_text))
+        try:
+            await context.bot.send_message(
+                chat_id=exp.user_id,
+                text=db.get_text('user_rejection_notification', course_name=exp.course_name, reason=reason_text),
+                rate_limit_args=Priority.NOTIFY
+            )
+        except Exception as e:
+            logger.warning(f"Could not notify user {exp.user_id} about rejection: {e}")
 
 async def delete_experience_content_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await check_admin(update, context): return
@@ -809,7 +1034,7 @@ async def delete_experience_content_callback(update: Update, context: ContextTyp
     
     exp_id = int(query.data.split('_')[-1])
     
-    exp = db.get_experience(exp_id)
+    exp = await asyncio.to_thread(db.get_experience, exp_id)
     if not exp or not exp.channel_message_id:
         await query.answer("خطا: این نظر در کانال یافت نشد یا شناسه آن ثبت نشده است.", show_alert=True)
         return
@@ -818,9 +1043,11 @@ async def delete_experience_content_callback(update: Update, context: ContextTyp
         await context.bot.edit_message_text(
             chat_id=config.CHANNEL_ID,
             message_id=exp.channel_message_id,
-            text=format_experience(exp, redacted=True),
-            parse_mode=constants.ParseMode.MARKDOWN_V2
+            text=render_experience(exp, redacted=True),
+            parse_mode=constants.ParseMode.MARKDOWN_V2,
+            rate_limit_args=Priority.CHANNEL
         )
+        await save_experience_document(exp, redacted=True)
         await query.answer(db.get_text('admin_content_deleted_success'), show_alert=True)
     except TelegramError as e:
         if 'message is not modified' in str(e).lower():
@@ -835,25 +1062,35 @@ async def broadcast_start_callback(update: Update, context: ContextTypes.DEFAULT
     return States.GETTING_BROADCAST_MESSAGE
 
 async def broadcast_receive_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    users = db.get_all_users()
-    sent_count, failed_count = 0, 0
+    users = await asyncio.to_thread(db.get_all_users)
     await update.message.reply_text(f"در حال ارسال پیام به {len(users)} کاربر...")
+    # Runs in the background so the admin's conversation is not blocked; the
+    # outgoing scheduler paces the bulk sends behind interactive traffic.
+    context.application.create_task(send_broadcast(context.bot, update.message, users))
+    return ConversationHandler.END
 
-    for user in users:
-        try:
-            await context.bot.copy_message(
-                chat_id=user['user_id'],
-                from_chat_id=update.message.chat_id,
-                message_id=update.message.message_id
-            )
-            sent_count += 1
-        except Exception as e:
-            logger.error(f"Failed to send broadcast to {user['user_id']}: {e}")
-            failed_count += 1
-        await asyncio.sleep(0.5)
+async def send_broadcast(bot, message, users, chunk_size=100):
+    sent_count, failed_count = 0, 0
 
-    await update.message.reply_text(f"پیام به {sent_count} کاربر ارسال شد. {failed_count} ناموفق بود.")
-    return ConversationHandler.END
+    async def copy_to(user):
+        await bot.copy_message(
+            chat_id=user['user_id'],
+            from_chat_id=message.chat_id,
+            message_id=message.message_id,
+            rate_limit_args=Priority.BULK
+        )
+
+    for start in range(0, len(users), chunk_size):
+        chunk = users[start:start + chunk_size]
+        results = await asyncio.gather(*(copy_to(user) for user in chunk), return_exceptions=True)
+        for user, result in zip(chunk, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to send broadcast to {user['user_id']}: {result}")
+                failed_count += 1
+            else:
+                sent_count += 1
+
+    await message.reply_text(f"پیام به {sent_count} کاربر ارسال شد. {failed_count} ناموفق بود.")
 
 async def single_message_start_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> States:
     if not await check_admin(update, context): return ConversationHandler.END
@@ -886,7 +1123,7 @@ async def admin_toggle_force_sub_callback(update: Update, context: ContextTypes.
     await query.answer()
     current_status = db.get_setting('force_subscribe', 'false')
     new_status = 'true' if current_status == 'false' else 'false'
-    db.set_setting('force_subscribe', new_status)
+    await asyncio.to_thread(db.set_setting, 'force_subscribe', new_status)
     await query.edit_message_text("مدیریت کانال‌ها:", reply_markup=kb.admin_manage_channels_keyboard())
 
 async def admin_add_channel_start_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> States:
@@ -905,7 +1142,9 @@ async def admin_add_channel_get_link(update: Update, context: ContextTypes.DEFAU
     channel_id = context.user_data.pop('new_channel_id')
     channel_link = update.message.text.strip()
     try:
-        db.add_item(RequiredChannel, channel_id=channel_id, channel_link=channel_link)
+        await asyncio.to_thread(db.add_item, RequiredChannel, channel_id=channel_id, channel_link=channel_link)
+        await asyncio.to_thread(db.delete_channel_memberships, channel_id)
+        membership_cache.discard_where(lambda key: key[1] == channel_id)
         await update.message.reply_text("کانال اضافه شد.")
     except Exception as e:
         await update.message.reply_text(f"خطا: {e}")
@@ -916,7 +1155,7 @@ async def admin_delete_channel_callback(update: Update, context: ContextTypes.DE
     if not await check_admin(update, context): return
     query = update.callback_query
     channel_db_id = int(query.data.split('_')[-1])
-    db.delete_item(RequiredChannel, channel_db_id)
+    await asyncio.to_thread(db.delete_item, RequiredChannel, channel_db_id)
     await query.answer("کانال حذف شد.")
     await query.edit_message_text("مدیریت کانال‌ها:", reply_markup=kb.admin_manage_channels_keyboard())
 
@@ -927,13 +1166,13 @@ async def admin_list_items_callback(update: Update, context: ContextTypes.DEFAUL
     parts = query.data.split('_')
     prefix, page = parts[2], int(parts[3])
     if prefix == 'texts':
-        items, total_pages = db.get_paginated_list(BotText, page=page)
+        items, total_pages = await asyncio.to_thread(db.get_paginated_list, BotText, page=page)
         keyboard = kb.admin_manage_texts_list(items, page, total_pages)
         header_key = 'admin_manage_texts_header'
     else:
         model = MODEL_MAP.get(prefix)
         if not model: return
-        items, total_pages = db.get_paginated_list(model, page=page)
+        items, total_pages = await asyncio.to_thread(db.get_paginated_list, model, page=page)
         keyboard = kb.admin_manage_item_list(items, prefix, page, total_pages)
         header_key = f'admin_manage_{prefix}_header'
     await query.edit_message_text(db.get_text(header_key), reply_markup=keyboard)
@@ -945,7 +1184,7 @@ async def item_delete_callback(update: Update, context: ContextTypes.DEFAULT_TYP
     parts = query.data.split('_')
     prefix, item_id, page = parts[0], int(parts[2]), int(parts[3])
     model = MODEL_MAP[prefix]
-    item_name = db.get_item_name(model, item_id)
+    item_name = await asyncio.to_thread(db.get_item_name, model, item_id)
     await query.edit_message_text(
         db.get_text('confirm_delete', item_name=item_name),
         reply_markup=kb.confirm_delete_keyboard(prefix, item_id, page)
@@ -957,7 +1196,7 @@ async def item_confirm_delete_callback(update: Update, context: ContextTypes.DEF
     await query.answer()
     parts = query.data.split('_')
     prefix, item_id, page = parts[0], int(parts[2]), int(parts[3])
-    db.delete_item(MODEL_MAP[prefix], item_id)
+    await asyncio.to_thread(db.delete_item, MODEL_MAP[prefix], item_id)
     await query.edit_message_text(db.get_text('item_deleted_successfully'), reply_markup=kb.back_to_list_keyboard(prefix, page))
 
 async def item_add_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> States:
@@ -969,7 +1208,7 @@ async def item_add_start(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     context.user_data.update({'prefix': prefix, 'page': page})
     if prefix in ['major', 'course']:
         parent_model = Field if prefix == 'major' else Major
-        parents, _ = db.get_paginated_list(parent_model, per_page=100)
+        parents, _ = await asyncio.to_thread(db.get_paginated_list, parent_model, per_page=100)
         await query.edit_message_text(db.get_text('select_parent_field'), reply_markup=kb.parent_field_selection_keyboard(parents, prefix, page))
         return States.SELECTING_PARENT_FIELD
     elif prefix == 'admin':
@@ -985,7 +1224,7 @@ async def item_add_receive_name(update: Update, context: ContextTypes.DEFAULT_TY
     kwargs = {'name': update.message.text.strip()}
     if parent_id:
         kwargs['field_id' if prefix == 'major' else 'major_id'] = parent_id
-    db.add_item(model, **kwargs)
+    await asyncio.to_thread(db.add_item, model, **kwargs)
     await update.message.reply_text(db.get_text('item_added_successfully'), reply_markup=kb.back_to_list_keyboard(prefix, page))
     context.user_data.clear()
     return ConversationHandler.END
@@ -1000,7 +1239,7 @@ async def item_add_select_parent(update: Update, context: ContextTypes.DEFAULT_T
 async def admin_add_get_id(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     page = context.user_data.get('page', 1)
     try:
-        db.add_item(Admin, user_id=int(update.message.text))
+        await asyncio.to_thread(db.add_item, Admin, user_id=int(update.message.text))
         await update.message.reply_text("ادمین اضافه شد.", reply_markup=kb.back_to_list_keyboard('admin', page))
     except Exception as e:
         await update.message.reply_text(f"خطا: {e}", reply_markup=kb.back_to_list_keyboard('admin', page))
@@ -1014,13 +1253,16 @@ async def item_edit_start(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     parts = query.data.split('_')
     prefix, item_id, page = parts[0], int(parts[2]), int(parts[3])
     context.user_data.update({'prefix': prefix, 'item_id': item_id, 'page': page})
-    item_name = db.get_item_name(MODEL_MAP[prefix], item_id)
+    item_name = await asyncio.to_thread(db.get_item_name, MODEL_MAP[prefix], item_id)
     await query.edit_message_text(db.get_text('ask_for_update_item_name', current_name=item_name))
     return States.GETTING_UPDATED_NAME
 
 async def item_edit_receive_name(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     prefix, item_id, page = context.user_data['prefix'], context.user_data['item_id'], context.user_data['page']
-    db.update_item(MODEL_MAP[prefix], item_id, name=update.message.text.strip())
+    await asyncio.to_thread(db.update_item, MODEL_MAP[prefix], item_id, name=update.message.text.strip())
+    if prefix in ('field', 'major', 'professor', 'course'):
+        clear_experience_caches(broadcast=True)
+        context.job_queue.run_once(rebuild_experience_documents, when=1)
     await update.message.reply_text(db.get_text('item_updated_successfully'), reply_markup=kb.back_to_list_keyboard(prefix, page))
     context.user_data.clear()
     return ConversationHandler.END
@@ -1037,10 +1279,10 @@ async def text_edit_start(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
 async def text_edit_receive_value(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     key, page = context.user_data['item_key'], context.user_data['page']
-    with db.session_scope() as s:
-        text_item = s.query(BotText).filter_by(key=key).first()
-        if text_item:
-            text_item.value = update.message.text
+    await asyncio.to_thread(db.set_text, key, update.message.text)
+    clear_experience_caches(broadcast=True)
+    if key.startswith('exp_format_') or key == 'content_deleted_by_request':
+        context.job_queue.run_once(rebuild_experience_documents, when=1)
     await update.message.reply_text(db.get_text('item_updated_successfully'), reply_markup=kb.back_to_list_keyboard('texts', page))
     context.user_data.clear()
     return ConversationHandler.END
@@ -1056,7 +1298,8 @@ async def search_experiences_receive_query(update: Update, context: ContextTypes
     query_str = update.message.text
     context.user_data['search_query'] = query_str
     
-    experiences, total_pages = db.search_experiences_by_professor(query_str, page=1)
+    experiences, total_pages = await flights.run('search', ('professor', query_str, 1),
+                                                 db.search_experiences_by_professor, query_str, page=1)
     
     if not experiences:
         await update.message.reply_text(db.get_text('admin_search_no_results', query=query_str), reply_markup=kb.admin_panel_main())
@@ -1078,7 +1321,8 @@ async def search_results_page_callback(update: Update, context: ContextTypes.DEF
         await query.edit_message_text("خطا: عبارت جستجو یافت نشد. لطفا دوباره جستجو کنید.", reply_markup=kb.admin_experience_menu())
         return
 
-    experiences, total_pages = db.search_experiences_by_professor(query_str, page=page)
+    experiences, total_pages = await flights.run('search', ('professor', query_str, page),
+                                                 db.search_experiences_by_professor, query_str, page=page)
     keyboard = kb.admin_search_results_keyboard(experiences, query_str, page, total_pages)
     await query.edit_message_text(db.get_text('admin_search_results_header', query=query_str), reply_markup=keyboard)
 
@@ -1091,21 +1335,18 @@ async def admin_search_detail_callback(update: Update, context: ContextTypes.DEF
     exp_id = int(parts[-1])
     page = int(parts[-2])
 
-    with db.session_scope() as s:
-        exp = db.get_experience_with_session(s, exp_id)
-        if not exp:
-            await query.edit_message_text("متاسفانه این تجربه پیدا نشد.")
-            return
-        
-        user = s.query(User).filter_by(user_id=exp.user_id).first()
-        if not user:
-            user = update.effective_user 
+    exp = await asyncio.to_thread(db.get_experience, exp_id)
+    if not exp:
+        await query.edit_message_text("متاسفانه این تجربه پیدا نشد.")
+        return
 
-        await query.edit_message_text(
-            format_experience(exp, md_version=2),
-            parse_mode=constants.ParseMode.MARKDOWN_V2,
-            reply_markup=kb.admin_approval_keyboard(exp.id, user, from_list_page=page, from_search=True)
-        )
+    user = await asyncio.to_thread(db.get_user, exp.user_id) or update.effective_user
+
+    await query.edit_message_text(
+        render_experience(exp),
+        parse_mode=constants.ParseMode.MARKDOWN_V2,
+        reply_markup=kb.admin_approval_keyboard(exp.id, user, from_list_page=page, from_search=True, status=exp.status)
+    )
 
 async def user_search_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> States:
     """Starts the user search conversation."""
@@ -1115,7 +1356,8 @@ async def user_search_start(update: Update, context: ContextTypes.DEFAULT_TYPE)
 async def user_search_receive_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> States:
     """Receives user's search query and displays results."""
     query_str = update.message.text
-    experiences, _ = db.search_experiences_for_user(query_str, per_page=20)
+    experiences = await flights.run('search', ('user', db.normalize_search_text(query_str)),
+                                    db.search_experiences_for_user, query_str, limit=20)
 
     if not experiences:
         await update.message.reply_text(db.get_text(USER_SEARCH_NO_RESULTS_KEY, query=query_str))
@@ -1131,11 +1373,14 @@ async def show_user_search_result(update: Update, context: ContextTypes.DEFAULT_
     await query.answer()
     
     exp_id = int(query.data.split('_')[-1])
-    exp = db.get_experience(exp_id)
+    exp_text = await asyncio.to_thread(db.get_experience_document_text, exp_id)
+    if exp_text is None:
+        exp = await asyncio.to_thread(db.get_experience, exp_id)
+        exp_text = render_experience(exp) if exp else None
     
-    if exp:
+    if exp_text:
         await query.message.reply_text(
-            format_experience(exp, md_version=2),
+            exp_text,
             parse_mode=constants.ParseMode.MARKDOWN_V2,
             reply_markup=kb.main_menu()
         )
@@ -1150,18 +1395,19 @@ async def inline_search_handler(update: Update, context: ContextTypes.DEFAULT_TY
         return
 
     results = []
-    experiences = db.search_experiences_for_inline(query)
+    experiences = await flights.run('search', ('inline', db.normalize_search_text(query)),
+                                    db.search_experiences_for_inline, query)
 
-    for exp in experiences:
-        exp_text = format_experience(exp, md_version=2)
+    for doc in experiences:
+        exp_text = doc.rendered_text
         if len(exp_text) > MAX_MESSAGE_LENGTH:
             exp_text = exp_text[:MAX_MESSAGE_LENGTH - 10] + "\n\n\\.\\.\\."
             
         results.append(
             InlineQueryResultArticle(
                 id=str(uuid4()),
-                title=f"{exp.professor.name} - {exp.course.name}",
-                description=exp.conclusion[:100],
+                title=doc.title,
+                description=doc.description,
                 input_message_content=InputTextMessageContent(
                     exp_text,
                     parse_mode=constants.ParseMode.MARKDOWN_V2
@@ -1185,7 +1431,7 @@ async def best_professors_callback(update: Update, context: ContextTypes.DEFAULT
     query = update.callback_query
     await query.answer()
 
-    top_professors = db.get_top_professors()
+    top_professors = await read_cached(db.get_top_professors, 10)
 
     if not top_professors:
         await query.edit_message_text(
@@ -1215,165 +1461,232 @@ async def best_professors_callback(update: Update, context: ContextTypes.DEFAULT
             await query.message.reply_text("خطایی در نمایش رتبه‌بندی رخ داد.")
 
 
-ptb_app = Application.builder().token(config.BOT_TOKEN).build()
-
-conv_defaults = {'per_user': True, 'per_chat': True, 'per_message': False}
-submission_handler = ConversationHandler(
-    entry_points=[
-        MessageHandler(filters.Regex('^' + db.get_text(SUBMIT_EXP_BTN_KEY) + '$'), submission_start),
-        CallbackQueryHandler(edit_experience_confirm_callback, pattern=r"^confirm_edit_")
-    ],
-    states={
-        States.SELECTING_FIELD: [CallbackQueryHandler(select_field, pattern=FIELD_SELECT)],
-        States.SELECTING_MAJOR: [CallbackQueryHandler(select_major, pattern=MAJOR_SELECT)],
-        States.SELECTING_COURSE: [CallbackQueryHandler(select_course, pattern=COURSE_SELECT)],
-        States.SELECTING_PROFESSOR: [
-            CallbackQueryHandler(select_professor, pattern=PROFESSOR_SELECT),
-            CallbackQueryHandler(add_new_professor_start, pattern=PROFESSOR_ADD_NEW)
+# Queues, leases, rate limit buckets and invalidation messages shared by the bot processes.
+state_backend = create_backend(config.STATE_BACKEND_URL)
+
+ptb_builder = Application.builder().token(config.BOT_TOKEN)\
+    .persistence(DatabasePersistence(flush_interval=config.PERSISTENCE_FLUSH_INTERVAL))\
+    .concurrent_updates(PerUserUpdateProcessor(config.CONCURRENT_UPDATES))\
+    .rate_limiter(OutgoingRequestScheduler(state_backend, global_rate=config.TELEGRAM_GLOBAL_RATE))
+if config.TRACE_SAMPLE_RATE:
+    # Same pool size as PTB's default request, plus a span per Bot API call.
+    ptb_builder = ptb_builder.request(tracing.TracingRequest(connection_pool_size=256))
+if config.TELEGRAM_API_BASE_URL:
+    ptb_builder = ptb_builder.base_url(f"{config.TELEGRAM_API_BASE_URL}/bot")\
+        .base_file_url(f"{config.TELEGRAM_API_BASE_URL}/file/bot")
+ptb_app = ptb_builder.build()
+
+# --- Bounded per-user state ---
+user_state_limiter = memory.UserStateLimiter(config.MAX_USERS_IN_MEMORY)
+
+async def track_user_state(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Runs before every other handler; drops the state of the least recently active users when over the cap."""
+    if update.effective_user:
+        evicted = user_state_limiter.touch(update.effective_user.id)
+        if evicted:
+            user_state_limiter.evict(context.application, evicted)
+            metrics.user_state_evictions.inc(len(evicted))
+            logger.info(f"Dropped the in-memory state of {len(evicted)} inactive users.")
+
+async def conversation_timed_out(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    context.user_data.clear()
+
+def with_timeout(states: dict) -> dict:
+    """Conversation states plus the handler that clears the scratch user_data of a timed-out conversation."""
+    return {**states, ConversationHandler.TIMEOUT: [TypeHandler(Update, conversation_timed_out)]}
+
+_handlers_registered = False
+
+def register_handlers(application: Application):
+    """Adds every handler. Button regexes come from bot_texts, so the texts must be seeded first."""
+    global _handlers_registered
+    if _handlers_registered:
+        return
+    _handlers_registered = True
+
+    conv_defaults = {'per_user': True, 'per_chat': True, 'per_message': False, 'persistent': True,
+                     'conversation_timeout': config.CONVERSATION_TIMEOUT or None}
+    submission_handler = ConversationHandler(
+        name='submission',
+        entry_points=[
+            MessageHandler(filters.Regex('^' + db.get_text(SUBMIT_EXP_BTN_KEY) + '$'), submission_start),
+            CallbackQueryHandler(edit_experience_confirm_callback, pattern=r"^confirm_edit_")
         ],
-        States.ADDING_PROFESSOR: [MessageHandler(filters.TEXT & ~filters.COMMAND, add_new_professor_receive_name)],
-        States.GETTING_TEACHING_RATING: [CallbackQueryHandler(get_teaching_rating, pattern=r"^teaching_")],
-        States.GETTING_TEACHING_DETAILS: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_teaching_details)],
-        States.GETTING_NOTES_CHOICE: [CallbackQueryHandler(get_notes_choice, pattern=YES_NO_CHOICE)],
-        States.GETTING_NOTES_DETAILS: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_notes_details)],
-        States.GETTING_PROJECT_CHOICE: [CallbackQueryHandler(get_project_choice, pattern=YES_NO_CHOICE)],
-        States.GETTING_PROJECT_DETAILS: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_project_details)],
-        States.GETTING_ATTENDANCE_CHOICE: [CallbackQueryHandler(get_attendance_choice, pattern=YES_NO_CHOICE)],
-        States.GETTING_ATTENDANCE_DETAILS: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_attendance_details)],
-        States.GETTING_EXAM_CHOICE: [CallbackQueryHandler(get_exam_choice, pattern=YES_NO_CHOICE)],
-        States.GETTING_EXAM_DIFFICULTY: [CallbackQueryHandler(get_exam_difficulty, pattern=r"^exam_")],
-        States.GETTING_EXAM_DETAILS: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_exam_details)],
-        States.GETTING_CONCLUSION: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_conclusion)],
-        States.GETTING_OVERALL_RATING: [CallbackQueryHandler(get_overall_rating_and_finish, pattern=r"^rating_")],
-    },
-    fallbacks=[
-        CallbackQueryHandler(cancel_submission, pattern=CANCEL_SUBMISSION),
-        MessageHandler(filters.Regex('^' + db.get_text('btn_main_menu') + '$'), back_to_main_menu),
-    ],
-    **conv_defaults
-)
+        states=with_timeout({
+            States.SELECTING_FIELD: [CallbackQueryHandler(select_field, pattern=FIELD_SELECT)],
+            States.SELECTING_MAJOR: [CallbackQueryHandler(select_major, pattern=MAJOR_SELECT)],
+            States.SELECTING_COURSE: [CallbackQueryHandler(select_course, pattern=COURSE_SELECT)],
+            States.SELECTING_PROFESSOR: [
+                CallbackQueryHandler(select_professor, pattern=PROFESSOR_SELECT),
+                CallbackQueryHandler(add_new_professor_start, pattern=PROFESSOR_ADD_NEW)
+            ],
+            States.ADDING_PROFESSOR: [MessageHandler(filters.TEXT & ~filters.COMMAND, add_new_professor_receive_name)],
+            States.GETTING_TEACHING_RATING: [CallbackQueryHandler(get_teaching_rating, pattern=r"^teaching_")],
+            States.GETTING_TEACHING_DETAILS: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_teaching_details)],
+            States.GETTING_NOTES_CHOICE: [CallbackQueryHandler(get_notes_choice, pattern=YES_NO_CHOICE)],
+            States.GETTING_NOTES_DETAILS: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_notes_details)],
+            States.GETTING_PROJECT_CHOICE: [CallbackQueryHandler(get_project_choice, pattern=YES_NO_CHOICE)],
+            States.GETTING_PROJECT_DETAILS: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_project_details)],
+            States.GETTING_ATTENDANCE_CHOICE: [CallbackQueryHandler(get_attendance_choice, pattern=YES_NO_CHOICE)],
+            States.GETTING_ATTENDANCE_DETAILS: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_attendance_details)],
+            States.GETTING_EXAM_CHOICE: [CallbackQueryHandler(get_exam_choice, pattern=YES_NO_CHOICE)],
+            States.GETTING_EXAM_DIFFICULTY: [CallbackQueryHandler(get_exam_difficulty, pattern=r"^exam_")],
+            States.GETTING_EXAM_DETAILS: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_exam_details)],
+            States.GETTING_CONCLUSION: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_conclusion)],
+            States.GETTING_OVERALL_RATING: [CallbackQueryHandler(get_overall_rating_and_finish, pattern=r"^rating_")],
+        }),
+        fallbacks=[
+            CallbackQueryHandler(cancel_submission, pattern=CANCEL_SUBMISSION),
+            MessageHandler(filters.Regex('^' + db.get_text('btn_main_menu') + '$'), back_to_main_menu),
+        ],
+        **conv_defaults
+    )
 
-user_search_handler = ConversationHandler(
-    entry_points=[MessageHandler(filters.Regex('^' + db.get_text(SEARCH_BTN_KEY) + '$'), user_search_start)],
-    states={
-        States.GETTING_USER_SEARCH_QUERY: [MessageHandler(filters.TEXT & ~filters.COMMAND, user_search_receive_query)],
-    },
-    fallbacks=[MessageHandler(filters.Regex('^' + db.get_text('btn_main_menu') + '$'), back_to_main_menu)],
-    **conv_defaults
-)
+    user_search_handler = ConversationHandler(
+        name='user_search',
+        entry_points=[MessageHandler(filters.Regex('^' + db.get_text(SEARCH_BTN_KEY) + '$'), user_search_start)],
+        states=with_timeout({
+            States.GETTING_USER_SEARCH_QUERY: [MessageHandler(filters.TEXT & ~filters.COMMAND, user_search_receive_query)],
+        }),
+        fallbacks=[MessageHandler(filters.Regex('^' + db.get_text('btn_main_menu') + '$'), back_to_main_menu)],
+        **conv_defaults
+    )
 
-broadcast_handler = ConversationHandler(
-    entry_points=[MessageHandler(filters.Regex('^' + db.get_text('btn_admin_broadcast') + '$'), broadcast_start_callback)],
-    states={States.GETTING_BROADCAST_MESSAGE: [MessageHandler(filters.ALL & ~filters.COMMAND, broadcast_receive_message)]},
-    fallbacks=[CommandHandler('admin', admin_command)], **conv_defaults
-)
+    broadcast_handler = ConversationHandler(
+        name='broadcast',
+        entry_points=[MessageHandler(filters.Regex('^' + db.get_text('btn_admin_broadcast') + '$'), broadcast_start_callback)],
+        states=with_timeout({States.GETTING_BROADCAST_MESSAGE: [MessageHandler(filters.ALL & ~filters.COMMAND, broadcast_receive_message)]}),
+        fallbacks=[CommandHandler('admin', admin_command)], **conv_defaults
+    )
 
-single_message_handler = ConversationHandler(
-    entry_points=[MessageHandler(filters.Regex('^' + db.get_text('btn_admin_single_message') + '$'), single_message_start_callback)],
-    states={
-        States.GETTING_SINGLE_USER_ID: [MessageHandler(filters.TEXT & ~filters.COMMAND, single_message_get_user)],
-        States.GETTING_SINGLE_MESSAGE: [MessageHandler(filters.ALL & ~filters.COMMAND, single_message_send)]
-    },
-    fallbacks=[CommandHandler('admin', admin_command)], **conv_defaults
-)
+    single_message_handler = ConversationHandler(
+        name='single_message',
+        entry_points=[MessageHandler(filters.Regex('^' + db.get_text('btn_admin_single_message') + '$'), single_message_start_callback)],
+        states=with_timeout({
+            States.GETTING_SINGLE_USER_ID: [MessageHandler(filters.TEXT & ~filters.COMMAND, single_message_get_user)],
+            States.GETTING_SINGLE_MESSAGE: [MessageHandler(filters.ALL & ~filters.COMMAND, single_message_send)]
+        }),
+        fallbacks=[CommandHandler('admin', admin_command)], **conv_defaults
+    )
 
-search_handler = ConversationHandler(
-    entry_points=[CallbackQueryHandler(search_experiences_start, pattern=ADMIN_SEARCH_EXPERIENCES)],
-    states={
-        States.GETTING_PROFESSOR_SEARCH_QUERY: [MessageHandler(filters.TEXT & ~filters.COMMAND, search_experiences_receive_query)]
-    },
-    fallbacks=[CallbackQueryHandler(manage_experiences_command, pattern=ADMIN_MANAGE_EXPERIENCES)],
-    **conv_defaults
-)
+    search_handler = ConversationHandler(
+        name='admin_search',
+        entry_points=[CallbackQueryHandler(search_experiences_start, pattern=ADMIN_SEARCH_EXPERIENCES)],
+        states=with_timeout({
+            States.GETTING_PROFESSOR_SEARCH_QUERY: [MessageHandler(filters.TEXT & ~filters.COMMAND, search_experiences_receive_query)]
+        }),
+        fallbacks=[CallbackQueryHandler(manage_experiences_command, pattern=ADMIN_MANAGE_EXPERIENCES)],
+        **conv_defaults
+    )
 
-add_channel_handler = ConversationHandler(
-    entry_points=[CallbackQueryHandler(admin_add_channel_start_callback, pattern=ADMIN_ADD_CHANNEL)],
-    states={
-        States.GETTING_CHANNEL_ID_TO_ADD: [MessageHandler(filters.TEXT & ~filters.COMMAND, admin_add_channel_get_id)],
-        States.GETTING_CHANNEL_LINK_TO_ADD: [MessageHandler(filters.TEXT & ~filters.COMMAND, admin_add_channel_get_link)]
-    },
-    fallbacks=[CallbackQueryHandler(admin_manage_channels_command, pattern=ADMIN_MANAGE_CHANNELS)], **conv_defaults
-)
-item_add_handler = ConversationHandler(
-    entry_points=[CallbackQueryHandler(item_add_start, pattern=ITEM_ADD), CallbackQueryHandler(item_add_start, pattern=ADMIN_ADD)],
-    states={
-        States.GETTING_NEW_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, item_add_receive_name)],
-        States.GETTING_ADMIN_ID: [MessageHandler(filters.TEXT & ~filters.COMMAND, admin_add_get_id)],
-        States.SELECTING_PARENT_FIELD: [CallbackQueryHandler(item_add_select_parent, pattern=COMPLEX_ITEM_SELECT_PARENT)]
-    },
-    fallbacks=[CallbackQueryHandler(cancel_submission, pattern=CANCEL_SUBMISSION)], **conv_defaults
-)
-item_edit_handler = ConversationHandler(
-    entry_points=[CallbackQueryHandler(item_edit_start, pattern=ITEM_EDIT)],
-    states={States.GETTING_UPDATED_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, item_edit_receive_name)]},
-    fallbacks=[CallbackQueryHandler(cancel_submission, pattern=CANCEL_SUBMISSION)], **conv_defaults
-)
-text_edit_handler = ConversationHandler(
-    entry_points=[CallbackQueryHandler(text_edit_start, pattern=TEXT_EDIT)],
-    states={States.GETTING_UPDATED_TEXT: [MessageHandler(filters.TEXT & ~filters.COMMAND, text_edit_receive_value)]},
-    fallbacks=[CallbackQueryHandler(cancel_submission, pattern=CANCEL_SUBMISSION)], **conv_defaults
-)
+    add_channel_handler = ConversationHandler(
+        name='add_channel',
+        entry_points=[CallbackQueryHandler(admin_add_channel_start_callback, pattern=ADMIN_ADD_CHANNEL)],
+        states=with_timeout({
+            States.GETTING_CHANNEL_ID_TO_ADD: [MessageHandler(filters.TEXT & ~filters.COMMAND, admin_add_channel_get_id)],
+            States.GETTING_CHANNEL_LINK_TO_ADD: [MessageHandler(filters.TEXT & ~filters.COMMAND, admin_add_channel_get_link)]
+        }),
+        fallbacks=[CallbackQueryHandler(admin_manage_channels_command, pattern=ADMIN_MANAGE_CHANNELS)], **conv_defaults
+    )
+    item_add_handler = ConversationHandler(
+        name='item_add',
+        entry_points=[CallbackQueryHandler(item_add_start, pattern=ITEM_ADD), CallbackQueryHandler(item_add_start, pattern=ADMIN_ADD)],
+        states=with_timeout({
+            States.GETTING_NEW_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, item_add_receive_name)],
+            States.GETTING_ADMIN_ID: [MessageHandler(filters.TEXT & ~filters.COMMAND, admin_add_get_id)],
+            States.SELECTING_PARENT_FIELD: [CallbackQueryHandler(item_add_select_parent, pattern=COMPLEX_ITEM_SELECT_PARENT)]
+        }),
+        fallbacks=[CallbackQueryHandler(cancel_submission, pattern=CANCEL_SUBMISSION)], **conv_defaults
+    )
+    item_edit_handler = ConversationHandler(
+        name='item_edit',
+        entry_points=[CallbackQueryHandler(item_edit_start, pattern=ITEM_EDIT)],
+        states=with_timeout({States.GETTING_UPDATED_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, item_edit_receive_name)]}),
+        fallbacks=[CallbackQueryHandler(cancel_submission, pattern=CANCEL_SUBMISSION)], **conv_defaults
+    )
+    text_edit_handler = ConversationHandler(
+        name='text_edit',
+        entry_points=[CallbackQueryHandler(text_edit_start, pattern=TEXT_EDIT)],
+        states=with_timeout({States.GETTING_UPDATED_TEXT: [MessageHandler(filters.TEXT & ~filters.COMMAND, text_edit_receive_value)]}),
+        fallbacks=[CallbackQueryHandler(cancel_submission, pattern=CANCEL_SUBMISSION)], **conv_defaults
+    )
 
-# Command and Message Handlers
-ptb_app.add_handler(CommandHandler("start", start_command))
-ptb_app.add_handler(CommandHandler("admin", admin_command))
-ptb_app.add_handler(MessageHandler(filters.Regex('^' + db.get_text(MY_EXPS_BTN_KEY) + '$'), my_experiences_command))
-ptb_app.add_handler(MessageHandler(filters.Regex('^' + db.get_text(RULES_BTN_KEY) + '$'), rules_command))
-ptb_app.add_handler(MessageHandler(filters.Regex('^' + db.get_text(RANKING_BTN_KEY) + '$'), ranking_command))
-ptb_app.add_handler(MessageHandler(filters.Regex('^' + db.get_text('btn_main_menu') + '$'), back_to_main_menu))
-
-# Admin panel command handlers
-ptb_app.add_handler(MessageHandler(filters.Regex('^' + db.get_text('btn_admin_stats') + '$'), show_stats_command))
-ptb_app.add_handler(MessageHandler(filters.Regex('^' + db.get_text('btn_admin_manage_channels') + '$'), admin_manage_channels_command))
-ptb_app.add_handler(MessageHandler(filters.Regex('^' + db.get_text('btn_admin_manage_experiences') + '$'), manage_experiences_command))
-ptb_app.add_handler(MessageHandler(filters.Regex('^' + db.get_text('btn_admin_manage_fields') + '$'), lambda u, c: admin_list_items_command(u, c, 'field')))
-ptb_app.add_handler(MessageHandler(filters.Regex('^' + db.get_text('btn_admin_manage_majors') + '$'), lambda u, c: admin_list_items_command(u, c, 'major')))
-ptb_app.add_handler(MessageHandler(filters.Regex('^' + db.get_text('btn_admin_manage_professors') + '$'), lambda u, c: admin_list_items_command(u, c, 'professor')))
-ptb_app.add_handler(MessageHandler(filters.Regex('^' + db.get_text('btn_admin_manage_courses') + '$'), lambda u, c: admin_list_items_command(u, c, 'course')))
-ptb_app.add_handler(MessageHandler(filters.Regex('^' + db.get_text('btn_admin_manage_texts') + '$'), lambda u, c: admin_list_items_command(u, c, 'texts')))
-ptb_app.add_handler(MessageHandler(filters.Regex('^' + db.get_text('btn_admin_manage_admins') + '$'), lambda u, c: admin_list_items_command(u, c, 'admin')))
-
-# Conversation Handlers
-ptb_app.add_handler(submission_handler)
-ptb_app.add_handler(broadcast_handler)
-ptb_app.add_handler(single_message_handler)
-ptb_app.add_handler(add_channel_handler)
-ptb_app.add_handler(item_add_handler)
-ptb_app.add_handler(item_edit_handler)
-ptb_app.add_handler(text_edit_handler)
-ptb_app.add_handler(search_handler)
-ptb_app.add_handler(user_search_handler)
-
-# Inline Query Handler
-ptb_app.add_handler(InlineQueryHandler(inline_search_handler))
-
-# Callback handlers for inline buttons
-ptb_app.add_handler(CallbackQueryHandler(membership_check_callback, pattern=CHECK_MEMBERSHIP))
-ptb_app.add_handler(CallbackQueryHandler(best_professors_callback, pattern=BEST_PROFESSORS_BTN_KEY))
-ptb_app.add_handler(CallbackQueryHandler(admin_panel_callback_inline, pattern="^admin_main_panel_inline$"))
-ptb_app.add_handler(CallbackQueryHandler(experience_approval_handler, pattern=EXPERIENCE_APPROVAL))
-ptb_app.add_handler(CallbackQueryHandler(delete_experience_content_callback, pattern=EXPERIENCE_DELETE_CONTENT))
-ptb_app.add_handler(CallbackQueryHandler(admin_toggle_force_sub_callback, pattern=ADMIN_TOGGLE_FORCE_SUB))
-ptb_app.add_handler(CallbackQueryHandler(admin_delete_channel_callback, pattern=ADMIN_DELETE_CHANNEL))
-ptb_app.add_handler(CallbackQueryHandler(admin_list_items_callback, pattern=ADMIN_LIST_ITEMS))
-ptb_app.add_handler(CallbackQueryHandler(admin_list_items_callback, pattern=ADMIN_LIST_TEXTS))
-ptb_app.add_handler(CallbackQueryHandler(item_delete_callback, pattern=ITEM_DELETE))
-ptb_app.add_handler(CallbackQueryHandler(item_confirm_delete_callback, pattern=ITEM_CONFIRM_DELETE))
-ptb_app.add_handler(CallbackQueryHandler(my_experiences_page_callback, pattern=r"^my_exps_"))
-ptb_app.add_handler(CallbackQueryHandler(experience_detail_callback, pattern=r"^exp_detail_"))
-ptb_app.add_handler(CallbackQueryHandler(edit_experience_callback, pattern=r"^edit_exp_"))
-ptb_app.add_handler(CallbackQueryHandler(show_user_search_result, pattern=USER_SEARCH_RESULT))
-
-# New handlers for experience management
-ptb_app.add_handler(CallbackQueryHandler(manage_experiences_command, pattern=ADMIN_MANAGE_EXPERIENCES))
-ptb_app.add_handler(CallbackQueryHandler(admin_pending_reviews_callback, pattern=ADMIN_LIST_PENDING_EXPERIENCES))
-ptb_app.add_handler(CallbackQueryHandler(admin_pending_detail_callback, pattern=ADMIN_PENDING_EXPERIENCE_DETAIL))
-ptb_app.add_handler(CallbackQueryHandler(search_results_page_callback, pattern=ADMIN_SEARCH_RESULTS_PAGE))
-ptb_app.add_handler(CallbackQueryHandler(admin_search_detail_callback, pattern=ADMIN_SEARCH_DETAIL))
+    application.add_handler(TypeHandler(Update, track_user_state), group=-1)
+
+    # Command and Message Handlers
+    application.add_handler(CommandHandler("start", start_command))
+    application.add_handler(CommandHandler("admin", admin_command))
+    application.add_handler(CommandHandler("profile", profile_command))
+    application.add_handler(CommandHandler("memory", memory_command))
+    application.add_handler(MessageHandler(filters.Regex('^' + db.get_text(MY_EXPS_BTN_KEY) + '$'), my_experiences_command))
+    application.add_handler(MessageHandler(filters.Regex('^' + db.get_text(RULES_BTN_KEY) + '$'), rules_command))
+    application.add_handler(MessageHandler(filters.Regex('^' + db.get_text(RANKING_BTN_KEY) + '$'), ranking_command))
+    application.add_handler(MessageHandler(filters.Regex('^' + db.get_text('btn_main_menu') + '$'), back_to_main_menu))
+
+    # Admin panel command handlers
+    application.add_handler(MessageHandler(filters.Regex('^' + db.get_text('btn_admin_stats') + '$'), show_stats_command))
+    application.add_handler(MessageHandler(filters.Regex('^' + db.get_text('btn_admin_manage_channels') + '$'), admin_manage_channels_command))
+    application.add_handler(MessageHandler(filters.Regex('^' + db.get_text('btn_admin_manage_experiences') + '$'), manage_experiences_command))
+    application.add_handler(MessageHandler(filters.Regex('^' + db.get_text('btn_admin_manage_fields') + '$'), lambda u, c: admin_list_items_command(u, c, 'field')))
+    application.add_handler(MessageHandler(filters.Regex('^' + db.get_text('btn_admin_manage_majors') + '$'), lambda u, c: admin_list_items_command(u, c, 'major')))
+    application.add_handler(MessageHandler(filters.Regex('^' + db.get_text('btn_admin_manage_professors') + '$'), lambda u, c: admin_list_items_command(u, c, 'professor')))
+    application.add_handler(MessageHandler(filters.Regex('^' + db.get_text('btn_admin_manage_courses') + '$'), lambda u, c: admin_list_items_command(u, c, 'course')))
+    application.add_handler(MessageHandler(filters.Regex('^' + db.get_text('btn_admin_manage_texts') + '$'), lambda u, c: admin_list_items_command(u, c, 'texts')))
+    application.add_handler(MessageHandler(filters.Regex('^' + db.get_text('btn_admin_manage_admins') + '$'), lambda u, c: admin_list_items_command(u, c, 'admin')))
+
+    # Conversation Handlers
+    application.add_handler(submission_handler)
+    application.add_handler(broadcast_handler)
+    application.add_handler(single_message_handler)
+    application.add_handler(add_channel_handler)
+    application.add_handler(item_add_handler)
+    application.add_handler(item_edit_handler)
+    application.add_handler(text_edit_handler)
+    application.add_handler(search_handler)
+    application.add_handler(user_search_handler)
+
+    # Inline Query Handler
+    application.add_handler(InlineQueryHandler(inline_search_handler))
+    application.add_handler(ChatMemberHandler(track_channel_membership, ChatMemberHandler.CHAT_MEMBER))
+
+    # Callback handlers for inline buttons
+    application.add_handler(CallbackQueryHandler(membership_check_callback, pattern=CHECK_MEMBERSHIP))
+    application.add_handler(CallbackQueryHandler(best_professors_callback, pattern=BEST_PROFESSORS_BTN_KEY))
+    application.add_handler(CallbackQueryHandler(admin_panel_callback_inline, pattern="^admin_main_panel_inline$"))
+    application.add_handler(CallbackQueryHandler(experience_approval_handler, pattern=EXPERIENCE_APPROVAL))
+    application.add_handler(CallbackQueryHandler(delete_experience_content_callback, pattern=EXPERIENCE_DELETE_CONTENT))
+    application.add_handler(CallbackQueryHandler(admin_toggle_force_sub_callback, pattern=ADMIN_TOGGLE_FORCE_SUB))
+    application.add_handler(CallbackQueryHandler(admin_delete_channel_callback, pattern=ADMIN_DELETE_CHANNEL))
+    application.add_handler(CallbackQueryHandler(admin_list_items_callback, pattern=ADMIN_LIST_ITEMS))
+    application.add_handler(CallbackQueryHandler(admin_list_items_callback, pattern=ADMIN_LIST_TEXTS))
+    application.add_handler(CallbackQueryHandler(item_delete_callback, pattern=ITEM_DELETE))
+    application.add_handler(CallbackQueryHandler(item_confirm_delete_callback, pattern=ITEM_CONFIRM_DELETE))
+    application.add_handler(CallbackQueryHandler(my_experiences_page_callback, pattern=r"^my_exps_"))
+    application.add_handler(CallbackQueryHandler(experience_detail_callback, pattern=r"^exp_detail_"))
+    application.add_handler(CallbackQueryHandler(edit_experience_callback, pattern=r"^edit_exp_"))
+    application.add_handler(CallbackQueryHandler(show_user_search_result, pattern=USER_SEARCH_RESULT))
+
+    # New handlers for experience management
+    application.add_handler(CallbackQueryHandler(manage_experiences_command, pattern=ADMIN_MANAGE_EXPERIENCES))
+    application.add_handler(CallbackQueryHandler(admin_pending_reviews_callback, pattern=ADMIN_LIST_PENDING_EXPERIENCES))
+    application.add_handler(CallbackQueryHandler(admin_pending_detail_callback, pattern=ADMIN_PENDING_EXPERIENCE_DETAIL))
+    application.add_handler(CallbackQueryHandler(search_results_page_callback, pattern=ADMIN_SEARCH_RESULTS_PAGE))
+    application.add_handler(CallbackQueryHandler(admin_search_detail_callback, pattern=ADMIN_SEARCH_DETAIL))
+
+    metrics.instrument_handlers(application)
 
 async def on_startup(application: Application):
     application.job_queue.run_repeating(backup_database, interval=1800, first=15)
+    application.job_queue.run_repeating(log_runtime_stats, interval=3600, first=3600)
+    application.job_queue.run_once(rebuild_experience_documents, when=30, data={'missing_only': True})
+    if not config.DOMAIN_NAME:
+        return
     webhook_url = f"https://{config.DOMAIN_NAME}/{config.BOT_TOKEN}"
+    try:
+        # chat_member updates are only delivered when requested explicitly.
+        await application.bot.set_webhook(url=webhook_url, allowed_updates=Update.ALL_TYPES)
+    except TelegramError as e:
+        logger.error(f"Failed to register webhook: {e}")
     logger.info(f"The bot is running and listening for webhooks at: {webhook_url}")
 
 async def on_shutdown(application: Application):
@@ -1382,27 +1695,207 @@ async def on_shutdown(application: Application):
 ptb_app.post_init = on_startup
 ptb_app.post_shutdown = on_shutdown
 
+# --- Update dispatching and cross-process state ---
+EXPERIENCE_INVALIDATION_CHANNEL = 'invalidate:experience'
+MEMBERSHIP_INVALIDATION_CHANNEL = 'invalidate:membership'
+CACHE_INVALIDATION_CHANNEL = 'invalidate:cache'
+# Name on CACHE_INVALIDATION_CHANNEL for clear_experience_caches; not a TieredCache.
+EXPERIENCE_CACHES = 'experiences'
+background_tasks = []
+
+async def process_raw_update(update_data: dict):
+    carrier = update_data.pop(tracing.TRACE_KEY, None)
+    with tracer.continue_trace(carrier, 'process_update', **{'update.id': update_data.get('update_id')}):
+        update = Update.de_json(update_data, ptb_app.bot)
+        await ptb_app.update_processor.process_update(update, ptb_app.process_update(update))
+
+async def reload_shard_state(shard: int):
+    """Loads the persisted state of a shard's users after another process consumed their updates."""
+    reloaded = await memory.reload_users(ptb_app, lambda user_id: update_dispatcher.shard_of(user_id) == shard)
+    logger.info(f"Reloaded {reloaded} conversations of update shard {shard}.")
+
+async def persist_before_handover():
+    """Writes every pending state change, so the process taking the shards over reads it."""
+    await ptb_app.update_persistence()
+    await ptb_app.persistence.flush()
+
+update_dispatcher = UpdateDispatcher(
+    state_backend, process_raw_update,
+    shard_count=config.UPDATE_SHARD_COUNT,
+    local_shards=config.WORKER_SHARDS,
+    max_in_flight=config.CONCURRENT_UPDATES,
+    on_shard_acquired=reload_shard_state,
+    before_release=persist_before_handover
+)
+
+metrics.install_db_hooks(engine)
+for i, replica in enumerate(replica_engines):
+    metrics.install_db_hooks(replica, name=f"replica{i}")
+tracer.configure(config.TRACE_SAMPLE_RATE, tracing.create_exporter(
+    config.TRACE_EXPORTER, config.TRACE_JSONL_PATH, config.OTEL_EXPORTER_OTLP_ENDPOINT, config.OTEL_SERVICE_NAME
+) if config.TRACE_SAMPLE_RATE else None)
+if tracer.enabled:
+    for hooked in [engine, *replica_engines]:
+        tracing.install_db_hooks(hooked)
+
+update_recorder = UpdateRecorder(
+    config.UPDATE_RECORDING_DIR,
+    max_bytes=int(config.UPDATE_RECORDING_MAX_MB * 1024 * 1024),
+    max_files=config.UPDATE_RECORDING_MAX_FILES,
+    salt=config.UPDATE_RECORDING_SALT
+) if config.UPDATE_RECORDING_DIR else None
+_recording_texts = (None, frozenset())
+
+def record_update(update_data: dict):
+    """Hands a webhook update to the recorder, keeping bot texts (button labels) readable."""
+    global _recording_texts
+    snapshot = db.config_snapshot()
+    if _recording_texts[0] is not snapshot:
+        _recording_texts = (snapshot, frozenset(snapshot.texts.values()))
+    sender = next((value['from'].get('id') for value in update_data.values()
+                   if isinstance(value, dict) and isinstance(value.get('from'), dict)), None)
+    update_recorder.record(update_data, admin=sender is not None and db.is_admin(sender),
+                           keep_texts=_recording_texts[1])
+
+@metrics.registry.add_collector
+async def collect_queue_depths():
+    for shard, depth in (await update_dispatcher.queue_depths()).items():
+        metrics.queue_depth.set(depth, queue=f"updates:{shard}")
+    for priority, queued in ptb_app.bot.rate_limiter.stats()['queued'].items():
+        metrics.queue_depth.set(queued, queue=f"outgoing:{priority}")
+
+@metrics.registry.add_collector
+async def collect_user_state():
+    metrics.user_state.set(len(ptb_app.user_data), kind='user_data')
+    metrics.user_state.set(len(memory.conversation_keys(ptb_app)), kind='conversations')
+
+_main_loop = None
+
+def _publish(channel: str, message: str):
+    """Publishes from the event loop or from a database helper running in a worker thread."""
+    loop = _main_loop
+    if loop is None or loop.is_closed():
+        return
+    loop.call_soon_threadsafe(lambda: loop.create_task(state_backend.publish(channel, message)))
+
+@db.on_experience_invalidated
+def _publish_experience_invalidation(exp_id):
+    """Tells the other processes to drop their cached copies of a changed experience."""
+    _publish(EXPERIENCE_INVALIDATION_CHANNEL, str(exp_id))
+
+@cache.on_invalidated
+def _publish_cache_invalidation(name, key):
+    _publish(CACHE_INVALIDATION_CHANNEL, json.dumps([name, key]))
+
+@db.on_config_invalidated
+def _publish_config_invalidation():
+    # config_version polling stays as the fallback for missed messages.
+    _publish(CACHE_INVALIDATION_CHANNEL, json.dumps(['config', None]))
+
+async def listen_for_invalidations():
+    async for message in state_backend.subscribe(EXPERIENCE_INVALIDATION_CHANNEL):
+        exp_id = int(message)
+        db.experience_cache.discard(exp_id)
+        _drop_rendered_experience(exp_id)
+
+async def listen_for_membership_changes():
+    async for message in state_backend.subscribe(MEMBERSHIP_INVALIDATION_CHANNEL):
+        user_id, channel_id = json.loads(message)
+        membership_cache.discard((user_id, channel_id))
+
+async def listen_for_cache_invalidations():
+    async for message in state_backend.subscribe(CACHE_INVALIDATION_CHANNEL):
+        name, key = json.loads(message)
+        if name == 'config':
+            # Handlers keep reading the previous snapshot while the new one loads.
+            await asyncio.to_thread(db.invalidate_config, bump_version=False)
+        elif name == EXPERIENCE_CACHES:
+            clear_experience_caches()
+        else:
+            cache.drop_local(name, key)
+
+async def start_bot(run_startup_jobs: bool):
+    """Initializes the bot and starts the local update consumers for this process role."""
+    global _main_loop
+    started = time.perf_counter()
+    _main_loop = asyncio.get_running_loop()
+    # Blocking database helpers run in these threads; more than the engine's pool
+    # (pool_size + max_overflow) would only wait for a connection.
+    _main_loop.set_default_executor(ThreadPoolExecutor(config.DB_THREADS, thread_name_prefix='db'))
+    # Seeding the database and the bot's getMe call do not depend on each other.
+    seeded_texts, _ = await asyncio.gather(asyncio.to_thread(db.initialize_database), ptb_app.bot.initialize())
+    # Handlers, keyboards and register_handlers read the snapshot on the loop; it must be loaded already.
+    await asyncio.to_thread(db.reload_config)
+    register_handlers(ptb_app)
+    await ptb_app.initialize()
+    # Conversations restored from the database count towards the cap as the least recently active.
+    user_state_limiter.adopt({key[-1] for key in memory.conversation_keys(ptb_app)})
+    await ptb_app.start()
+    if config.TRACEMALLOC_FRAMES:
+        memory.start_tracing(config.TRACEMALLOC_FRAMES)
+    profiler.interval = config.PROFILE_INTERVAL_MS / 1000
+    if config.PROFILE_SAMPLE_PERCENT:
+        profiler.start(config.PROFILE_SAMPLE_PERCENT / 100)
+    tracer.start()
+    if run_startup_jobs:
+        await on_startup(ptb_app)
+    ptb_app.job_queue.run_repeating(refresh_config, interval=config.CONFIG_REFRESH_INTERVAL,
+                                    first=config.CONFIG_REFRESH_INTERVAL)
+    background_tasks.append(asyncio.create_task(listen_for_invalidations()))
+    background_tasks.append(asyncio.create_task(listen_for_membership_changes()))
+    background_tasks.append(asyncio.create_task(listen_for_cache_invalidations()))
+    if config.WORKER_ROLE != 'ingress':
+        await update_dispatcher.start()
+    logger.info(f"Bot started in {(time.perf_counter() - started) * 1000:.1f} ms "
+                f"({seeded_texts} default texts inserted).")
+
+async def stop_bot():
+    await update_dispatcher.stop()
+    if update_recorder:
+        await update_recorder.flush()
+    await tracer.stop()
+    for task in background_tasks:
+        task.cancel()
+    await ptb_app.stop()
+    await ptb_app.shutdown()
+    await state_backend.close()
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("Application starting...")
-    await ptb_app.initialize()
-    await ptb_app.start()
+    await start_bot(run_startup_jobs=True)
     yield
     print("Application shutting down...")
-    await ptb_app.updater.stop()
-    await ptb_app.shutdown()
+    await stop_bot()
 
 app = FastAPI(lifespan=lifespan)
 
 @app.post(f"/{config.BOT_TOKEN}")
 async def webhook_handler(request: Request):
     update_data = await request.json()
-    try:
-        update = Update.de_json(update_data, ptb_app.bot)
-        asyncio.create_task(ptb_app.process_update(update))
-    except Exception as e:
-        logger.error(f"Error processing update: {e}")
+    if update_recorder:
+        try:
+            record_update(update_data)
+        except Exception as e:
+            logger.warning(f"Could not record update: {e}")
+    with tracer.root_span('webhook', **{'update.id': update_data.get('update_id')}) as span:
+        if span is not None:
+            update_data[tracing.TRACE_KEY] = tracer.inject(span)
+        try:
+            await update_dispatcher.submit(update_data)
+        except Exception as e:
+            logger.error(f"Error processing update: {e}")
     return Response(content="OK", status_code=200)
 
+@app.get("/metrics")
+async def metrics_handler(request: Request):
+    if config.METRICS_TOKEN:
+        supplied = request.query_params.get('token') or request.headers.get('authorization', '').removeprefix('Bearer ')
+        if not secrets.compare_digest(supplied, config.METRICS_TOKEN):
+            return Response(status_code=403)
+    return PlainTextResponse(await metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
-    asyncio.run(ptb_app.run_polling())
\ No newline at end of file
+    db.initialize_database()
+    register_handlers(ptb_app)
+    ptb_app.run_polling(allowed_updates=Update.ALL_TYPES)
\ No newline at end of file
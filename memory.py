@@ -0,0 +1,218 @@
+# memory.py
+
+"""
+Bounds the per-user state PTB keeps in memory and reports where memory goes.
+
+PTB never forgets a user on its own: everyone who sent an update keeps a
+user_data and a chat_data entry, and a conversation abandoned halfway keeps its
+state and scratch user_data. Idle conversations end after CONVERSATION_TIMEOUT;
+UserStateLimiter additionally caps how many users keep any state, dropping the
+least recently active ones (their persisted rows are deleted with them).
+"""
+
+import resource
+import sys
+import time
+import tracemalloc
+from collections import OrderedDict
+
+from telegram.ext import ConversationHandler
+
+# Eviction runs in batches down to this share of the cap, not once per new user.
+EVICT_TO = 0.9
+
+_previous_snapshot = None
+
+
+def conversation_handlers(application) -> list:
+    return [handler for handlers in application.handlers.values() for handler in handlers
+            if isinstance(handler, ConversationHandler)]
+
+
+def conversation_keys(application) -> list:
+    # PTB has no public accessor for the conversation states.
+    return [key for handler in conversation_handlers(application) for key in handler._conversations]
+
+
+def end_conversations(application, user_ids) -> int:
+    """Ends every conversation of these users; persisted states are deleted with the next persistence flush."""
+    ended = 0
+    for handler in conversation_handlers(application):
+        # Nor an API to end a conversation from outside its handlers. Popping from the tracking
+        # dict is what handlers returning END do, so persistence sees the deletion.
+        conversations = handler._conversations
+        for key in [key for key in conversations if key[-1] in user_ids]:
+            conversations.pop(key, None)
+            job = handler.timeout_jobs.pop(key, None)
+            if job is not None:
+                job.schedule_removal()
+            ended += 1
+    return ended
+
+
+async def reload_users(application, owns) -> int:
+    """
+    Replaces the conversation states of the users owns(user_id) selects with the
+    persisted ones and forgets their user_data, which is loaded again on their next
+    update. For users whose updates another process handled meanwhile.
+    """
+    application.persistence.forget_users(owns)
+    reloaded = 0
+    for handler in conversation_handlers(application):
+        if not (handler.persistent and handler.name):
+            continue
+        stored = await application.persistence.get_conversations(handler.name)
+        conversations = handler._conversations
+        stale = [key for key in conversations if owns(key[-1])]
+        # Written around the tracking dict: nothing of the old state may be written back.
+        for key in stale:
+            del conversations.data[key]
+        conversations._write_access_keys -= set(stale)
+        fresh = {key: state for key, state in stored.items() if owns(key[-1])}
+        conversations.update_no_track(fresh)
+        reloaded += len(fresh)
+    for user_id in [user_id for user_id in application.user_data if owns(user_id)]:
+        application._user_data.pop(user_id, None)
+        application._user_ids_to_be_updated_in_persistence.discard(user_id)
+    return reloaded
+
+
+class UserStateLimiter:
+    """Keeps user_data, chat_data and conversation state for at most max_users users (0 = unlimited)."""
+
+    def __init__(self, max_users: int):
+        self.max_users = max_users
+        self._recent = OrderedDict()
+        self.evicted_users = 0
+        self.ended_conversations = 0
+
+    def touch(self, user_id) -> list:
+        """Marks a user as active; returns the least recently active users to evict, if over the cap."""
+        if self.max_users <= 0:
+            return []
+        recent = self._recent
+        recent[user_id] = None
+        recent.move_to_end(user_id)
+        if len(recent) <= self.max_users:
+            return []
+        target = int(self.max_users * EVICT_TO)
+        return [recent.popitem(last=False)[0] for _ in range(len(recent) - target)]
+
+    def adopt(self, user_ids):
+        """Registers users whose state was loaded at startup as the least recently active."""
+        if self.max_users <= 0:
+            return
+        for user_id in user_ids:
+            if user_id not in self._recent:
+                self._recent[user_id] = None
+                self._recent.move_to_end(user_id, last=False)
+
+    def evict(self, application, user_ids):
+        user_ids = set(user_ids)
+        self.ended_conversations += end_conversations(application, user_ids)
+        for user_id in user_ids:
+            application.drop_user_data(user_id)
+            # Private chats share the user's id.
+            if user_id in application.chat_data:
+                application.drop_chat_data(user_id)
+        self.evicted_users += len(user_ids)
+
+    def __len__(self):
+        return len(self._recent)
+
+    def stats(self) -> dict:
+        return {
+            'tracked_users': len(self._recent),
+            'max_users': self.max_users,
+            'evicted_users': self.evicted_users,
+            'ended_conversations': self.ended_conversations,
+        }
+
+
+# --- Introspection ---
+
+def deep_sizeof(obj, seen: set | None = None) -> int:
+    """Approximate size of an object and everything it references through containers and __dict__."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, '__dict__') and not isinstance(obj, type):
+        size += deep_sizeof(vars(obj), seen)
+    return size
+
+
+def state_sizes(application) -> dict:
+    """Entry counts and approximate sizes of PTB's data dicts and conversation states."""
+    sizes = {
+        'user_data': (len(application.user_data), deep_sizeof(dict(application.user_data))),
+        'chat_data': (len(application.chat_data), deep_sizeof(dict(application.chat_data))),
+        'bot_data': (len(application.bot_data), deep_sizeof(application.bot_data)),
+    }
+    for handler in conversation_handlers(application):
+        conversations = handler._conversations
+        sizes[f"conversation:{handler.name}"] = (len(conversations), deep_sizeof(dict(conversations)))
+    return sizes
+
+
+def start_tracing(frames: int = 1):
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def stop_tracing():
+    global _previous_snapshot
+    _previous_snapshot = None
+    tracemalloc.stop()
+
+
+def report(application, limiter: UserStateLimiter | None = None, top: int = 25) -> str:
+    """Plain-text report: PTB state sizes, then (while tracemalloc runs) the top allocation
+    sites and the growth since the previous report."""
+    global _previous_snapshot
+    started = time.perf_counter()
+    # ru_maxrss is in kilobytes on Linux.
+    lines = [f"Peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB", '',
+             '== PTB state ==']
+    for name, (entries, size) in state_sizes(application).items():
+        lines.append(f"  {name:<32} {entries:>8} entries  {size / 1024:10.1f} KB")
+    if limiter is not None:
+        lines.append(f"  limiter: {limiter.stats()}")
+    lines.append('')
+
+    if not tracemalloc.is_tracing():
+        lines.append("tracemalloc is off; /memory start [frames] turns it on (allocations get slower).")
+        return '\n'.join(lines) + '\n'
+
+    current, peak = tracemalloc.get_traced_memory()
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<unknown>'),
+    ))
+    lines.append(f"== top {top} allocation sites: {current / 2**20:.1f} MB traced, peak {peak / 2**20:.1f} MB ==")
+    for stat in snapshot.statistics('lineno')[:top]:
+        frame = stat.traceback[0]
+        lines.append(f"  {stat.size / 1024:10.1f} KB {stat.count:>9} blocks  {frame.filename}:{frame.lineno}")
+    if _previous_snapshot is not None:
+        lines.append('')
+        lines.append('== growth since the previous report ==')
+        for stat in snapshot.compare_to(_previous_snapshot, 'lineno')[:top]:
+            frame = stat.traceback[0]
+            lines.append(f"  {stat.size_diff / 1024:+10.1f} KB {stat.count_diff:>+9} blocks  "
+                         f"{frame.filename}:{frame.lineno}")
+    if tracemalloc.get_traceback_limit() > 1:
+        lines.append('')
+        lines.append('== top 5 tracebacks ==')
+        for stat in snapshot.statistics('traceback')[:5]:
+            lines.append(f"  {stat.size / 1024:.1f} KB in {stat.count} blocks")
+            lines.extend(f"    {line}" for line in stat.traceback.format())
+    _previous_snapshot = snapshot
+    lines.append('')
+    lines.append(f"Report took {(time.perf_counter() - started) * 1000:.0f} ms.")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,290 @@
+# metrics.py
+
+"""
+In-process metrics rendered in the Prometheus text exposition format.
+
+Handlers are instrumented by instrument_handlers() after registration, which also
+hooks them into the sampling profiler; updates by track_update() in the update
+processor, Bot API calls by the outgoing request scheduler and SQL statements
+through query_tracker.
+"""
+
+import bisect
+import functools
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from telegram import Update
+from telegram.ext import ConversationHandler
+
+import query_tracker
+from profiler import profiler
+from tracing import tracer
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = self.header()
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    render = Counter.render
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        lines = self.header()
+        for key, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {round(total, 6)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        """Registers an async callable run on every scrape, typically to refresh gauges."""
+        self._collectors.append(collector)
+        return collector
+
+    async def render(self) -> str:
+        for collector in self._collectors:
+            await collector()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+handler_duration = registry.register(Histogram(
+    'bot_handler_duration_seconds', 'Time spent in a handler callback.', ['handler']))
+handler_errors = registry.register(Counter(
+    'bot_handler_errors_total', 'Handler callbacks that raised.', ['handler']))
+updates_total = registry.register(Counter(
+    'bot_updates_total', 'Processed updates by type and callback data prefix.', ['type', 'callback_prefix']))
+update_duration = registry.register(Histogram(
+    'bot_update_duration_seconds', 'Time to process one update, lock wait included.', ['type']))
+update_db_queries = registry.register(Histogram(
+    'bot_update_db_queries', 'SQL statements executed while processing one update.', buckets=COUNT_BUCKETS))
+update_db_seconds = registry.register(Histogram(
+    'bot_update_db_seconds', 'Time spent in SQL statements while processing one update.'))
+db_queries_total = registry.register(Counter(
+    'db_queries_total', 'SQL statements executed.'))
+telegram_api_duration = registry.register(Histogram(
+    'telegram_api_duration_seconds', 'Bot API request latency, retries excluded.', ['method']))
+telegram_api_errors = registry.register(Counter(
+    'telegram_api_errors_total', 'Failed Bot API requests.', ['method', 'error']))
+db_pool = registry.register(Gauge(
+    'db_pool_connections', 'SQLAlchemy connection pool state.', ['engine', 'state']))
+queue_depth = registry.register(Gauge(
+    'bot_queue_depth', 'Items waiting in the update shards and the outgoing request scheduler.', ['queue']))
+user_state = registry.register(Gauge(
+    'bot_user_state', 'Users with user_data in memory and active conversations.', ['kind']))
+user_state_evictions = registry.register(Counter(
+    'bot_user_state_evictions_total', 'Users whose in-memory state was dropped by MAX_USERS_IN_MEMORY.'))
+singleflight_calls = registry.register(Counter(
+    'bot_singleflight_calls_total', 'Expensive read calls, executed or coalesced onto an identical running call.',
+    ['name', 'result']))
+
+
+# --- Per-update accounting ---
+
+_callback_suffix = re.compile(r'[_:]?-?\d.*$')
+
+
+def update_type(update) -> str:
+    if isinstance(update, Update):
+        for name in Update.ALL_TYPES:
+            if getattr(update, name, None) is not None:
+                return name
+    return 'other'
+
+
+def callback_prefix(update) -> str:
+    query = update.callback_query if isinstance(update, Update) else None
+    if not query or not query.data:
+        return ''
+    return _callback_suffix.sub('', query.data)[:64]
+
+
+@contextmanager
+def track_update(update):
+    """Counts the update and the SQL it triggers; wraps the whole processing of one update."""
+    kind = update_type(update)
+    updates_total.inc(type=kind, callback_prefix=callback_prefix(update))
+    started = time.perf_counter()
+    with query_tracker.track_queries(label=kind) as tracker:
+        try:
+            yield tracker
+        finally:
+            update_duration.observe(time.perf_counter() - started, type=kind)
+            update_db_queries.observe(tracker.count)
+            update_db_seconds.observe(tracker.seconds)
+            query_tracker.report(tracker)
+
+
+def install_db_hooks(engine, name: str = 'primary'):
+    query_tracker.install(engine)
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        db_queries_total.inc()
+
+    def _collect_pool():
+        pool = engine.pool
+        for state in ('size', 'checkedin', 'checkedout', 'overflow'):
+            reader = getattr(pool, state, None)
+            if callable(reader):
+                db_pool.set(reader(), engine=name, state=state)
+
+    async def collect():
+        _collect_pool()
+
+    registry.add_collector(collect)
+
+
+def observe_api_call(method: str, seconds: float, error: Exception | None = None):
+    telegram_api_duration.observe(seconds, method=method)
+    if error is not None:
+        telegram_api_errors.inc(method=method, error=type(error).__name__)
+
+
+# --- Handler instrumentation ---
+
+def handler_name(callback) -> str:
+    if isinstance(callback, functools.partial):
+        return handler_name(callback.func)
+    name = getattr(callback, '__name__', type(callback).__name__)
+    if name == '<lambda>':
+        return f"lambda_line_{callback.__code__.co_firstlineno}"
+    return name
+
+
+def _timed(callback, name):
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        query_tracker.set_handler(name)
+        frame = sys._getframe() if profiler.should_sample() else None
+        if frame is not None:
+            profiler.track(frame, name)
+        started = time.perf_counter()
+        try:
+            with tracer.span(f"handler.{name}"):
+                return await callback(update, context)
+        except Exception:
+            handler_errors.inc(handler=name)
+            raise
+        finally:
+            handler_duration.observe(time.perf_counter() - started, handler=name)
+            if frame is not None:
+                profiler.untrack(frame)
+    wrapper._instrumented = True
+    return wrapper
+
+
+def _instrument(handler):
+    if isinstance(handler, ConversationHandler):
+        nested = list(handler.entry_points) + list(handler.fallbacks)
+        for state_handlers in handler.states.values():
+            nested.extend(state_handlers)
+        for inner in nested:
+            _instrument(inner)
+        return
+    callback = getattr(handler, 'callback', None)
+    if callback is None or getattr(callback, '_instrumented', False):
+        return
+    handler.callback = _timed(callback, handler_name(callback))
+
+
+def instrument_handlers(application):
+    """Wraps the callback of every registered handler, conversation steps included."""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            _instrument(handler)
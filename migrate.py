@@ -0,0 +1,65 @@
+# migrate.py
+
+"""
+Waits for the database and runs `alembic upgrade head` only when needed.
+
+Comparing alembic_version with the script heads is one query, so restarts of an
+up-to-date deployment skip the full Alembic upgrade run.
+
+    python migrate.py [--timeout 60]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy.exc import OperationalError
+
+from models import engine
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'alembic.ini')
+
+
+def wait_for_database(timeout: float):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with engine.connect():
+                return
+        except OperationalError:
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(1)
+
+
+def current_heads() -> set:
+    with engine.connect() as connection:
+        return set(MigrationContext.configure(connection).get_current_heads())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--timeout', type=float, default=60, help="seconds to wait for the database")
+    args = parser.parse_args()
+
+    print("Waiting for database connection...")
+    wait_for_database(args.timeout)
+
+    alembic_config = Config(ALEMBIC_INI)
+    script_heads = set(ScriptDirectory.from_config(alembic_config).get_heads())
+    if current_heads() == script_heads:
+        print(f"Database schema is up to date ({', '.join(sorted(script_heads))}); skipping migrations.")
+        return 0
+
+    print("Running database migrations...")
+    command.upgrade(alembic_config, 'head')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
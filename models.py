@@ -2,19 +2,21 @@
 
 import enum
 from sqlalchemy import (create_engine, Column, Integer, String, Text,
-                        ForeignKey, Boolean, DateTime, Enum as EnumType, BigInteger)
-from sqlalchemy.orm import declarative_base, relationship
+                        ForeignKey, Boolean, DateTime, Enum as EnumType, BigInteger,
+                        LargeBinary, UniqueConstraint)
+from sqlalchemy.orm import declarative_base, relationship, deferred
 from sqlalchemy.sql import func
+import datetime
 from dataclasses import dataclass
-from typing import Optional
+from typing import NamedTuple, Optional
 
-from config import DATABASE_URL
+from config import DATABASE_URL, DATABASE_REPLICA_URLS
 
 Base = declarative_base()
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ExperienceData:
-    """A dataclass to hold experience data independent of the session."""
+    """An immutable, session-independent copy of an experience; the only input of format_experience."""
     id: int
     user_id: int
     teaching_style: str
@@ -38,6 +40,31 @@ class ExperienceData:
     has_project: Optional[bool] = None
     has_exam: Optional[bool] = None
     # --- NEW FIELDS END ---
+    updated_at: Optional[datetime.datetime] = None
+    created_at: Optional[datetime.datetime] = None
+
+
+class ExperienceSummary(NamedTuple):
+    """One row of an experience list: the columns the list keyboards show."""
+    id: int
+    course_name: str
+    professor_name: str
+    status: 'ExperienceStatus'
+
+
+class ProfessorRanking(NamedTuple):
+    """One line of the best professors list."""
+    name: str
+    review_count: int
+    weighted_score: Optional[float]
+
+
+class InlineDocument(NamedTuple):
+    """A pre-rendered search document as shown in inline query results."""
+    id: int
+    title: str
+    description: Optional[str]
+    rendered_text: str
 
 
 class ExperienceStatus(str, enum.Enum):
@@ -122,13 +149,14 @@ class Experience(Base):
     major_id = Column(Integer, ForeignKey('majors.id'))
     professor_id = Column(Integer, ForeignKey('professors.id'))
     course_id = Column(Integer, ForeignKey('courses.id'))
-    teaching_style = Column(Text, nullable=True)
-    notes = Column(Text, nullable=True)
-    project = Column(Text, nullable=True)
+    # The long texts are only loaded when read, or for the whole 'text' group with undefer_group('text').
+    teaching_style = deferred(Column(Text, nullable=True), group='text')
+    notes = deferred(Column(Text, nullable=True), group='text')
+    project = deferred(Column(Text, nullable=True), group='text')
     attendance_required = Column(Boolean)
-    attendance_details = Column(Text, nullable=True)
-    exam = Column(Text, nullable=True)
-    conclusion = Column(Text)
+    attendance_details = deferred(Column(Text, nullable=True), group='text')
+    exam = deferred(Column(Text, nullable=True), group='text')
+    conclusion = deferred(Column(Text), group='text')
     status = Column(EnumType(ExperienceStatus), default=ExperienceStatus.PENDING, nullable=False)
     admin_message_id = Column(BigInteger, nullable=True)
     admin_chat_id = Column(BigInteger, nullable=True)
@@ -152,6 +180,22 @@ class Experience(Base):
     course = relationship("Course")
 
 
+class ExperienceDocument(Base):
+    """Denormalized, pre-rendered copy of an approved experience used by the search paths."""
+    __tablename__ = 'experience_documents'
+    experience_id = Column(Integer, ForeignKey('experiences.id', ondelete='CASCADE'), primary_key=True)
+    professor_name = Column(String(255), nullable=False)
+    course_name = Column(String(255), nullable=False)
+    title = Column(String(512), nullable=False)
+    description = Column(String(255), nullable=True)
+    rendered_text = Column(Text, nullable=False)
+    search_text = Column(Text, nullable=False)
+    tags = Column(Text, nullable=True)
+    redacted = Column(Boolean, nullable=False, default=False)
+    published_at = Column(DateTime(timezone=True), nullable=True, index=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
 class RequiredChannel(Base):
     __tablename__ = 'required_channels'
     id = Column(Integer, primary_key=True)
@@ -164,7 +208,33 @@ class Setting(Base):
     key = Column(String(255), unique=True, nullable=False)
     value = Column(String(255), nullable=False)
 
-engine = create_engine(DATABASE_URL, echo=False, connect_args={'charset': 'utf8mb4'})
+class PersistedState(Base):
+    """Pickled python-telegram-bot user data and conversation states, one row per key."""
+    __tablename__ = 'bot_persistence'
+    __table_args__ = (UniqueConstraint('namespace', 'key', name='uq_bot_persistence_namespace_key'),)
+    id = Column(Integer, primary_key=True)
+    namespace = Column(String(128), nullable=False)
+    key = Column(String(255), nullable=False)
+    data = Column(LargeBinary(length=16777215), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class ChannelMembership(Base):
+    """Last known membership of a user in a required channel, kept current from chat_member updates."""
+    __tablename__ = 'channel_memberships'
+    __table_args__ = (UniqueConstraint('user_id', 'channel_id', name='uq_channel_memberships_user_channel'),)
+    id = Column(Integer, primary_key=True)
+    user_id = Column(BigInteger, nullable=False)
+    channel_id = Column(String(255), nullable=False, index=True)
+    is_member = Column(Boolean, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+def _create_engine(url, **kwargs):
+    return create_engine(url, echo=False, connect_args={'charset': 'utf8mb4'} if url.startswith('mysql') else {},
+                         **kwargs)
+
+engine = _create_engine(DATABASE_URL)
+# Only used by the read-only helpers in database.py; a dead replica is noticed at checkout.
+replica_engines = [_create_engine(url, pool_pre_ping=True) for url in DATABASE_REPLICA_URLS]
 
 def create_tables():
     """Creates all tables in the database based on the models."""
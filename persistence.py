@@ -0,0 +1,179 @@
+# persistence.py
+
+import asyncio
+import json
+import logging
+import pickle
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+import database as db
+
+logger = logging.getLogger(__name__)
+
+USER_DATA = 'user_data'
+CHAT_DATA = 'chat_data'
+BOT_DATA = 'bot_data'
+CALLBACK_DATA = 'callback_data'
+SINGLETON_KEY = '-'
+
+
+def _conversation_namespace(name: str) -> str:
+    return f"conversation:{name}"
+
+
+class DatabasePersistence(BasePersistence):
+    """
+    Keeps conversation states and user data in the bot_persistence table.
+
+    PTB hands over the changes every ``flush_interval`` seconds (its update_interval);
+    they are coalesced per key and written in one batch right after that pass, so
+    PTB's job is the only timer and nothing waits longer than ``flush_interval``.
+    User and chat data are loaded lazily when the first update for that user or
+    chat arrives.
+    """
+
+    def __init__(self, flush_interval: float = 2.0):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=flush_interval
+        )
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._flush_task = None
+        self._loaded_users = set()
+        self._loaded_chats = set()
+
+    # --- Write-behind buffer ---
+
+    def _buffer(self, namespace, key, value):
+        """Stores the latest value for a key; None marks the row for deletion."""
+        data = None if value is None else pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self._pending[(namespace, str(key))] = data
+        if self._flush_task is None or self._flush_task.done():
+            # Starts once the other update_* calls of the same pass have run.
+            self._flush_task = asyncio.get_running_loop().create_task(self._write_pending())
+
+    def _requeue(self, batch):
+        # Entries buffered since the batch was taken are newer and win.
+        for item_key, data in batch.items():
+            self._pending.setdefault(item_key, data)
+
+    async def _write_pending(self, retry: bool = True):
+        # Loops so entries buffered while a batch is being written are not left behind.
+        while self._pending:
+            batch, self._pending = self._pending, {}
+            try:
+                await asyncio.to_thread(db.save_persisted_states,
+                                        [(ns, key, data) for (ns, key), data in batch.items()])
+            except asyncio.CancelledError:
+                self._requeue(batch)
+                raise
+            except Exception as e:
+                logger.error(f"Failed to write {len(batch)} persistence entries: {e}")
+                self._requeue(batch)
+                if not retry:
+                    return
+                await asyncio.sleep(self.flush_interval)
+
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def forget_users(self, owns):
+        """
+        Drops unwritten changes and the loaded marks of the users owns(user_id)
+        selects, whose newer state another process has written meanwhile.
+        """
+        self._loaded_users = {user_id for user_id in self._loaded_users if not owns(user_id)}
+        for namespace, key in list(self._pending):
+            if namespace == USER_DATA:
+                user_id = int(key)
+            elif namespace.startswith(_conversation_namespace('')):
+                user_id = json.loads(key)[-1]
+            else:
+                continue
+            if owns(user_id):
+                del self._pending[(namespace, key)]
+
+    async def _load(self, namespace, key):
+        data = await asyncio.to_thread(db.load_persisted_state, namespace, str(key))
+        return pickle.loads(data) if data is not None else None
+
+    # --- Loading ---
+
+    async def get_user_data(self):
+        return {}
+
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name):
+        rows = await asyncio.to_thread(db.load_persisted_namespace, _conversation_namespace(name))
+        return {tuple(json.loads(key)): pickle.loads(data) for key, data in rows.items()}
+
+    async def refresh_user_data(self, user_id, user_data):
+        if user_id in self._loaded_users:
+            return
+        self._loaded_users.add(user_id)
+        if (USER_DATA, str(user_id)) in self._pending:
+            # Dropped (evicted) and not written yet; the row is stale.
+            return
+        stored = await self._load(USER_DATA, user_id)
+        if stored:
+            for key, value in stored.items():
+                user_data.setdefault(key, value)
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        if chat_id in self._loaded_chats:
+            return
+        self._loaded_chats.add(chat_id)
+        if (CHAT_DATA, str(chat_id)) in self._pending:
+            return
+        stored = await self._load(CHAT_DATA, chat_id)
+        if stored:
+            for key, value in stored.items():
+                chat_data.setdefault(key, value)
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    # --- Updating ---
+
+    async def update_user_data(self, user_id, data):
+        self._loaded_users.add(user_id)
+        self._buffer(USER_DATA, user_id, data if data else None)
+
+    async def update_chat_data(self, chat_id, data):
+        self._loaded_chats.add(chat_id)
+        self._buffer(CHAT_DATA, chat_id, data if data else None)
+
+    async def update_bot_data(self, data):
+        self._buffer(BOT_DATA, SINGLETON_KEY, data)
+
+    async def update_callback_data(self, data):
+        self._buffer(CALLBACK_DATA, SINGLETON_KEY, data)
+
+    async def update_conversation(self, name, key, new_state):
+        self._buffer(_conversation_namespace(name), json.dumps(list(key)), new_state)
+
+    async def drop_user_data(self, user_id):
+        # Forgetting dropped users keeps these sets bounded by the in-memory users.
+        self._loaded_users.discard(user_id)
+        self._buffer(USER_DATA, user_id, None)
+
+    async def drop_chat_data(self, chat_id):
+        self._loaded_chats.discard(chat_id)
+        self._buffer(CHAT_DATA, chat_id, None)
+
+    async def flush(self):
+        if self._flush_task and not self._flush_task.done():
+            # A batch being written when cancelled goes back to the buffer.
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        await self._write_pending(retry=False)
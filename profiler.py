@@ -0,0 +1,159 @@
+# profiler.py
+
+"""
+Sampling profiler for handler callbacks, off unless started.
+
+A background thread takes a stack sample of the event loop thread every
+`interval` seconds. Handler calls chosen for profiling (a share of them, or all
+during a window) register their frame through metrics' handler wrapper, so
+each sample is attributed to the handler it was taken in and the report lists
+the hottest functions per handler. Only time spent on the event loop thread is
+seen: waiting on the Bot API or on asyncio.to_thread work is not sampled.
+
+When profiling is off the wrapper pays one attribute check per call.
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+NO_HANDLER = '(outside handlers)'
+IDLE_FUNCTIONS = frozenset({'select', 'poll', 'epoll', '_run_once'})
+
+
+def _label(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{code.co_firstlineno} {getattr(code, 'co_qualname', code.co_name)}"
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.005, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.active = False
+        self.sample_rate = 0.0
+        self.started_at = None
+        self.until = None
+        self.stopped_at = None
+        self._target_thread = None
+        self._thread = None
+        self._tracked = {}
+        self._calls = Counter()
+        self._stacks = defaultdict(Counter)
+        self._samples = 0
+        self._lock = threading.Lock()
+
+    # --- Control ---
+
+    def start(self, sample_rate: float = 1.0, seconds: float | None = None):
+        """Starts sampling the calling thread (the event loop); seconds=None runs until stop()."""
+        self.reset()
+        self.sample_rate = sample_rate
+        self.started_at = time.monotonic()
+        self.until = self.started_at + seconds if seconds else None
+        self.stopped_at = None
+        self._target_thread = threading.get_ident()
+        self.active = True
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self.active:
+            self.active = False
+            self.stopped_at = time.monotonic()
+
+    def reset(self):
+        with self._lock:
+            self._calls = Counter()
+            self._stacks = defaultdict(Counter)
+            self._samples = 0
+        self.started_at = time.monotonic() if self.active else None
+
+    # --- Hooks used by the handler wrapper ---
+
+    def should_sample(self) -> bool:
+        return self.active and (self.sample_rate >= 1 or random.random() < self.sample_rate)
+
+    def track(self, frame, handler: str):
+        self._tracked[id(frame)] = handler
+        self._calls[handler] += 1
+
+    def untrack(self, frame):
+        self._tracked.pop(id(frame), None)
+
+    # --- Sampling ---
+
+    def _run(self):
+        while self.active:
+            if self.until and time.monotonic() >= self.until:
+                self.stop()
+                break
+            frame = sys._current_frames().get(self._target_thread)
+            if frame is not None:
+                self._sample(frame)
+            del frame
+            time.sleep(self.interval)
+
+    def _sample(self, frame):
+        if frame.f_code.co_name in IDLE_FUNCTIONS:
+            return
+        stack, handler = [], None
+        while frame is not None:
+            handler = self._tracked.get(id(frame))
+            if handler is not None:
+                break
+            if len(stack) < self.max_depth:
+                stack.append(_label(frame.f_code))
+            frame = frame.f_back
+        if handler is None:
+            # Unattributed samples are only meaningful when every update is profiled.
+            if self.sample_rate < 1:
+                return
+            handler = NO_HANDLER
+        with self._lock:
+            self._stacks[handler][tuple(reversed(stack))] += 1
+            self._samples += 1
+
+    # --- Reporting ---
+
+    def report(self, top: int = 15) -> str:
+        """Plain-text report: per handler the functions with most self and inclusive samples, then collapsed stacks."""
+        with self._lock:
+            stacks = {handler: Counter(counter) for handler, counter in self._stacks.items()}
+            samples = self._samples
+        ended = time.monotonic() if self.active else self.stopped_at
+        elapsed = ended - self.started_at if self.started_at and ended else 0.0
+        ms = self.interval * 1000
+        lines = [
+            f"Sampling profile: {elapsed:.1f} s, {self.sample_rate * 100:g}% of handler calls, "
+            f"{ms:g} ms interval, {samples} samples (~{samples * ms / 1000:.2f} s on the event loop)",
+            '',
+        ]
+        by_weight = sorted(stacks.items(), key=lambda item: -sum(item[1].values()))
+        for handler, counter in by_weight:
+            total = sum(counter.values())
+            own, inclusive = Counter(), Counter()
+            for stack, n in counter.items():
+                if stack:
+                    own[stack[-1]] += n
+                for function in set(stack):
+                    inclusive[function] += n
+            lines.append(f"== {handler}: {self._calls.get(handler, 0)} calls profiled, "
+                         f"{total} samples (~{total * ms:.0f} ms) ==")
+            lines.append('  self')
+            lines.extend(f"  {n:>7} {n * 100 / total:5.1f}%  {function}" for function, n in own.most_common(top))
+            lines.append('  inclusive')
+            lines.extend(f"  {n:>7} {n * 100 / total:5.1f}%  {function}"
+                         for function, n in inclusive.most_common(top))
+            lines.append('')
+        lines.append('== collapsed stacks (flamegraph.pl / speedscope) ==')
+        for handler, counter in by_weight:
+            for stack, n in counter.most_common():
+                lines.append(';'.join((handler,) + stack) + f" {n}")
+        return '\n'.join(lines) + '\n'
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,119 @@
+# query_tracker.py
+
+"""
+Counts and times SQL statements per unit of work (an update, a test block).
+
+install() hooks the engine once. track_queries() opens a tracker that collects
+every statement run in the current context, including code running in
+asyncio.to_thread. Slow statements are logged as they happen, and an update
+that runs too many queries, or repeats one statement shape (a likely N+1), is
+reported when its tracker closes.
+"""
+
+import contextvars
+import logging
+import time
+import weakref
+from collections import Counter
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+import config
+
+logger = logging.getLogger(__name__)
+
+_active = contextvars.ContextVar('active_query_trackers', default=())
+_installed = weakref.WeakSet()
+
+
+class QueryTracker:
+    def __init__(self, label: str = ''):
+        self.label = label
+        self.handler = None
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = Counter()
+
+    @property
+    def context(self) -> str:
+        return self.handler or self.label or 'unknown'
+
+    def record(self, statement: str, elapsed: float):
+        self.count += 1
+        self.seconds += elapsed
+        self.statements[statement] += 1
+
+    def repeated(self, threshold: int):
+        """Statement shapes executed at least threshold times, most frequent first."""
+        return [(statement, n) for statement, n in self.statements.most_common() if n >= threshold]
+
+    def summary(self, limit: int = 5) -> str:
+        lines = [f"{self.count} queries in {self.seconds * 1000:.1f} ms ({self.context})"]
+        for statement, n in self.statements.most_common(limit):
+            lines.append(f"  {n}x {_shorten(statement)}")
+        return '\n'.join(lines)
+
+
+def _shorten(statement: str, length: int = 300) -> str:
+    statement = ' '.join(statement.split())
+    return statement if len(statement) <= length else statement[:length] + '...'
+
+
+def current() -> QueryTracker | None:
+    trackers = _active.get()
+    return trackers[-1] if trackers else None
+
+
+def set_handler(name: str):
+    """Names the handler running in this context so slow statements and reports can point at it."""
+    for tracker in _active.get():
+        tracker.handler = name
+
+
+@contextmanager
+def track_queries(label: str = ''):
+    tracker = QueryTracker(label)
+    token = _active.set(_active.get() + (tracker,))
+    try:
+        yield tracker
+    finally:
+        _active.reset(token)
+
+
+def report(tracker: QueryTracker):
+    """Warns about an update that ran more queries than allowed or repeated one statement shape."""
+    if tracker.count > config.QUERY_BUDGET_PER_UPDATE:
+        logger.warning(f"Query budget of {config.QUERY_BUDGET_PER_UPDATE} exceeded: {tracker.summary()}")
+    for statement, n in tracker.repeated(config.N_PLUS_ONE_THRESHOLD):
+        logger.warning(f"Possible N+1 in {tracker.context}: {n}x {_shorten(statement)}")
+
+
+@contextmanager
+def assert_max_queries(limit: int, label: str = ''):
+    """Fails with AssertionError when the block runs more than limit SQL statements."""
+    with track_queries(label) as tracker:
+        yield tracker
+    if tracker.count > limit:
+        raise AssertionError(f"Expected at most {limit} queries, got {tracker.summary(limit=10)}")
+
+
+def install(engine):
+    # Both metrics.install_db_hooks and the tests call this; a second hook would count every statement twice.
+    if engine in _installed:
+        return
+    _installed.add(engine)
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info['query_tracker_started'] = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info.pop('query_tracker_started', time.perf_counter())
+        trackers = _active.get()
+        for tracker in trackers:
+            tracker.record(statement, elapsed)
+        if elapsed * 1000 >= config.SLOW_QUERY_MS:
+            where = trackers[-1].context if trackers else 'no update'
+            logger.warning(f"Slow query ({elapsed * 1000:.1f} ms) in {where}: {_shorten(statement)}")
@@ -0,0 +1,194 @@
+# rate_limiter.py
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from enum import IntEnum
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from backends import InProcessBackend
+from metrics import observe_api_call
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Lower values are sent first when the global budget is exhausted."""
+    INTERACTIVE = 0   # direct replies to the user who is waiting
+    NOTIFY = 1        # admin fan-out and user notifications
+    CHANNEL = 2       # posts and edits in the public channel
+    BULK = 3          # broadcasts and backups
+
+
+# Endpoints that do not count against Telegram's message limits.
+UNLIMITED_ENDPOINTS = frozenset({
+    'getMe', 'getUpdates', 'setWebhook', 'deleteWebhook', 'getWebhookInfo',
+    'getChat', 'getChatMember', 'getFile', 'answerCallbackQuery', 'answerInlineQuery',
+})
+
+
+def _is_group_chat(chat_id) -> bool:
+    if isinstance(chat_id, str):
+        return chat_id.startswith('@') or chat_id.startswith('-')
+    return chat_id < 0
+
+
+class OutgoingRequestScheduler(BaseRateLimiter):
+    """
+    Single gate for every Bot API request made by the application.
+
+    Requests take a token from a global bucket, served in priority order, and
+    from a bucket of the target chat (private chats and groups/channels have
+    different limits). INTERACTIVE replies in a private chat skip the chat
+    bucket: they answer the user's own update, and a wizard step sends several
+    of them at once. The buckets live in the state backend, so with a shared
+    backend every worker process draws on the same limits. RetryAfter responses
+    pause the affected bucket and the request is retried up to max_retries times. Pass a Priority as
+    ``rate_limit_args`` to a bot method to set its class; the default is
+    Priority.INTERACTIVE.
+    """
+
+    def __init__(self, backend=None, global_rate: float = 30, private_chat_rate: float = 1,
+                 group_chat_rate: float = 20 / 60, chat_burst: float = 3, max_retries: int = 3,
+                 key_prefix: str = 'ratelimit'):
+        self.backend = backend or InProcessBackend()
+        self.global_rate = global_rate
+        self.private_chat_rate = private_chat_rate
+        self.group_chat_rate = group_chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.key_prefix = key_prefix
+        self.global_key = f"{key_prefix}:global"
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._pump_task = None
+        self.sent = 0
+        self.retries = 0
+        self.retry_after_seconds = 0.0
+        self.chat_waiters = 0
+        self.backend_errors = 0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        if self._pump_task:
+            self._pump_task.cancel()
+
+    # --- Buckets ---
+
+    def _chat_key(self, chat_id) -> str:
+        return f"{self.key_prefix}:chat:{chat_id}"
+
+    async def _take(self, key, rate, capacity) -> float:
+        try:
+            return await self.backend.take_token(key, rate, capacity)
+        except Exception as e:
+            # Sending unthrottled beats not sending; Telegram's RetryAfter still applies.
+            self.backend_errors += 1
+            logger.warning(f"Rate limit bucket {key} unavailable: {e}")
+            return 0.0
+
+    async def _block(self, key, seconds):
+        try:
+            await self.backend.block_bucket(key, seconds)
+        except Exception as e:
+            self.backend_errors += 1
+            logger.warning(f"Could not pause rate limit bucket {key}: {e}")
+            await asyncio.sleep(seconds)
+
+    async def _acquire_chat(self, chat_id):
+        rate = self.group_chat_rate if _is_group_chat(chat_id) else self.private_chat_rate
+        key = self._chat_key(chat_id)
+        wait = await self._take(key, rate, self.chat_burst)
+        if not wait:
+            return
+        self.chat_waiters += 1
+        try:
+            while wait:
+                await asyncio.sleep(wait)
+                wait = await self._take(key, rate, self.chat_burst)
+        finally:
+            self.chat_waiters -= 1
+
+    async def _acquire_global(self, priority):
+        if not self._waiters and not await self._take(self.global_key, self.global_rate, self.global_rate):
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._sequence), waiter))
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.get_running_loop().create_task(self._pump())
+        await waiter
+
+    async def _pump(self):
+        """Hands out global tokens to waiting requests, highest priority first."""
+        while self._waiters:
+            if self._waiters[0][2].done():
+                # Its request was cancelled; no token is taken for it.
+                heapq.heappop(self._waiters)
+                continue
+            wait = await self._take(self.global_key, self.global_rate, self.global_rate)
+            if wait:
+                await asyncio.sleep(wait)
+                continue
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                waiter.set_result(None)
+
+    # --- Request processing ---
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        priority = Priority.INTERACTIVE if rate_limit_args is None else rate_limit_args
+        limited = endpoint not in UNLIMITED_ENDPOINTS
+        chat_id = data.get('chat_id') if limited else None
+        throttled = chat_id is not None and (priority != Priority.INTERACTIVE or _is_group_chat(chat_id))
+
+        for attempt in range(self.max_retries + 1):
+            if throttled:
+                await self._acquire_chat(chat_id)
+            if limited:
+                await self._acquire_global(priority)
+            started = time.perf_counter()
+            try:
+                result = await callback(*args, **kwargs)
+                observe_api_call(endpoint, time.perf_counter() - started)
+                self.sent += 1
+                return result
+            except RetryAfter as e:
+                observe_api_call(endpoint, time.perf_counter() - started, e)
+                delay = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else float(e.retry_after)
+                self.retries += 1
+                self.retry_after_seconds += delay
+                if attempt >= self.max_retries:
+                    raise
+                logger.warning(f"Flood limit on {endpoint} (chat {chat_id}), retrying in {delay}s")
+                if chat_id is not None:
+                    # Paused for the other requests to this chat too; an unthrottled reply waits it out itself.
+                    await self._block(self._chat_key(chat_id), delay)
+                    if not throttled:
+                        await asyncio.sleep(delay)
+                elif limited:
+                    await self._block(self.global_key, delay)
+                else:
+                    await asyncio.sleep(delay)
+            except Exception as e:
+                observe_api_call(endpoint, time.perf_counter() - started, e)
+                raise
+
+    def stats(self) -> dict:
+        queued = {p.name.lower(): 0 for p in Priority}
+        for priority, _, waiter in self._waiters:
+            if not waiter.done():
+                queued[Priority(priority).name.lower()] += 1
+        return {
+            'queued': queued,
+            'chat_waiters': self.chat_waiters,
+            'backend_errors': self.backend_errors,
+            'sent': self.sent,
+            'retries': self.retries,
+            'retry_after_seconds': round(self.retry_after_seconds, 2),
+        }
@@ -0,0 +1,118 @@
+# singleflight.py
+
+"""
+Coalesces identical concurrent calls: while a call for a key is running,
+later callers with the same key wait for its result instead of starting their own.
+
+SingleFlight is for handlers on the event loop. The database helpers are
+synchronous, so it runs the shared call in a worker thread; the loop keeps
+serving updates and the callers arriving meanwhile join the running call.
+BlockingSingleFlight is for callers already in worker threads, such as
+TieredCache's miss path. Callers that arrive after invalidate() start a new
+flight rather than joining one that may have read the old data. Nothing is
+kept once a call finishes (caching is cache.py's job), and coalescing is per
+process.
+"""
+
+import asyncio
+import threading
+
+import metrics
+
+
+class SingleFlight:
+    def __init__(self):
+        self._running = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+
+    async def run(self, name: str, key, fn, *args, **kwargs):
+        """Returns fn(*args, **kwargs), sharing a call already running under the same name and key."""
+        with self._lock:
+            flight = (name, self._generations.get(name, 0), key)
+        task = self._running.get(flight)
+        if task is None:
+            # The task copies the caller's context, so routing and tracing see the first caller.
+            task = asyncio.get_running_loop().create_task(asyncio.to_thread(fn, *args, **kwargs))
+            self._running[flight] = task
+            task.add_done_callback(lambda done: self._finished(flight, done))
+            self.executed += 1
+            metrics.singleflight_calls.inc(name=name, result='executed')
+        else:
+            self.coalesced += 1
+            metrics.singleflight_calls.inc(name=name, result='coalesced')
+        # One caller's update being cancelled must not cancel the call the others wait for.
+        return await asyncio.shield(task)
+
+    def invalidate(self, name: str):
+        """Makes later callers of name start a new call. Safe to call from any thread."""
+        with self._lock:
+            self._generations[name] = self._generations.get(name, 0) + 1
+
+    def _finished(self, flight, task):
+        if self._running.get(flight) is task:
+            del self._running[flight]
+        if not task.cancelled():
+            # Marks the exception retrieved when every waiter was cancelled; waiters still get it raised.
+            task.exception()
+
+    def stats(self) -> dict:
+        total = self.executed + self.coalesced
+        return {
+            'running': len(self._running),
+            'executed': self.executed,
+            'coalesced': self.coalesced,
+            'coalesced_rate': round(self.coalesced / total, 4) if total else 0.0,
+        }
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class BlockingSingleFlight:
+    """SingleFlight for synchronous callers: the first caller runs fn, the others block until it returns."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._running = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+
+    def run(self, key, fn):
+        with self._lock:
+            call = self._running.get(key)
+            leader = call is None
+            if leader:
+                call = self._running[key] = _Call()
+                self.executed += 1
+            else:
+                self.coalesced += 1
+        metrics.singleflight_calls.inc(name=self.name, result='executed' if leader else 'coalesced')
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+        try:
+            call.value = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._running[key]
+            call.done.set()
+        return call.value
+
+    def stats(self) -> dict:
+        return {'running': len(self._running), 'executed': self.executed, 'coalesced': self.coalesced}
+
+
+flights = SingleFlight()
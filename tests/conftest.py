@@ -0,0 +1,51 @@
+# tests/conftest.py
+
+"""
+Runs the tests against a throwaway SQLite database filled with the benchmark
+dataset. The settings config.py insists on are set here, before anything
+imports it.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+
+import dataset  # noqa: E402
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ['CACHE_SHARED_URL'] = 'memory://'
+dataset.bench_env(f"sqlite:///{os.path.join(_tmp.name, 'tests.db')}")
+
+
+@pytest.fixture(scope='session')
+def seeded():
+    """The seeded database module, with SQL statements counted by query_tracker."""
+    import database as db
+    import query_tracker
+    from models import engine
+
+    query_tracker.install(engine)
+    dataset.seed(300, professors=40, random_seed=7)
+    return db
+
+
+@pytest.fixture
+def make_update():
+    """Builds a private-chat text message Update from a user."""
+    import datetime
+
+    from telegram import Chat, Message, Update, User
+
+    def build(update_id: int, user_id: int, text: str = '/start') -> Update:
+        user = User(id=user_id, first_name='test', is_bot=False)
+        chat = Chat(id=user_id, type=Chat.PRIVATE)
+        message = Message(message_id=update_id, date=datetime.datetime.now(datetime.timezone.utc), chat=chat,
+                          from_user=user, text=text)
+        return Update(update_id=update_id, message=message)
+
+    return build
@@ -0,0 +1,61 @@
+# tests/test_backends.py
+
+import asyncio
+
+import pytest
+
+from backends import InProcessBackend, RedisBackend
+from rate_limiter import OutgoingRequestScheduler
+
+
+def _redis_backend():
+    fakeredis = pytest.importorskip('fakeredis.aioredis')
+    backend = RedisBackend.__new__(RedisBackend)
+    backend._redis = fakeredis.FakeRedis(decode_responses=True)
+    return backend
+
+
+@pytest.fixture(params=['memory', 'redis'])
+def backend(request):
+    return InProcessBackend() if request.param == 'memory' else _redis_backend()
+
+
+def test_token_bucket_allows_a_burst_then_asks_to_wait(backend):
+    async def scenario():
+        return [await backend.take_token('bucket', 10, 3) for _ in range(4)]
+
+    waits = asyncio.run(scenario())
+    assert waits[:3] == [0.0, 0.0, 0.0]
+    assert 0 < waits[3] <= 0.1
+
+
+def test_blocked_bucket_hands_out_nothing(backend):
+    async def scenario():
+        await backend.block_bucket('bucket', 5)
+        return await backend.take_token('bucket', 10, 3)
+
+    assert 4.9 < asyncio.run(scenario()) <= 5
+
+
+def test_leases_have_one_owner(backend):
+    async def scenario():
+        return (await backend.acquire_lease('lease', 'a', 5), await backend.acquire_lease('lease', 'b', 5),
+                await backend.acquire_lease('lease', 'a', 5))
+
+    assert asyncio.run(scenario()) == (True, False, True)
+
+
+def test_schedulers_on_one_backend_share_the_global_budget(backend):
+    async def scenario():
+        workers = [OutgoingRequestScheduler(backend, global_rate=10) for _ in range(2)]
+
+        async def send():
+            pass
+
+        started = asyncio.get_running_loop().time()
+        await asyncio.gather(*(workers[i % 2].process_request(send, (), {}, 'sendMessage', {'chat_id': -1000 - i},
+                                                              None) for i in range(14)))
+        return asyncio.get_running_loop().time() - started
+
+    # 10 tokens at once, the other 4 at 10 per second between both workers.
+    assert asyncio.run(scenario()) >= 0.3
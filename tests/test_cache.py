@@ -0,0 +1,135 @@
+# tests/test_cache.py
+
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+import cache
+from singleflight import SingleFlight
+
+
+def _tiered(name, shared=None):
+    return cache.TieredCache(name, 16, 60, shared if shared is not None else cache.InProcessSharedStore())
+
+
+def test_shared_tier_round_trips_through_json_with_decode():
+    shared = cache.InProcessSharedStore()
+    # Two instances of one cache, as in two bot processes.
+    writer, reader = _tiered('json', shared), _tiered('json', shared)
+    writer.get_or_load('page', lambda: ([{'id': 1, 'name': 'x'}], 3), decode=tuple)
+    value = reader.get_or_load('page', lambda: pytest.fail("loaded instead of reading the shared tier"), decode=tuple)
+    assert value == ([{'id': 1, 'name': 'x'}], 3) and reader.shared_hits == 1
+
+
+def test_invalidate_moves_the_shared_namespace_to_a_new_version():
+    shared = cache.InProcessSharedStore()
+    tiered = _tiered('versioned', shared)
+    tiered.get_or_load('k', lambda: 1)
+    tiered.invalidate()
+    assert tiered.get_or_load('k', lambda: 2) == 2
+    # Another instance that hears about the invalidation reads the new version too.
+    other = _tiered('versioned', shared)
+    other.drop_local()
+    assert other.get_or_load('k', lambda: 3) == 2
+
+
+def test_experience_cache_clears_reach_the_other_processes(seeded):
+    pytest.importorskip('fastapi')
+    import main
+
+    async def scenario():
+        main._main_loop = asyncio.get_running_loop()
+        published = main.state_backend.subscribe(main.CACHE_INVALIDATION_CHANNEL)
+        received = asyncio.ensure_future(published.__anext__())
+        await asyncio.sleep(0)
+        main.clear_experience_caches(broadcast=True)
+        message = await asyncio.wait_for(received, 1)
+        await published.aclose()
+
+        # Another process filled its caches before hearing about the change.
+        seeded.experience_cache.set(1, 'stale')
+        main.rendered_experience_cache.set((1, None, 0, False), 'stale')
+        listener = asyncio.ensure_future(main.listen_for_cache_invalidations())
+        await asyncio.sleep(0)
+        await main.state_backend.publish(main.CACHE_INVALIDATION_CHANNEL, message)
+        await asyncio.sleep(0.05)
+        listener.cancel()
+        return message
+
+    assert json.loads(asyncio.run(scenario())) == [main.EXPERIENCE_CACHES, None]
+    assert seeded.experience_cache.get(1) is None
+    assert main.rendered_experience_cache.get((1, None, 0, False)) is None
+
+
+def test_concurrent_misses_share_one_load():
+    tiered = _tiered('coalesced')
+    loads = []
+
+    def load():
+        loads.append(1)
+        time.sleep(0.05)
+        return 'value'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(tiered.get_or_load('k', load))) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ['value'] * 10 and len(loads) == 1
+    assert tiered.stats()['coalesced'] == 9
+
+
+def test_callers_after_an_invalidation_do_not_join_the_older_load():
+    tiered = _tiered('generations')
+    started, release = threading.Event(), threading.Event()
+
+    def slow_load():
+        started.set()
+        release.wait(1)
+        return 'old'
+
+    results = {}
+    first = threading.Thread(target=lambda: results.setdefault('first', tiered.get_or_load('k', slow_load)))
+    first.start()
+    started.wait(1)
+    tiered.invalidate()
+    results['second'] = tiered.get_or_load('k', lambda: 'new')
+    release.set()
+    first.join()
+    assert results == {'first': 'old', 'second': 'new'}
+    assert tiered.get_or_load('k', lambda: 'reloaded') == 'new'
+
+
+def test_local_only_raises_instead_of_loading():
+    tiered = _tiered('local_only')
+    with cache.local_only():
+        with pytest.raises(cache.LocalMiss):
+            tiered.get_or_load('k', lambda: pytest.fail("loaded inside local_only()"))
+    tiered.get_or_load('k', lambda: 1)
+    with cache.local_only():
+        assert tiered.get_or_load('k', lambda: 2) == 1
+
+
+def test_singleflight_invalidate_starts_a_new_call():
+    async def scenario():
+        flights = SingleFlight()
+        calls = []
+
+        def read(value):
+            calls.append(value)
+            time.sleep(0.05)
+            return value
+
+        first = asyncio.ensure_future(flights.run('search', 'q', read, 'old'))
+        await asyncio.sleep(0.01)
+        joined = asyncio.ensure_future(flights.run('search', 'q', read, 'ignored'))
+        await asyncio.sleep(0)
+        flights.invalidate('search')
+        fresh = await flights.run('search', 'q', read, 'new')
+        return await first, await joined, fresh, calls
+
+    assert asyncio.run(scenario()) == ('old', 'old', 'new', ['old', 'new'])
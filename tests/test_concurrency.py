@@ -0,0 +1,112 @@
+# tests/test_concurrency.py
+
+import asyncio
+import json
+
+from concurrency import KeyedLocks, PerUserUpdateProcessor
+
+
+def test_keyed_locks_serialize_one_key_in_arrival_order():
+    async def scenario():
+        locks = KeyedLocks()
+        events = []
+
+        async def work(key, n, delay):
+            async with locks.hold(key):
+                events.append(('start', key, n))
+                await asyncio.sleep(delay)
+                events.append(('end', key, n))
+
+        await asyncio.gather(work('a', 1, 0.03), work('a', 2, 0), work('a', 3, 0), work('b', 1, 0))
+        return locks, events
+
+    locks, events = asyncio.run(scenario())
+    a_events = [e for e in events if e[1] == 'a']
+    assert a_events == [('start', 'a', 1), ('end', 'a', 1), ('start', 'a', 2), ('end', 'a', 2),
+                        ('start', 'a', 3), ('end', 'a', 3)]
+    # Another key does not wait behind the slow holder of 'a'.
+    assert events.index(('end', 'b', 1)) < events.index(('end', 'a', 1))
+    assert locks.stats()['active_keys'] == 0
+    assert locks.stats()['contended'] == 2
+
+
+def test_per_user_processor_keeps_each_users_updates_in_order(make_update):
+    async def scenario():
+        processor = PerUserUpdateProcessor(max_concurrent_updates=16)
+        seen = []
+
+        async def handle(update, delay):
+            seen.append(('start', update.update_id))
+            await asyncio.sleep(delay)
+            seen.append(('end', update.update_id))
+
+        updates = [(make_update(1, 100), 0.03), (make_update(2, 100), 0), (make_update(3, 200), 0),
+                   (make_update(4, 100), 0)]
+        await asyncio.gather(*(processor.process_update(u, handle(u, d)) for u, d in updates))
+        return seen
+
+    seen = asyncio.run(scenario())
+    user_100 = [update_id for kind, update_id in seen if kind == 'start' and update_id != 3]
+    assert user_100 == [1, 2, 4]
+    assert seen.index(('start', 2)) > seen.index(('end', 1))
+    # The other user's update ran while user 100's first update was still running.
+    assert seen.index(('end', 3)) < seen.index(('end', 1))
+
+
+def test_one_user_flooding_the_processor_leaves_slots_for_others(make_update):
+    async def scenario():
+        processor = PerUserUpdateProcessor(max_concurrent_updates=2)
+        release = asyncio.Event()
+        other_done = asyncio.Event()
+
+        async def flood_handler():
+            await release.wait()
+
+        async def other_handler():
+            other_done.set()
+
+        flood = [asyncio.ensure_future(processor.process_update(make_update(i, 100), flood_handler()))
+                 for i in range(1, 11)]
+        await asyncio.sleep(0)
+        other = asyncio.ensure_future(processor.process_update(make_update(11, 200), other_handler()))
+        await asyncio.wait_for(other_done.wait(), 1)
+        release.set()
+        await asyncio.gather(other, *flood)
+        return processor.max_concurrent_updates
+
+    assert asyncio.run(scenario()) == 2
+
+
+def test_one_user_flooding_a_shard_does_not_stall_other_users(make_update):
+    from backends import InProcessBackend
+    from dispatcher import UpdateDispatcher
+
+    async def scenario():
+        processor = PerUserUpdateProcessor(max_concurrent_updates=4)
+        release = asyncio.Event()
+        other_done = asyncio.Event()
+
+        async def handle(data):
+            if data['message']['from']['id'] == 100:
+                await release.wait()
+            else:
+                other_done.set()
+
+        async def process(data):
+            update = make_update(data['update_id'], data['message']['from']['id'])
+            await processor.process_update(update, handle(data))
+
+        dispatcher = UpdateDispatcher(InProcessBackend(), process, shard_count=1, max_in_flight=4)
+        for update_id in range(1, 21):
+            await dispatcher.submit(json.loads(make_update(update_id, 100).to_json()))
+        await dispatcher.submit(json.loads(make_update(21, 200).to_json()))
+        await dispatcher.start()
+        await asyncio.wait_for(other_done.wait(), 2)
+        stats = dispatcher.stats()
+        release.set()
+        await dispatcher.stop()
+        return stats
+
+    stats = asyncio.run(scenario())
+    # User 100's backlog waits in its own queue, holding one processing slot.
+    assert stats['in_flight'] == 1 and stats['buffered'] == 19
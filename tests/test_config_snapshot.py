@@ -0,0 +1,33 @@
+# tests/test_config_snapshot.py
+
+import threading
+
+
+def test_admin_write_swaps_in_a_fresh_snapshot(seeded):
+    before = seeded.config_snapshot()
+    seeded.set_setting('force_subscribe', 'false' if before.settings.get('force_subscribe') == 'true' else 'true')
+    after = seeded.config_snapshot()
+    assert after is not before
+    assert after.version == before.version + 1
+    assert after.settings['force_subscribe'] != before.settings.get('force_subscribe')
+
+
+def test_readers_keep_the_previous_snapshot_while_it_reloads(seeded, monkeypatch):
+    previous = seeded.config_snapshot()
+    load = seeded._load_config_snapshot
+    loading, release = threading.Event(), threading.Event()
+
+    def slow_load():
+        loading.set()
+        release.wait(2)
+        return load()
+
+    monkeypatch.setattr(seeded, '_load_config_snapshot', slow_load)
+    reload = threading.Thread(target=seeded.invalidate_config, kwargs={'bump_version': False})
+    reload.start()
+    assert loading.wait(2)
+    # Read on the event loop while the reload runs in its thread: no waiting, no query.
+    assert seeded.config_snapshot() is previous
+    release.set()
+    reload.join()
+    assert seeded.config_snapshot() is not previous
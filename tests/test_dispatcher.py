@@ -0,0 +1,125 @@
+# tests/test_dispatcher.py
+
+import asyncio
+import json
+
+from backends import InProcessBackend
+from dispatcher import UpdateDispatcher
+
+
+def test_dispatcher_runs_users_concurrently_and_each_user_in_order(make_update):
+    from concurrency import PerUserUpdateProcessor
+
+    async def scenario():
+        processor = PerUserUpdateProcessor(max_concurrent_updates=16)
+        done = []
+        finished = asyncio.Event()
+
+        async def handle(data):
+            await asyncio.sleep(0.05 if data['update_id'] == 1 else 0)
+            done.append(data['update_id'])
+            if len(done) == 6:
+                finished.set()
+
+        async def process(data):
+            update = make_update(data['update_id'], data['message']['from']['id'])
+            await processor.process_update(update, handle(data))
+
+        dispatcher = UpdateDispatcher(InProcessBackend(), process, shard_count=1)
+        for update_id, user_id in ((1, 100), (2, 100), (3, 200), (4, 300), (5, 100), (6, 200)):
+            await dispatcher.submit(json.loads(make_update(update_id, user_id).to_json()))
+        await dispatcher.start()
+        await asyncio.wait_for(finished.wait(), 5)
+        await dispatcher.stop()
+        return done
+
+    done = asyncio.run(scenario())
+    assert [u for u in done if u in (1, 2, 5)] == [1, 2, 5]
+    # One slow update on the only shard does not hold back the other users.
+    assert done.index(3) < done.index(1) and done.index(4) < done.index(1)
+
+
+def test_standby_takes_over_leases_and_reloads_the_shards():
+    async def scenario():
+        backend = InProcessBackend()
+        events = []
+
+        async def process(data):
+            pass
+
+        async def persist():
+            events.append('persisted')
+
+        async def reload(shard):
+            events.append(('reloaded', shard))
+
+        first = UpdateDispatcher(backend, process, shard_count=2, before_release=persist)
+        standby = UpdateDispatcher(backend, process, shard_count=2, on_shard_acquired=reload)
+        standby.owner += ':standby'
+        await first.start()
+        await standby.start()
+        leases = first.stats()['leased_shards'], standby.stats()['leased_shards']
+        await first.stop()
+        await standby._renew_leases()
+        taken_over = standby.stats()['leased_shards']
+        await standby.stop()
+        return leases, taken_over, events
+
+    (first_leases, standby_leases), taken_over, events = asyncio.run(scenario())
+    assert first_leases == [0, 1] and standby_leases == []
+    assert taken_over == [0, 1]
+    # The old holder writes its state before the standby reloads it.
+    assert events == ['persisted', ('reloaded', 0), ('reloaded', 1)]
+
+
+def test_shards_held_from_the_start_are_not_reloaded():
+    async def scenario():
+        reloaded = []
+
+        async def reload(shard):
+            reloaded.append(shard)
+
+        async def process(data):
+            pass
+
+        dispatcher = UpdateDispatcher(InProcessBackend(), process, shard_count=2, on_shard_acquired=reload)
+        await dispatcher.start()
+        await dispatcher.stop()
+        return reloaded
+
+    assert asyncio.run(scenario()) == []
+
+
+def test_reload_users_replaces_a_shards_conversations_and_user_data(seeded):
+    from telegram.ext import Application, CommandHandler, ConversationHandler
+    from telegram.ext._utils.trackingdict import TrackingDict
+
+    import memory
+    from persistence import DatabasePersistence
+
+    async def noop(update, context):
+        pass
+
+    persistence = DatabasePersistence()
+    app = Application.builder().token('123456:TEST').persistence(persistence).build()
+    handler = ConversationHandler([CommandHandler('start', noop)], {}, [], name='reload_test', persistent=True)
+    app.add_handler(handler)
+    # What Application.initialize sets up, without its getMe call.
+    handler._conversations = TrackingDict()
+    handler._conversations.update_no_track({(10, 10): 'old', (11, 11): 'mine', (12, 12): 'gone'})
+    handler._conversations[(10, 10)] = 'stale write'
+    app._user_data[10]['draft'] = 'stale'
+    app._user_data[11]['draft'] = 'mine'
+
+    async def scenario():
+        # What the other process wrote while it held shard 0 (even user ids).
+        await persistence.update_conversation('reload_test', (10, 10), 'new')
+        await persistence.update_conversation('reload_test', (14, 14), 'started elsewhere')
+        await persistence.update_conversation('reload_test', (12, 12), None)
+        await persistence.flush()
+        return await memory.reload_users(app, lambda user_id: user_id % 2 == 0)
+
+    assert asyncio.run(scenario()) == 2
+    assert dict(handler._conversations) == {(10, 10): 'new', (11, 11): 'mine', (14, 14): 'started elsewhere'}
+    assert handler._conversations.pop_accessed_keys() == set()
+    assert 10 not in app.user_data and app.user_data[11] == {'draft': 'mine'}
@@ -0,0 +1,91 @@
+# tests/test_persistence.py
+
+import asyncio
+
+import pytest
+
+
+@pytest.fixture
+def persistence(seeded):
+    from persistence import DatabasePersistence
+
+    return DatabasePersistence(flush_interval=0.05)
+
+
+def test_one_pass_of_changes_is_written_as_one_batch(seeded, persistence, monkeypatch):
+    batches = []
+    save = seeded.save_persisted_states
+    monkeypatch.setattr(seeded, 'save_persisted_states', lambda items: (batches.append(items), save(items)))
+
+    async def scenario():
+        await persistence.update_user_data(1, {'step': 1})
+        await persistence.update_user_data(1, {'step': 2})
+        await persistence.update_conversation('submit', (1, 1), 3)
+        await persistence.update_user_data(2, {'step': 9})
+        await persistence.flush()
+        fresh = type(persistence)(flush_interval=0.05)
+        user_data = {}
+        await fresh.refresh_user_data(1, user_data)
+        return user_data, await fresh.get_conversations('submit')
+
+    user_data, conversations = asyncio.run(scenario())
+    assert len(batches) == 1 and len(batches[0]) == 3
+    assert user_data == {'step': 2}
+    assert conversations == {(1, 1): 3}
+    assert persistence.pending_count() == 0
+
+
+def test_failed_write_is_kept_and_newer_values_win(seeded, monkeypatch):
+    from persistence import DatabasePersistence
+
+    persistence = DatabasePersistence(flush_interval=10)
+    save = seeded.save_persisted_states
+    calls = []
+
+    def flaky(items):
+        calls.append(items)
+        if len(calls) == 1:
+            raise RuntimeError("database is down")
+        save(items)
+
+    monkeypatch.setattr(seeded, 'save_persisted_states', flaky)
+
+    async def scenario():
+        await persistence.update_user_data(3, {'v': 'old'})
+        while persistence.pending_count() == 0 or not calls:
+            # The failed batch is back in the buffer; the writer waits to retry.
+            await asyncio.sleep(0.01)
+        await persistence.update_user_data(3, {'v': 'new'})
+        await persistence.flush()
+        user_data = {}
+        await type(persistence)().refresh_user_data(3, user_data)
+        return user_data
+
+    assert asyncio.run(scenario()) == {'v': 'new'}
+    assert len(calls) == 2
+    assert persistence.pending_count() == 0
+
+
+def test_flush_after_a_failure_leaves_entries_pending(seeded, persistence, monkeypatch):
+    def down(items):
+        raise RuntimeError("database is down")
+
+    monkeypatch.setattr(seeded, 'save_persisted_states', down)
+
+    async def scenario():
+        await persistence.update_user_data(4, {'v': 1})
+        await persistence.flush()
+        return persistence.pending_count()
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_dropped_user_data_deletes_the_row(seeded, persistence):
+    async def scenario():
+        await persistence.update_user_data(5, {'v': 1})
+        await persistence.flush()
+        await persistence.drop_user_data(5)
+        await persistence.flush()
+        return await asyncio.to_thread(seeded.load_persisted_state, 'user_data', '5')
+
+    assert asyncio.run(scenario()) is None
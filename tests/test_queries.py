@@ -0,0 +1,63 @@
+# tests/test_queries.py
+
+import pytest
+
+from query_tracker import assert_max_queries
+
+
+def test_assert_max_queries_fails_over_the_limit(seeded):
+    from models import Professor
+
+    seeded.catalog_cache.invalidate()
+    with pytest.raises(AssertionError, match="at most 1 queries"):
+        with assert_max_queries(1):
+            seeded.get_paginated_list(Professor, page=1, per_page=5)
+
+
+def test_paginated_catalog_list_counts_and_pages_in_two_queries(seeded):
+    from models import Professor
+
+    seeded.catalog_cache.invalidate()
+    with assert_max_queries(2):
+        items, total_pages = seeded.get_paginated_list(Professor, page=2, per_page=5)
+    assert len(items) == 5 and set(items[0]) == {'id', 'name'}
+    assert total_pages == 8
+    with assert_max_queries(0):
+        assert seeded.get_paginated_list(Professor, page=2, per_page=5) == (items, total_pages)
+
+
+def test_paginated_uncached_list_runs_its_queries(seeded):
+    from models import BotText
+
+    for _ in range(2):
+        with assert_max_queries(2) as tracker:
+            items, _ = seeded.get_paginated_list(BotText, per_page=5)
+        assert tracker.count == 2
+    assert all('key' in item for item in items)
+
+
+def test_experience_lists_are_one_summary_projection(seeded):
+    from models import ExperienceStatus, ExperienceSummary
+
+    with assert_max_queries(2) as tracker:
+        summaries, total_pages = seeded.get_experiences_by_status(ExperienceStatus.APPROVED, per_page=10)
+    assert len(summaries) == 10 and total_pages > 1
+    assert all(isinstance(s, ExperienceSummary) and s.status == ExperienceStatus.APPROVED for s in summaries)
+    # Only the list columns are selected, none of the free-text answers.
+    assert not any('teaching_style' in statement for statement in tracker.statements)
+
+    user_id = seeded.get_experience(summaries[0].id).user_id
+    with assert_max_queries(2):
+        mine, _ = seeded.get_user_experiences(user_id, per_page=1000)
+    assert summaries[0].id in {s.id for s in mine}
+
+
+def test_top_professors_are_cached_until_an_experience_changes(seeded):
+    seeded.ranking_cache.invalidate()
+    with assert_max_queries(1):
+        ranking = seeded.get_top_professors(5)
+    with assert_max_queries(0):
+        assert seeded.get_top_professors(5) == ranking
+    seeded.invalidate_experience(1)
+    with assert_max_queries(1):
+        assert seeded.get_top_professors(5) == ranking
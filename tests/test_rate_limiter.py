@@ -0,0 +1,105 @@
+# tests/test_rate_limiter.py
+
+import asyncio
+
+import pytest
+from telegram.error import RetryAfter
+
+from rate_limiter import OutgoingRequestScheduler, Priority
+
+
+def test_retry_after_is_retried_on_the_blocked_chat():
+    scheduler = OutgoingRequestScheduler(max_retries=2)
+    attempts = []
+
+    async def send():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RetryAfter(0)
+        return 'sent'
+
+    result = asyncio.run(scheduler.process_request(send, (), {}, 'sendMessage', {'chat_id': 42}, None))
+    assert result == 'sent' and len(attempts) == 2
+    assert scheduler.stats()['retries'] == 1 and scheduler.stats()['sent'] == 1
+
+
+def test_retry_after_is_raised_once_retries_are_used_up():
+    scheduler = OutgoingRequestScheduler(max_retries=1)
+
+    async def send():
+        raise RetryAfter(0)
+
+    with pytest.raises(RetryAfter):
+        asyncio.run(scheduler.process_request(send, (), {}, 'sendMessage', {'chat_id': 42}, None))
+    assert scheduler.stats()['retries'] == 2
+
+
+def test_exhausted_global_budget_serves_higher_priority_first():
+    async def scenario():
+        scheduler = OutgoingRequestScheduler(global_rate=20)
+        order = []
+
+        def request(name):
+            async def send():
+                order.append(name)
+            return send
+
+        # Drains the global bucket; the requests below have to queue for tokens.
+        await asyncio.gather(*(scheduler.process_request(request('warmup'), (), {}, 'sendMessage',
+                                                         {'chat_id': -1000 - i}, None) for i in range(20)))
+        await asyncio.gather(
+            scheduler.process_request(request('bulk'), (), {}, 'sendMessage', {'chat_id': 1}, Priority.BULK),
+            scheduler.process_request(request('channel'), (), {}, 'sendMessage', {'chat_id': 2}, Priority.CHANNEL),
+            scheduler.process_request(request('reply'), (), {}, 'sendMessage', {'chat_id': 3}, None),
+        )
+        return order[20:]
+
+    assert asyncio.run(scenario()) == ['reply', 'channel', 'bulk']
+
+
+def test_unlimited_endpoints_skip_the_buckets():
+    async def scenario():
+        scheduler = OutgoingRequestScheduler(global_rate=1, chat_burst=1)
+
+        async def answer():
+            return True
+
+        return await asyncio.wait_for(asyncio.gather(*(
+            scheduler.process_request(answer, (), {}, 'answerCallbackQuery', {'chat_id': 5}, None)
+            for _ in range(10))), 1)
+
+    assert all(asyncio.run(scenario()))
+
+
+def test_interactive_private_replies_skip_the_chat_bucket():
+    async def scenario():
+        scheduler = OutgoingRequestScheduler(private_chat_rate=1, chat_burst=1)
+
+        async def send():
+            return True
+
+        def to_chat(priority):
+            return scheduler.process_request(send, (), {}, 'sendMessage', {'chat_id': 7}, priority)
+
+        # A wizard step answering the user's own update is not held to one message per second.
+        await asyncio.wait_for(asyncio.gather(*(to_chat(None) for _ in range(5))), 0.5)
+        # Notifications and bulk sends to the same chat still are.
+        await to_chat(Priority.NOTIFY)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(to_chat(Priority.BULK), 0.3)
+
+    asyncio.run(scenario())
+
+
+def test_interactive_replies_in_groups_keep_the_chat_bucket():
+    async def scenario():
+        scheduler = OutgoingRequestScheduler(chat_burst=1)
+
+        async def send():
+            return True
+
+        await scheduler.process_request(send, (), {}, 'sendMessage', {'chat_id': -100}, None)
+        await asyncio.wait_for(scheduler.process_request(send, (), {}, 'sendMessage', {'chat_id': -100}, None), 0.3)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(scenario())
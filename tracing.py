@@ -0,0 +1,284 @@
+# tracing.py
+
+"""
+Minimal tracing of one update's path: webhook receive, queue wait, update
+processing, handlers, SQL statements and Bot API requests.
+
+The current span lives in a contextvar, so child spans follow the update into
+handlers and asyncio.to_thread work. The trace context crosses the update queue
+inside the queued update (TRACE_KEY), which also works across processes.
+Sampling is decided once per update at the webhook; unsampled updates create
+no spans. Finished spans are buffered and exported in batches to a JSONL file
+or to an OTLP/HTTP (JSON) collector.
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import httpx
+from sqlalchemy import event
+from telegram.request import HTTPXRequest
+
+logger = logging.getLogger(__name__)
+
+TRACE_KEY = '_trace'
+MAX_BUFFERED_SPANS = 20000
+
+_current = contextvars.ContextVar('current_span', default=None)
+
+
+class Span:
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'start_ns', 'end_ns', 'attributes', 'error')
+
+    def __init__(self, name: str, trace_id: str, parent_id: str | None, attributes: dict, start_ns: int | None = None):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+        self.error = None
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def to_dict(self) -> dict:
+        return {
+            'trace_id': self.trace_id, 'span_id': self.span_id, 'parent_id': self.parent_id, 'name': self.name,
+            'start_ns': self.start_ns, 'end_ns': self.end_ns,
+            'duration_ms': round((self.end_ns - self.start_ns) / 1e6, 3),
+            'attributes': self.attributes, 'error': self.error,
+        }
+
+
+def current_span() -> Span | None:
+    return _current.get()
+
+
+class Tracer:
+    def __init__(self):
+        self.sample_rate = 0.0
+        self.exporter = None
+        self.flush_interval = 2.0
+        self.dropped = 0
+        self._finished = []
+        self._lock = threading.Lock()
+        self._flush_task = None
+
+    def configure(self, sample_rate: float, exporter, flush_interval: float = 2.0):
+        self.sample_rate = sample_rate if exporter else 0.0
+        self.exporter = exporter
+        self.flush_interval = flush_interval
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    # --- Spans ---
+
+    def _finish(self, span: Span, error: BaseException | None = None):
+        span.end_ns = time.time_ns()
+        if error is not None:
+            span.error = f"{type(error).__name__}: {error}"[:300]
+        with self._lock:
+            if len(self._finished) >= MAX_BUFFERED_SPANS:
+                self.dropped += 1
+                return
+            self._finished.append(span)
+
+    @contextmanager
+    def _activate(self, span: Span):
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            self._finish(span, e)
+            raise
+        else:
+            self._finish(span)
+        finally:
+            _current.reset(token)
+
+    @contextmanager
+    def root_span(self, name: str, **attributes):
+        """Starts a trace for a sample_rate share of calls; yields None for the others."""
+        if not self.sample_rate or random.random() >= self.sample_rate:
+            yield None
+            return
+        with self._activate(Span(name, os.urandom(16).hex(), None, attributes)) as span:
+            yield span
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """A child of the current span; yields None outside a sampled trace."""
+        parent = _current.get()
+        if parent is None:
+            yield None
+            return
+        with self._activate(Span(name, parent.trace_id, parent.span_id, attributes)) as span:
+            yield span
+
+    def inject(self, span: Span) -> dict:
+        return {'trace_id': span.trace_id, 'span_id': span.span_id, 'queued_ns': time.time_ns()}
+
+    @contextmanager
+    def continue_trace(self, carrier: dict | None, name: str, **attributes):
+        """Resumes a trace from an injected carrier, recording the time it spent queued."""
+        if not carrier:
+            yield None
+            return
+        queue_wait = Span('queue_wait', carrier['trace_id'], carrier['span_id'], {}, start_ns=carrier['queued_ns'])
+        self._finish(queue_wait)
+        with self._activate(Span(name, carrier['trace_id'], carrier['span_id'], attributes)) as span:
+            yield span
+
+    def start_child(self, name: str, **attributes) -> Span | None:
+        """A child span that is not made current, for event hooks that end it elsewhere (see end())."""
+        parent = _current.get()
+        return Span(name, parent.trace_id, parent.span_id, attributes) if parent else None
+
+    def end(self, span: Span, error: BaseException | None = None):
+        self._finish(span, error)
+
+    # --- Export ---
+
+    def start(self):
+        if self.enabled and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_periodically())
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        with self._lock:
+            batch, self._finished = self._finished, []
+        if not batch:
+            return
+        try:
+            await self.exporter.export(batch)
+        except Exception as e:
+            logger.warning(f"Could not export {len(batch)} spans: {e}")
+
+    async def stop(self):
+        if self._flush_task:
+            self._flush_task.cancel()
+        if self.exporter:
+            await self.flush()
+
+
+class JsonlExporter:
+    """Appends one JSON object per span to a local file."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _write(self, spans):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for span in spans:
+                f.write(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + '\n')
+
+    async def export(self, spans):
+        await asyncio.to_thread(self._write, spans)
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+class OtlpExporter:
+    """Posts spans to an OTLP/HTTP collector (JSON encoding), e.g. an OpenTelemetry Collector or Jaeger."""
+
+    def __init__(self, endpoint: str, service_name: str):
+        self.url = endpoint.rstrip('/') + '/v1/traces'
+        self.resource = {'attributes': [{'key': 'service.name', 'value': {'stringValue': service_name}}]}
+        self._client = None
+
+    def _span(self, span: Span) -> dict:
+        encoded = {
+            'traceId': span.trace_id, 'spanId': span.span_id, 'name': span.name, 'kind': 1,
+            'startTimeUnixNano': str(span.start_ns), 'endTimeUnixNano': str(span.end_ns),
+            'attributes': [{'key': k, 'value': _otlp_value(v)} for k, v in span.attributes.items() if v is not None],
+            'status': {'code': 2, 'message': span.error} if span.error else {'code': 1},
+        }
+        if span.parent_id:
+            encoded['parentSpanId'] = span.parent_id
+        return encoded
+
+    async def export(self, spans):
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=10)
+        payload = {'resourceSpans': [{'resource': self.resource, 'scopeSpans': [
+            {'scope': {'name': 'ostadbank'}, 'spans': [self._span(span) for span in spans]}
+        ]}]}
+        response = await self._client.post(self.url, json=payload)
+        response.raise_for_status()
+
+
+def create_exporter(kind: str, jsonl_path: str, otlp_endpoint: str, service_name: str):
+    if kind == 'jsonl':
+        return JsonlExporter(jsonl_path)
+    if kind == 'otlp':
+        return OtlpExporter(otlp_endpoint, service_name)
+    raise ValueError(f"Unknown trace exporter: {kind}")
+
+
+tracer = Tracer()
+
+
+# --- Instrumentation ---
+
+def _shorten(statement: str, length: int = 500) -> str:
+    statement = ' '.join(statement.split())
+    return statement if len(statement) <= length else statement[:length] + '...'
+
+
+def install_db_hooks(engine):
+    """One span per SQL statement executed inside a sampled trace."""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        span = tracer.start_child('db.query', **{'db.statement': _shorten(statement)})
+        if span is not None:
+            conn.info['trace_span'] = span
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        span = conn.info.pop('trace_span', None)
+        if span is not None:
+            if cursor.rowcount is not None and cursor.rowcount >= 0:
+                span.set('db.rowcount', cursor.rowcount)
+            tracer.end(span)
+
+    @event.listens_for(engine, 'handle_error')
+    def _error(exception_context):
+        connection = exception_context.connection
+        span = connection.info.pop('trace_span', None) if connection is not None else None
+        if span is not None:
+            tracer.end(span, exception_context.original_exception)
+
+
+class TracingRequest(HTTPXRequest):
+    """The bot's HTTP client, with one span per Bot API request inside a sampled trace."""
+
+    async def do_request(self, url, method, *args, **kwargs):
+        with tracer.span(f"telegram.{url.rsplit('/', 1)[-1]}", **{'http.method': method}) as span:
+            code, payload = await super().do_request(url, method, *args, **kwargs)
+            if span is not None:
+                span.set('http.status_code', code)
+            return code, payload
@@ -0,0 +1,132 @@
+# update_recorder.py
+
+import asyncio
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import time
+
+logger = logging.getLogger(__name__)
+
+# Objects whose 'id' is a Telegram user or chat id.
+ID_PARENTS = frozenset({'from', 'chat', 'user', 'sender_chat', 'forward_from', 'forward_from_chat', 'via_bot'})
+ID_KEYS = frozenset({'user_id', 'chat_id', 'migrate_to_chat_id', 'migrate_from_chat_id'})
+PERSONAL_KEYS = frozenset({'first_name', 'last_name', 'username', 'phone_number', 'bio', 'vcard', 'invite_link'})
+TEXT_KEYS = frozenset({'text', 'caption', 'query', 'question', 'explanation'})
+FILE_KEYS = frozenset({'file_id', 'file_unique_id'})
+FILE_PREFIX = 'updates-'
+
+
+class UpdateRecorder:
+    """
+    Appends incoming webhook updates to gzip-compressed JSONL files for later replay.
+
+    User and chat ids are replaced by keyed hashes (stable for one salt, so a user
+    keeps one pseudonymous id across the capture), names are dropped and free
+    text is replaced by filler of the same length; texts passed as keep_texts
+    (button labels) and commands are kept so replayed updates reach the same
+    handlers. Lines are buffered and written by a background task; a file is
+    rotated once it reaches max_bytes and only the newest max_files are kept.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 50 * 1024 * 1024, max_files: int = 10,
+                 salt: str | None = None, flush_interval: float = 1.0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.flush_interval = flush_interval
+        self._key = (salt or secrets.token_hex(16)).encode()
+        self._pending = []
+        self._flush_task = None
+        self._path = None
+        self._files_opened = 0
+        self.recorded = 0
+        os.makedirs(directory, exist_ok=True)
+
+    # --- Anonymization ---
+
+    def pseudonym(self, telegram_id: int) -> int:
+        """Maps a user or chat id to a stable fake id of the same sign."""
+        digest = hmac.new(self._key, str(abs(telegram_id)).encode(), hashlib.sha256).digest()
+        fake = 1_000_000_000 + int.from_bytes(digest[:6], 'big') % 1_000_000_000
+        return -fake if telegram_id < 0 else fake
+
+    def anonymize(self, value, keep_texts=frozenset(), parent: str = ''):
+        if isinstance(value, dict):
+            result = {}
+            for key, item in value.items():
+                if key in PERSONAL_KEYS:
+                    result[key] = 'User' if key == 'first_name' else None
+                elif isinstance(item, int) and not isinstance(item, bool) and (
+                        key in ID_KEYS or (key == 'id' and parent in ID_PARENTS)):
+                    result[key] = self.pseudonym(item)
+                elif key in TEXT_KEYS and isinstance(item, str):
+                    result[key] = item if item in keep_texts or item.startswith('/') else 'x' * len(item)
+                elif key in FILE_KEYS:
+                    result[key] = 'file'
+                else:
+                    result[key] = self.anonymize(item, keep_texts, key)
+            return {key: item for key, item in result.items() if item is not None}
+        if isinstance(value, list):
+            return [self.anonymize(item, keep_texts, parent) for item in value]
+        return value
+
+    # --- Writing ---
+
+    def record(self, update_data: dict, admin: bool = False, keep_texts=frozenset()):
+        """Buffers one update; admin marks updates sent by a bot admin so a replay can grant the same rights."""
+        entry = {'at': round(time.time(), 3), 'update': self.anonymize(update_data, keep_texts)}
+        if admin:
+            entry['admin'] = True
+        self._pending.append(json.dumps(entry, ensure_ascii=False, separators=(',', ':')))
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def _flush_later(self):
+        while self._pending:
+            await asyncio.sleep(self.flush_interval)
+            await self._write_pending()
+
+    async def _write_pending(self):
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        try:
+            await asyncio.to_thread(self._write, batch)
+            self.recorded += len(batch)
+        except OSError as e:
+            logger.error(f"Failed to record {len(batch)} updates, dropping them: {e}")
+
+    def _write(self, lines):
+        if self._path is None or not os.path.exists(self._path) or os.path.getsize(self._path) >= self.max_bytes:
+            self._rotate()
+        # Every batch is a separate gzip member; gzip readers read concatenated members as one stream.
+        with gzip.open(self._path, 'at', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    def _rotate(self):
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.gmtime())
+        self._files_opened += 1
+        self._path = os.path.join(self.directory, f"{FILE_PREFIX}{stamp}-{os.getpid()}-{self._files_opened}.jsonl.gz")
+        captures = sorted(name for name in os.listdir(self.directory) if name.startswith(FILE_PREFIX))
+        for name in captures[:max(0, len(captures) - self.max_files + 1)]:
+            os.remove(os.path.join(self.directory, name))
+        logger.info(f"Recording updates to {self._path}")
+
+    async def flush(self):
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self._write_pending()
+
+
+def read_capture(paths):
+    """Yields the recorded entries of the given capture files, oldest file first."""
+    for path in sorted(paths):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
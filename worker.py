@@ -0,0 +1,35 @@
+# worker.py
+
+"""
+Standalone update consumer for horizontal scale-out.
+
+Run the webhook process with WORKER_ROLE=ingress and a shared STATE_BACKEND_URL,
+then start one or more of these with WORKER_ROLE=worker and disjoint WORKER_SHARDS.
+Workers whose WORKER_SHARDS overlap do not share a shard: the one holding its
+lease consumes it and the others stand by until the lease expires.
+"""
+
+import asyncio
+import logging
+import signal
+
+import main
+
+logger = logging.getLogger(__name__)
+
+
+async def run_worker():
+    await main.start_bot(run_startup_jobs=False)
+    logger.info(f"Worker started for shards {main.update_dispatcher.local_shards}.")
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+    try:
+        await stop_event.wait()
+    finally:
+        await main.stop_bot()
+
+
+if __name__ == "__main__":
+    asyncio.run(run_worker())